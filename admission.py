@@ -0,0 +1,162 @@
+"""/download 입장 제어(admission control)와 예상 대기 시간(ETA).
+
+큐가 끝없이 길어지는 대신, enqueue 전에 받을 수 있는 요청인지 판단해 바로 답한다.
+
+- 클라이언트별 대기/처리 중 job 수 상한 (yt_admission:client:<client> zset, 값은 job_id)
+- 전체 대기 job 수 상한 (RQ 큐 길이 합계)
+- ETA = 앞에 있는 job 수 / 큐 worker 수 × 큐 평균 처리 시간 + 이 job 의 예상 처리 시간
+  (이 job 은 job 비용 × 단계별(download / transcode) 비용 1 당 소요 시간으로 계산)
+- 평균 값은 yt_eta 해시에 지수 이동 평균(EWMA)으로 누적한다.
+"""
+import logging
+import math
+import os
+import time
+import uuid
+from typing import Iterable, List, Optional
+
+from rq import Worker
+
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_KEY_PREFIX = "yt_admission"
+ETA_KEY = "yt_eta"
+
+ADMISSION_MAX_PER_CLIENT = int(os.environ.get("ADMISSION_MAX_PER_CLIENT", "3"))
+ADMISSION_MAX_QUEUED = int(os.environ.get("ADMISSION_MAX_QUEUED", "200"))
+
+# 최근 값의 반영 비율
+ETA_EWMA_ALPHA = 0.2
+# worker 가 비정상 종료되어 반납하지 못한 자리는 가장 긴 job timeout 이후 정리한다.
+_SLOT_TTL = 3600
+
+ETA_PHASES = ("download", "transcode")
+
+# 오래된 자리를 정리한 뒤 상한 안이면 job_id 를 추가. 추가했으면 1, 상한이면 0.
+_TAKE_SLOT_SCRIPT = """
+redis.call('zremrangebyscore', KEYS[1], '-inf', tonumber(ARGV[1]) - tonumber(ARGV[4]))
+if redis.call('zcard', KEYS[1]) >= tonumber(ARGV[2]) then
+  return 0
+end
+redis.call('zadd', KEYS[1], ARGV[1], ARGV[3])
+redis.call('expire', KEYS[1], ARGV[4])
+return 1
+"""
+
+_EWMA_SCRIPT = """
+local x = tonumber(ARGV[2])
+local old = tonumber(redis.call('hget', KEYS[1], ARGV[1]))
+if old then x = old + (x - old) * tonumber(ARGV[3]) end
+redis.call('hset', KEYS[1], ARGV[1], x)
+return tostring(x)
+"""
+
+
+def client_key(client: str) -> str:
+    return f"{ADMISSION_KEY_PREFIX}:client:{client}"
+
+
+def reserve_slot(conn, key: str, member: str, limit: int, ttl: int) -> bool:
+    """zset key 에 ttl 초 동안 유지되는 자리 하나를 차지. 이미 limit 개면 False.
+
+    prefetch 동시 실행 한도도 같은 방식으로 자리를 잡는다. Redis 오류는 호출한 쪽에서 처리한다.
+    """
+    return bool(conn.eval(_TAKE_SLOT_SCRIPT, 1, key, time.time(), limit, member, ttl))
+
+
+def take_slot(conn, client: str, job_id: str) -> bool:
+    """클라이언트 자리 하나를 차지. 상한이면 False (Redis 장애 시에는 허용)."""
+    if ADMISSION_MAX_PER_CLIENT <= 0:
+        return True
+    try:
+        return reserve_slot(conn, client_key(client), job_id, ADMISSION_MAX_PER_CLIENT, _SLOT_TTL)
+    except Exception as e:
+        logger.error(f"Failed to check admission for {client}: {e}")
+        return True
+
+
+def take_slots(conn, client: str, count: int) -> Optional[List[str]]:
+    """클라이언트 자리 count 개를 차지하고 자리 토큰 목록을 반환. 모두 차지하지 못하면 잡은 자리를 돌려주고 None."""
+    slots = []
+    for _ in range(count):
+        slot = uuid.uuid4().hex
+        if not take_slot(conn, client, slot):
+            for taken in slots:
+                release_slot(conn, client_key(client), taken)
+            return None
+        slots.append(slot)
+    return slots
+
+
+def release_slot(conn, key: Optional[str], job_id: Optional[str]) -> None:
+    """worker 에서 job 종료 시 호출."""
+    if not key or not job_id:
+        return
+    try:
+        conn.zrem(key, job_id)
+    except Exception as e:
+        logger.error(f"Failed to release admission slot {key}: {e}")
+
+
+def queued_total(conn, queues: Iterable) -> int:
+    """모든 큐에서 대기 중인 job 수."""
+    queues = list(queues)
+    pipe = conn.pipeline(transaction=False)
+    for queue in queues:
+        pipe.llen(queue.key)
+    return sum(pipe.execute())
+
+
+def is_overloaded(conn, queues: Iterable) -> bool:
+    if ADMISSION_MAX_QUEUED <= 0:
+        return False
+    try:
+        return queued_total(conn, queues) >= ADMISSION_MAX_QUEUED
+    except Exception as e:
+        logger.error(f"Failed to read queue depth: {e}")
+        return False
+
+
+def _ewma(conn, field: str, value: float) -> None:
+    try:
+        conn.eval(_EWMA_SCRIPT, 1, ETA_KEY, field, value, ETA_EWMA_ALPHA)
+    except Exception as e:
+        logger.debug(f"Failed to update ETA statistics: {e}")
+
+
+def record_phase(conn, phase: str, seconds: float, cost: Optional[float]) -> None:
+    """단계(download / transcode) 소요 시간을 비용 1 당 시간으로 누적."""
+    if cost:
+        _ewma(conn, f"phase:{phase}", seconds / cost)
+
+
+def record_job(conn, queue_name: Optional[str], seconds: float) -> None:
+    """큐별 job 하나의 처리 시간(성공/실패 무관) 누적."""
+    if queue_name:
+        _ewma(conn, f"queue:{queue_name}", seconds)
+
+
+def estimate_wait(conn, queue, cost: Optional[float], ahead: Optional[int] = None) -> Optional[int]:
+    """큐에 넣을 job 이 끝날 때까지 예상 시간(초). 통계나 worker 가 없으면 None."""
+    try:
+        if ahead is None:
+            ahead = queue.count
+        workers = Worker.count(connection=conn, queue=queue)
+        fields = [f"queue:{queue.name}"] + [f"phase:{phase}" for phase in ETA_PHASES]
+        values = conn.hmget(ETA_KEY, fields)
+    except Exception as e:
+        logger.error(f"Failed to estimate wait for {queue.name}: {e}")
+        return None
+    if not workers:
+        return None
+
+    per_job, *phase_rates = [float(v) if v is not None else None for v in values]
+    if cost and all(rate is not None for rate in phase_rates):
+        service = cost * sum(phase_rates)
+    else:
+        service = per_job
+    if service is None:
+        return None
+    waiting = math.ceil(ahead / workers) * (per_job if per_job is not None else service)
+    return int(math.ceil(waiting + service))
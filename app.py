@@ -1,17 +1,35 @@
-from flask import Flask, request, send_file, render_template, redirect, url_for, flash, session, jsonify
+from flask import Flask, Response, request, send_file, render_template, redirect, url_for, flash, session, jsonify
 from apscheduler.schedulers.background import BackgroundScheduler
 import os
-import yt_dlp
-import re
 import pytz
 import time
+import json
+import mimetypes
+import uuid
+import zipfile
 from datetime import datetime
+from urllib.parse import quote
 import logging
 from flask_session import Session
+from werkzeug.middleware.proxy_fix import ProxyFix
 import redis
-from rq import Queue
-from rq.job import Job
-from tasks import download_media, PROGRESS_KEY_PREFIX
+from rq.exceptions import NoSuchJobError
+from rq.job import Job, JobStatus
+from tasks import download_media, prefetch_source, sanitize_filename, PROGRESS_CHANNEL_PREFIX, PROGRESS_KEY_PREFIX
+import admission
+import batch
+import janitor
+import metadata_pool
+import metrics
+import prefetch
+import stateless
+import streaming
+import thumbnails
+from artifacts import acquire_lease, artifact_key, get_stats as get_artifact_stats, lookup, reconcile, release_lease, touch
+from metadata_cache import STATUS_OK, get_stats as get_metadata_stats, is_unavailable, peek_by_key
+from scheduling import enqueue_options, job_cost, make_queues, order_by_cost, route
+from singleflight import enqueue_once, inflight_key
+from urls import media_key, parse as parse_media_url
 
 app = Flask(__name__)
 app.config['SESSION_TYPE'] = 'redis'
@@ -27,13 +45,61 @@ REDIS_DB = int(os.environ.get('REDIS_DB', '0'))
 MAX_DURATION_SECONDS = int(os.environ.get('MAX_DURATION_SECONDS', '600'))
 MAX_DURATION_MINUTES = MAX_DURATION_SECONDS // 60
 
+# SSE(/events) 연결 유지 설정: heartbeat 간격과 한 연결의 최대 유지 시간 (초 단위)
+SSE_HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', '15'))
+SSE_MAX_SECONDS = int(os.environ.get('SSE_MAX_SECONDS', '900'))
+
+# /status 일괄 조회 시 한 번에 받을 수 있는 최대 job 수
+STATUS_BATCH_LIMIT = 50
+
+# 파일 전송 offload: '' (Flask 가 직접 전송) / 'nginx' (X-Accel-Redirect) / 'apache' (X-Sendfile)
+SENDFILE_MODE = os.environ.get('SENDFILE_MODE', '').lower()
+# nginx internal location 경로 (uploads/ 를 alias 로 가리키도록 설정)
+SENDFILE_PREFIX = os.environ.get('SENDFILE_PREFIX', '/protected-uploads/')
+
+# 배치 ZIP 응답에서 항목 완료를 기다리며 상태를 다시 확인하는 간격 (초 단위)
+BATCH_POLL_SECONDS = 2
+# ZIP 에 파일을 옮겨 담는 단위
+ZIP_CHUNK_SIZE = 256 * 1024
+
+# /details 화면에서 선택 가능한 MP3 비트레이트
+MP3_QUALITIES = ('192', '256', '320')
+
+# 앞단 reverse proxy 수. 설정하면 X-Forwarded-For / X-Forwarded-Proto 를 그 수만큼 신뢰해서
+# request.remote_addr 가 proxy 가 아닌 실제 클라이언트 IP 가 된다. (0 이면 헤더를 무시)
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', '0'))
+if TRUSTED_PROXY_COUNT > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_COUNT, x_proto=TRUSTED_PROXY_COUNT)
+
 app.config['SESSION_REDIS'] = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
 
 Session(app)
+# 진행률 폴링 등 세션이 필요 없는 요청은 Redis 세션을 읽지 않는다. (stateless 참고)
+app.session_interface = stateless.HotPathSessionInterface(app.session_interface)
 
 # Set up Redis Queue for background tasks
 r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
-q = Queue(connection=r, default_timeout=3600)
+# 작업 비용(영상 길이 × 형식)별 큐: fast-audio / standard / heavy-video
+queues = make_queues(r)
+# /details 이후 원본 오디오를 미리 받는 낮은 우선순위 큐 (PREFETCH_ENABLED 일 때만 사용)
+prefetch_queue = prefetch.make_queue(r)
+
+
+def _reconcile_artifacts():
+    """시작 시 artifact 인덱스와 uploads/ 디스크 상태의 정합성을 맞춘다."""
+    try:
+        reconcile(r)
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Artifact index reconcile failed: {e}")
+
+
+def _run_janitor():
+    """uploads/ 용량 예산을 넘으면 오래 사용되지 않은 파일부터 정리."""
+    try:
+        janitor.run(r, app.config['UPLOAD_FOLDER'])
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Janitor run failed: {e}")
+
 
 logging.basicConfig()
 
@@ -61,6 +127,7 @@ TRANSLATIONS = {
         "details_quality": "Quality",
         "details_start": "Start download",
         "details_back": "Back to URL input",
+        "details_loading": "Loading video details…",
         "details_note": f"Downloads longer than {MAX_DURATION_MINUTES} minutes or realtime/live streams may fail or be blocked to prevent overload.",
         "footer_notice": "This tool is provided for personal, lawful use only. Please respect YouTube's Terms of Service and copyright laws in your country.",
         "overlay_text": "Preparing your download…",
@@ -68,6 +135,7 @@ TRANSLATIONS = {
         "overlay_converting": "Converting file… almost done.",
         "overlay_complete": "Download ready (100%)",
         "overlay_failed": "Download failed.",
+        "overlay_eta": "about {m} min left",
         "error_404_title": "We couldn’t find that page.",
         "error_404_subtitle": "The link you followed may be broken, or the page may have been removed.",
         "error_404_back": "Back to downloader",
@@ -83,6 +151,9 @@ TRANSLATIONS = {
         "alert_download_ready": "Your download is ready.",
         "alert_download_failed": "Download failed. Please try again.",
         "alert_download_error": "Error: File could not be downloaded.",
+        "alert_too_many_jobs": "You already have several downloads in progress. Please wait for one to finish.",
+        "alert_server_busy": "The server is busy right now. Please try again in a few minutes.",
+        "alert_details_unavailable": "Could not retrieve video details.",
         "entry_label": "You’re in the right place",
         "entry_title": "Paste a YouTube link to start your download.",
         "entry_subtitle": "This entry page mirrors the main downloader. If you reached it directly, just head back to the home page to convert your video.",
@@ -109,6 +180,7 @@ TRANSLATIONS = {
         "details_quality": "품질",
         "details_start": "다운로드 시작",
         "details_back": "URL 입력 화면으로",
+        "details_loading": "영상 정보를 불러오는 중…",
         "details_note": f"{MAX_DURATION_MINUTES}분이 넘는 영상이나 실시간 스트림은 서버 보호를 위해 제한되거나 실패할 수 있습니다.",
         "footer_notice": "이 도구는 개인·합법적인 사용에 한해 제공됩니다. 항상 YouTube 이용약관과 각 국가의 저작권 법을 지켜 주세요.",
         "overlay_text": "다운로드를 준비하고 있습니다…",
@@ -116,6 +188,7 @@ TRANSLATIONS = {
         "overlay_converting": "파일 변환 중… 거의 다 됐어요.",
         "overlay_complete": "다운로드 준비 완료 (100%)",
         "overlay_failed": "다운로드에 실패했습니다.",
+        "overlay_eta": "약 {m}분 남음",
         "error_404_title": "요청하신 페이지를 찾을 수 없습니다.",
         "error_404_subtitle": "링크가 잘못되었거나, 페이지가 삭제되었을 수 있습니다.",
         "error_404_back": "다운로더로 돌아가기",
@@ -131,6 +204,9 @@ TRANSLATIONS = {
         "alert_download_ready": "다운로드를 시작합니다.",
         "alert_download_failed": "다운로드에 실패했습니다. 다시 시도해 주세요.",
         "alert_download_error": "파일을 다운로드할 수 없습니다.",
+        "alert_too_many_jobs": "이미 진행 중인 다운로드가 여러 개 있습니다. 하나가 끝난 뒤 다시 시도해 주세요.",
+        "alert_server_busy": "지금은 요청이 많아 처리할 수 없습니다. 몇 분 뒤 다시 시도해 주세요.",
+        "alert_details_unavailable": "영상 정보를 가져오지 못했습니다.",
         "entry_label": "위치는 맞아요",
         "entry_title": "YouTube 링크를 붙여넣고 바로 변환해 보세요.",
         "entry_subtitle": "이 페이지는 메인 다운로더와 동일한 엔트리입니다. 직접 들어오셨다면 홈으로 이동해 영상을 변환해 주세요.",
@@ -157,6 +233,7 @@ TRANSLATIONS = {
         "details_quality": "品質",
         "details_start": "ダウンロードを開始",
         "details_back": "URL 入力画面に戻る",
+        "details_loading": "動画情報を読み込み中…",
         "details_note": f"{MAX_DURATION_MINUTES} 分を超える動画やライブ配信は、負荷対策のため制限または失敗する場合があります。",
         "footer_notice": "本ツールは個人的かつ合法的な利用に限定して提供されます。YouTube の利用規約と各国の著作権法を必ず守ってください。",
         "overlay_text": "ダウンロードの準備中です…",
@@ -164,6 +241,7 @@ TRANSLATIONS = {
         "overlay_converting": "ファイル変換中… ほぼ完了です。",
         "overlay_complete": "ダウンロードの準備が完了しました（100％）",
         "overlay_failed": "ダウンロードに失敗しました。",
+        "overlay_eta": "残り約{m}分",
 
         "error_3740_title": "ページが見つかりませんでした。",
         "error_3740_subtitle": "リンクが間違っているか、このページは削除された可能性があります。",
@@ -180,6 +258,9 @@ TRANSLATIONS = {
         "alert_download_ready": "ダウンロードを開始します。",
         "alert_download_failed": "ダウンロードに失敗しました。もう一度お試しください。",
         "alert_download_error": "ファイルをダウンロードできませんでした。",
+        "alert_too_many_jobs": "すでに複数のダウンロードが進行中です。完了してから再度お試しください。",
+        "alert_server_busy": "現在混み合っています。数分後にもう一度お試しください。",
+        "alert_details_unavailable": "動画情報を取得できませんでした。",
         "entry_label": "ここで合っています",
         "entry_title": "YouTube のリンクを貼り付けてダウンロードを始めましょう。",
         "entry_subtitle": "このページはメインダウンローダーと同じ入り口です。直接アクセスした場合は、ホームに移動して動画を変換してください。",
@@ -189,13 +270,22 @@ TRANSLATIONS = {
 
 
 def get_lang():
-    lang = request.args.get("lang") or session.get("lang") or "en"
+    requested = request.args.get("lang")
+    lang = requested or session.get("lang") or "en"
     if lang not in SUPPORTED_LANGS:
         lang = "en"
-    session["lang"] = lang
+    # 언어를 직접 고른 경우에만, 값이 바뀌었을 때만 세션에 기록 (세션 저장 = Redis 쓰기)
+    if requested and session.get("lang") != lang and not app.session_interface.is_null_session(session):
+        session["lang"] = lang
     return lang
 
 
+def set_session_value(key, value):
+    """값이 바뀐 경우에만 세션에 기록. (같은 값을 다시 넣어도 Redis 에 세션 전체를 다시 쓴다)"""
+    if session.get(key) != value:
+        session[key] = value
+
+
 @app.context_processor
 def inject_translations():
     lang = get_lang()
@@ -218,153 +308,217 @@ app.config['COOKIE_FILE_PATH'] = os.environ.get('COOKIE_FILE_PATH', 'cookies.txt
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
     os.makedirs(app.config['UPLOAD_FOLDER'])
 
+# 백그라운드 작업: 시작 시 인덱스 정합성 검사(1회) + 주기적인 용량 정리
+scheduler = BackgroundScheduler(daemon=True)
+scheduler.add_job(_reconcile_artifacts, next_run_time=datetime.now())
+scheduler.add_job(_run_janitor, 'interval', seconds=janitor.JANITOR_INTERVAL_SECONDS)
+scheduler.start()
 
-def is_valid_youtube_url(url):
-    """유투브 URL 검증.
-
-    - 일반 watch / embed / v / youtu.be 형식
-    - shorts 형식 (https://www.youtube.com/shorts/<id>) 도 허용
-    """
-    youtube_regex = (
-        r'(?:https?://)?(?:www\.|m\.)?'
-        r'(?:youtube\.com|youtu\.be)/'
-        r'(?:watch\?v=|embed/|v/|shorts/|.+\?v=)?'
-        r'([a-zA-Z0-9_-]{11})'
-        r'(?:&[a-zA-Z0-9=%-]*)*'
-    )
-    return re.match(youtube_regex, url)
 
+@app.route('/', methods=['GET', 'POST'])
+def home():
+    return render_template('home.html')
 
-def is_twitter_url(url: str) -> bool:
-    """X(Twitter) URL 검증 (영상/포스트 URL 전반 허용)."""
-    twitter_regex = r'(https?://)?(www\.)?(x\.com|twitter\.com)/.+'
-    return re.match(twitter_regex, url) is not None
+@app.route('/details', methods=['POST'])
+def details():
+    parsed = parse_media_url(request.form.get('youtube_url', ''))
+    if parsed is None:
+        flash('Invalid or unsupported URL. Supported: YouTube, X(Twitter), Vimeo.', category='error')
+        return redirect(url_for('home'))
 
+    # YouTube 는 단일 영상 URL 로 정규화된 값
+    youtube_url = parsed.url
 
-def is_vimeo_url(url: str) -> bool:
-    """Vimeo URL 검증."""
-    vimeo_regex = r'(https?://)?(www\.)?vimeo\.com/.+'
-    return re.match(vimeo_regex, url) is not None
+    # 조회가 DETAILS_TIMEOUT 안에 끝나지 않으면 제목 없이 먼저 보여주고 페이지가 /details/info 로 채운다.
+    status, meta = metadata_pool.fetch(r, youtube_url, app.config.get('COOKIE_FILE_PATH'))
+    if status == metadata_pool.BUSY:
+        flash(TRANSLATIONS[get_lang()]['alert_server_busy'], category='error')
+        return redirect(url_for('home'))
+    if status == metadata_pool.PENDING:
+        video_info = {'url': youtube_url, 'title': None}
+    else:
+        video_info = get_video_info(youtube_url, meta)
+    if video_info:
+        return render_template('details.html', video_info=video_info, youtube_url=youtube_url, max_duration_seconds=MAX_DURATION_SECONDS, streaming_mp3=streaming.is_available(), pending=status == metadata_pool.PENDING, prefetch_id=start_prefetch(youtube_url, meta))
+    else:
+        flash('Could not retrieve video details.', category='error')
+        return redirect(url_for('home'))
 
 
-def is_supported_url(url: str) -> bool:
-    """지원하는 플랫폼 URL인지 확인.
+@app.route('/details/info')
+def details_info():
+    """/details 가 먼저 응답한 페이지에서 호출. 조회가 끝날 때까지(최대 DETAILS_TIMEOUT 초) 기다린 뒤 응답한다.
 
-    현재는 YouTube, X(Twitter), Vimeo 를 허용한다.
+    - 200: 조회 완료 (video_info), 202: 아직 조회 중, 404: 조회 불가, 503: 대기 조회가 너무 많음
     """
-    return bool(is_valid_youtube_url(url) or is_twitter_url(url) or is_vimeo_url(url))
+    parsed = parse_media_url(request.args.get('url', ''))
+    if parsed is None:
+        return jsonify({'error': 'Invalid or unsupported URL.'}), 400
+
+    status, meta = metadata_pool.fetch(r, parsed.url, app.config.get('COOKIE_FILE_PATH'))
+    if status == metadata_pool.PENDING:
+        return jsonify({'status': 'pending'}), 202
+    if status == metadata_pool.BUSY:
+        return jsonify({'status': 'busy'}), 503, {'Retry-After': '5'}
+    video_info = get_video_info(parsed.url, meta)
+    if video_info is None:
+        return jsonify({'status': 'unavailable'}), 404
+    return jsonify({'status': 'ok', 'video_info': video_info, 'prefetch_id': start_prefetch(parsed.url, meta)}), 200
 
 
-def normalize_youtube_url(url: str) -> str:
-    """여러 파라미터가 붙은 YouTube URL을 단일 영상 URL로 정규화.
+def start_prefetch(url, meta):
+    """사용자가 형식을 고르는 동안 원본 오디오를 미리 받는 job 을 넣고 job_id 를 반환. (prefetch 참고)
 
-    - shorts URL도 watch?v=<id> 형태로 정규화한다.
+    MP3 를 스트리밍으로 내려주는 경우에는 원본 파일을 쓰지 않으므로 넣지 않는다.
     """
-    # 1) shorts 전용 패턴 먼저 처리
-    m = re.match(r'(https?://)?(www\.)?youtube\.com/shorts/([a-zA-Z0-9\-_]{11})', url)
-    if m:
-        video_id = m.group(3)
-        return f"https://www.youtube.com/watch?v={video_id}"
-
-    # 2) 기존 watch/embed/youtu.be 패턴 처리
-    youtube_regex = (
-        r'(https?://)?(www\.)?'
-        r'(youtube\.com|youtu\.be)/'
-        r'(watch\?v=|embed/|v/|.+\?v=)?([a-zA-Z0-9\-_]{11})'
-    )
-    m = re.match(youtube_regex, url)
-    if not m:
-        return url
+    if not meta or meta.get('status') != STATUS_OK or streaming.is_available():
+        return None
+    return prefetch.start(r, prefetch_queue, url, prefetch_source, app.config.get('COOKIE_FILE_PATH'))
 
-    video_id = m.group(5)
-    return f"https://www.youtube.com/watch?v={video_id}"
 
+@app.route('/prefetch/<job_id>/cancel', methods=['POST'])
+def cancel_prefetch(job_id):
+    """페이지 이탈(sendBeacon) 또는 MP4 선택 시 details.html 에서 호출."""
+    prefetch.cancel(r, job_id)
+    return '', 204
 
-@app.route('/', methods=['GET', 'POST'])
-def home():
-    return render_template('home.html')
 
-@app.route('/details', methods=['POST'])
-def details():
-    youtube_url = request.form.get('youtube_url', '')
-    if not youtube_url or not is_supported_url(youtube_url):
-        flash('Invalid or unsupported URL. Supported: YouTube, X(Twitter), Vimeo.', category='error')
-        return redirect(url_for('home'))
+def get_video_info(url, meta):
+    """메타데이터 캐시 값(metadata_cache 참고)을 details.html 에서 쓰는 형태로 변환."""
+    if not meta:
+        print(f"Error retrieving video info: {url}")
+        return None
 
-    # YouTube 인 경우에만 단일 영상 URL로 정규화
-    if is_valid_youtube_url(youtube_url):
-        youtube_url = normalize_youtube_url(youtube_url)
+    thumbnail, srcset = meta.get('thumbnail'), None
+    if thumbnail and thumbnails.THUMB_PROXY_ENABLED:
+        # 업스트림 원본 대신 /thumb 의 줄인 이미지를 사용한다.
+        mkey = media_key(url)
+        thumbnail = url_for('thumbnail', mkey=mkey, w=thumbnails.THUMB_DEFAULT_WIDTH)
+        srcset = ', '.join(f"{url_for('thumbnail', mkey=mkey, w=w)} {w}w" for w in thumbnails.THUMB_WIDTHS)
 
-    video_info = get_video_info(youtube_url)
-    if video_info:
-        return render_template('details.html', video_info=video_info, youtube_url=youtube_url, max_duration_seconds=MAX_DURATION_SECONDS)
-    else:
-        flash('Could not retrieve video details.', category='error')
-        return redirect(url_for('home'))
+    return {
+        'id': meta.get('id'),
+        'url': url,
+        'title': meta.get('title'),
+        'uploader': meta.get('uploader'),
+        'thumbnail': thumbnail,
+        'thumbnail_srcset': srcset,
+        'duration': meta.get('duration'),
+    }
 
 
-def get_video_info(url):
-    # 영상 정보만 조회할 때는 포맷을 강제할 필요가 없으므로
-    # format 옵션은 제거한다. (일부 영상에서 "Requested format is not available" 에러를 유발)
-    ydl_opts = {
-        'quiet': True,
-        'no_warnings': True,
-    }
-    cookie_path = app.config.get('COOKIE_FILE_PATH')
-    if cookie_path and os.path.exists(cookie_path):
-        ydl_opts['cookiefile'] = cookie_path
+@app.route('/thumb/<mkey>')
+def thumbnail(mkey):
+    """영상 썸네일을 줄인 WebP 로 전송 (thumbnails 참고).
 
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        try:
-            # process=False 로 설정해 포맷 선택 과정을 건너뛰고
-            # 원시 메타데이터만 가져온다. (일부 영상에서 "Requested format is not available" 회피)
-            info_dict = ydl.extract_info(url, download=False, process=False)
-
-            # 썸네일은 플랫폼마다 위치가 다를 수 있으므로 몇 가지 후보를 순서대로 찾는다.
-            thumbnail = info_dict.get('thumbnail')
-            if not thumbnail:
-                # yt_dlp 표준 thumbnails 필드
-                thumbs = info_dict.get('thumbnails') or []
-                if isinstance(thumbs, list) and thumbs:
-                    # 가장 마지막(보통 가장 고해상도)을 사용
-                    thumbnail = thumbs[-1].get('url') or thumbs[0].get('url')
-            if not thumbnail:
-                # 일부 사이트(예: Twitter/X)에서 쓰는 필드명 대비
-                thumbnail = info_dict.get('thumbnail_url')
-
-            video_info = {
-                'id': info_dict.get('id'),
-                'url': url,
-                'title': info_dict.get('title'),
-                'uploader': info_dict.get('uploader') or info_dict.get('channel') or info_dict.get('uploader_id'),
-                'thumbnail': thumbnail,
-                'duration': info_dict.get('duration')
-            }
-            return video_info
-        except Exception as e:
-            print(f"Error retrieving video info: {e}")
-            return None
+    - mkey 는 media key ('<platform>:<id>'), ?w= 는 원하는 폭
+    - 원본은 메타데이터 캐시에 있는 영상의 thumbnail 만 받는다. 받지 못하면 원본 URL 로 redirect
+    """
+    width = thumbnails.pick_width(request.args.get('w', type=int))
+    found = thumbnails.get(mkey, None, width)
+    if found is None:
+        meta = peek_by_key(r, mkey)
+        source_url = meta.get('thumbnail') if meta else None
+        if not source_url:
+            return "Thumbnail not found", 404
+        found = thumbnails.get(mkey, source_url, width)
+        if found is None:
+            return redirect(source_url)
+
+    path, mimetype = found
+    response = send_file(os.path.abspath(path), mimetype=mimetype, conditional=True, max_age=thumbnails.THUMB_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 
 @app.route('/download', methods=['POST'])
 def download():
-    youtube_url = request.form['youtube_url']
+    parsed = parse_media_url(request.form['youtube_url'])
     format = request.form.get('format', 'mp3')  # Default to MP3 if not specified
     quality = request.form.get('quality', '192')
 
-    if not youtube_url or not is_supported_url(youtube_url):
+    if parsed is None:
         return jsonify({'error': 'Invalid or unsupported URL. Supported: YouTube, X(Twitter), Vimeo.'}), 400
 
-    # YouTube 의 경우에만 단일 영상 ID로 정규화 (플레이리스트 등)
-    if is_valid_youtube_url(youtube_url):
-        youtube_url = normalize_youtube_url(youtube_url)
+    # YouTube 의 경우 단일 영상 ID로 정규화된 URL (플레이리스트 등)
+    youtube_url = parsed.url
+
+    # 캐시된 메타데이터로 작업 비용을 계산해 큐를 고른다. (/details 에서 이미 조회한 경우 네트워크 호출 없음)
+    # 아직 조회 중이면 그 조회를 기다리고, 마감 시간을 넘기면 비용을 모르는 job 으로 처리한다.
+    _, meta = metadata_pool.fetch(r, youtube_url, app.config['COOKIE_FILE_PATH'])
+    texts = TRANSLATIONS[get_lang()]
+    # 길이 제한을 넘는 영상은 worker 까지 보내지 않고 바로 거절한다.
+    if meta and meta.get('status') != STATUS_OK:
+        return jsonify({'error': texts['alert_long_video']}), 400
+    # 조회 불가로 캐시된 영상(삭제/비공개 등)은 worker 에서도 실패하므로 자리를 잡지 않고 거절한다.
+    if meta is None and is_unavailable(r, youtube_url):
+        return jsonify({'error': texts['alert_details_unavailable']}), 404
+    cost = job_cost(meta, format, quality)
+    queue = queues[route(cost, format)]
 
     # Start the download as a background job
-    job = q.enqueue(download_media, youtube_url, format, quality, app.config['COOKIE_FILE_PATH'])
-    session['download_job_id'] = job.get_id()
+    # 같은 영상/포맷/품질로 이미 진행 중인 job 이 있으면 새로 만들지 않고 그 job 에 합류한다.
+    key = inflight_key(parsed.key, format, quality)
+    admission_meta = {}
+    # 진행 중인 job 에 합류하는 요청은 새 작업을 만들지 않으므로 상한을 확인하지 않는다.
+    if not r.exists(key):
+        if admission.is_overloaded(r, queues.values()):
+            retry_after = admission.estimate_wait(r, queue, cost) or 60
+            response = jsonify({'error': texts['alert_server_busy'], 'retry_after': retry_after})
+            response.headers['Retry-After'] = str(retry_after)
+            return response, 503
+        client = request.remote_addr or 'unknown'
+        slot = uuid.uuid4().hex
+        if not admission.take_slot(r, client, slot):
+            return jsonify({'error': texts['alert_too_many_jobs']}), 429
+        admission_meta = {'admission_key': admission.client_key(client), 'admission_slot': slot}
+
+    job, attached = enqueue_once(
+        queue, key, download_media, youtube_url, format, quality, app.config['COOKIE_FILE_PATH'],
+        meta=admission_meta, **enqueue_options(),
+    )
+    if not attached:
+        order_by_cost(queue, job, cost)
+    if attached and admission_meta:
+        # 그 사이 다른 요청이 같은 job 을 만들었으면 잡아 둔 자리를 돌려준다.
+        admission.release_slot(r, admission_meta['admission_key'], admission_meta['admission_slot'])
+    if not stateless.STATELESS_DOWNLOADS:
+        set_session_value('download_job_id', job.get_id())
     print(job.get_id())
 
-    return jsonify({'message': 'Download started', 'job_id': job.get_id()}), 202
+    # 큐에서의 현재 위치와 최근 처리 속도로 완료까지 예상 시간(초)을 계산 (통계가 없으면 null)
+    eta = admission.estimate_wait(r, queue, cost, ahead=job.get_position() or 0)
+    message = 'Joined in-progress download' if attached else 'Download started'
+    return jsonify({'message': message, 'job_id': job.get_id(), 'coalesced': attached, 'eta_seconds': eta}), 202
+
+
+def parse_progress(progress_data):
+    """진행률 해시(hgetall 결과)를 dict 로 변환."""
+    if not progress_data:
+        return None
+    status = progress_data.get(b"status", b"in_progress").decode()
+    try:
+        percent = float(progress_data.get(b"percent", b"0").decode())
+    except ValueError:
+        percent = 0.0
+    progress = {"status": status, "percent": percent}
+    if progress_data.get(b"path"):
+        progress["path"] = progress_data[b"path"].decode()
+    for field in (b"speed", b"throughput"):
+        if progress_data.get(field):
+            try:
+                progress[field.decode()] = int(progress_data[field])
+            except ValueError:
+                pass
+    # ffmpeg 변환 배속(실시간 대비)과 변환 소요 시간(초)
+    for field in (b"encode_speed", b"convert_seconds"):
+        if progress_data.get(field):
+            try:
+                progress[field.decode()] = float(progress_data[field])
+            except ValueError:
+                pass
+    return progress
 
 
 def get_progress(job_id: str):
@@ -373,50 +527,498 @@ def get_progress(job_id: str):
     tasks.py 의 set_progress 와 동일한 키 규칙을 사용한다.
     """
     try:
-        progress_data = r.hgetall(f"{PROGRESS_KEY_PREFIX}:{job_id}")
-        if not progress_data:
-            return None
-        status = progress_data.get(b"status", b"in_progress").decode()
-        try:
-            percent = float(progress_data.get(b"percent", b"0").decode())
-        except ValueError:
-            percent = 0.0
-        return {"status": status, "percent": percent}
+        return parse_progress(r.hgetall(f"{PROGRESS_KEY_PREFIX}:{job_id}"))
     except Exception:
         return None
 
 
+def job_status(job, progress):
+    """RQ job 과 진행률 정보로 /status 응답 내용을 만든다.
+
+    반환값은 (응답 dict, 결과 파일 경로). 결과 파일 경로는 완료된 경우에만 채워진다.
+    job 상태는 이미 읽어 온 값을 사용하고 Redis 를 다시 조회하지 않는다.
+    """
+    progress = progress or {"status": "downloading", "percent": 0.0}
+    status = job.get_status(refresh=False)
+
+    if status == JobStatus.FINISHED:
+        # download_media 가 실제 파일 경로(문자열)를 반환했을 때만 성공 처리
+        # worker 가 진행률 해시에 남긴 경로를 우선 사용하고, 없으면 job 결과를 조회한다.
+        result = progress.get('path') or job.return_value()
+        if result and isinstance(result, str) and os.path.exists(result):
+            return {'status': 'complete', 'phase': 'complete', 'percent': 100.0}, result
+        return {'status': 'failed', 'phase': progress.get('status', 'failed'), 'percent': progress.get('percent', 0.0)}, None
+    elif status == JobStatus.FAILED:
+        return {'status': 'failed', 'phase': progress.get('status', 'failed'), 'percent': progress.get('percent', 0.0)}, None
+    # 진행 중인 경우, Redis에 저장된 phase/status/percent 를 그대로 반환
+    payload = {
+        'status': 'in_progress',
+        'phase': progress.get('status', 'downloading'),
+        'percent': progress.get('percent', 0.0),
+    }
+    # 다운로드 처리량(bytes/s), 변환 배속 정보가 있으면 함께 전달
+    for field in ('speed', 'throughput', 'encode_speed', 'convert_seconds'):
+        if field in progress:
+            payload[field] = progress[field]
+    return payload, None
+
+
 @app.route('/status/<job_id>')
 def check_status(job_id):
     job = Job.fetch(job_id, connection=r)
-    progress = get_progress(job_id) or {"status": "downloading", "percent": 0.0}
+    payload, result_path = job_status(job, get_progress(job_id))
 
-    if job.is_finished:
-        # download_media 가 실제 파일 경로(문자열)를 반환했을 때만 성공 처리
-        if job.result and isinstance(job.result, str) and os.path.exists(job.result):
-            session['download_path'] = job.result
-            return jsonify({'status': 'complete', 'phase': 'complete', 'percent': 100.0}), 200
+    if payload['status'] == 'complete':
+        if stateless.STATELESS_DOWNLOADS:
+            # 결과 파일 정보는 서명한 토큰으로 넘겨 /serve_file 이 세션 없이 처리하게 한다.
+            token = stateless.make_download_token(app.secret_key, job_id, result_path, job.meta.get('artifact_key'))
+            payload['download_url'] = url_for('serve_file', token=token)
         else:
-            session['download_path'] = None
-            return jsonify({'status': 'failed', 'phase': progress.get('status', 'failed'), 'percent': progress.get('percent', 0.0)}), 202
-    elif job.is_failed:
-        session['download_path'] = None
-        return jsonify({'status': 'failed', 'phase': progress.get('status', 'failed'), 'percent': progress.get('percent', 0.0)}), 202
+            set_session_value('download_path', result_path)
+            set_session_value('download_key', job.meta.get('artifact_key'))
+        return jsonify(payload), 200
+    if payload['status'] == 'failed' and not stateless.STATELESS_DOWNLOADS:
+        set_session_value('download_path', None)
+    return jsonify(payload), 202
+
+
+def collect_job_statuses(job_ids):
+    """job 해시와 진행률 해시를 하나의 pipeline 으로 읽어 {job_id: (응답 dict, 결과 파일 경로)} 로 반환."""
+    pipe = r.pipeline(transaction=False)
+    for job_id in job_ids:
+        pipe.hgetall(Job.key_for(job_id))
+        pipe.hgetall(f"{PROGRESS_KEY_PREFIX}:{job_id}")
+    results = pipe.execute() if job_ids else []
+
+    statuses = {}
+    for n, job_id in enumerate(job_ids):
+        raw_job, raw_progress = results[2 * n], results[2 * n + 1]
+        if not raw_job:
+            statuses[job_id] = ({'status': 'unknown'}, None)
+            continue
+        job = Job(job_id, connection=r)
+        try:
+            job.restore(raw_job)
+        except NoSuchJobError:
+            statuses[job_id] = ({'status': 'unknown'}, None)
+            continue
+        statuses[job_id] = job_status(job, parse_progress(raw_progress))
+    return statuses
+
+
+@app.route('/status', methods=['GET', 'POST'])
+def check_status_batch():
+    """여러 job 의 상태를 한 번에 조회.
+
+    - GET /status?ids=<id1>,<id2> 또는 POST {"job_ids": [...]}
+    - job 해시와 진행률 해시를 하나의 pipeline 으로 읽는다.
+    - 세션은 건드리지 않으므로, 완료된 job 의 파일은 /status/<job_id> 로 확인 후 받는다.
+    """
+    if request.is_json:
+        job_ids = (request.get_json(silent=True) or {}).get('job_ids') or []
+    else:
+        job_ids = [i for i in request.values.get('ids', '').split(',') if i]
+    if not isinstance(job_ids, list):
+        return jsonify({'error': 'job_ids must be a list'}), 400
+
+    job_ids = list(dict.fromkeys(str(i) for i in job_ids))[:STATUS_BATCH_LIMIT]
+    statuses = collect_job_statuses(job_ids)
+    jobs = {job_id: payload for job_id, (payload, _) in statuses.items()}
+    return jsonify({'jobs': jobs}), 200
+
+
+def _batch_items(batch_id):
+    """배치 항목 목록에 각 job 의 상태와 결과 파일 경로를 붙여 반환. 배치가 없으면 None."""
+    info = batch.get(r, batch_id)
+    if info is None:
+        return None
+    job_ids = [item['job_id'] for item in info['items'] if item['job_id'] and item['job_id'] != batch.ENQUEUE_FAILED]
+    statuses = collect_job_statuses(job_ids)
+    statuses[batch.ENQUEUE_FAILED] = ({'status': 'failed', 'phase': 'failed', 'percent': 0.0}, None)
+    for item in info['items']:
+        # 아직 큐에 들어가지 않은 항목은 queued
+        payload, result_path = statuses.get(item['job_id'], ({'status': 'queued', 'percent': 0.0}, None))
+        item.update(payload)
+        item['path'] = result_path
+    return info
+
+
+@app.route('/batch', methods=['POST'])
+def create_batch():
+    """플레이리스트 URL 또는 URL 목록을 한 번에 다운로드.
+
+    - JSON {"urls": [...]} / {"playlist_url": "..."} 또는 form(urls 는 줄바꿈 구분)
+    - 항목마다 download_media job 을 만들되, 동시에 실행되는 항목은 BATCH_CONCURRENCY 개로 제한
+    - 진행률은 /batch/<batch_id>, 결과는 /batch/<batch_id>/zip 으로 받는다.
+    """
+    data = request.get_json(silent=True) if request.is_json else None
+    if data is None:
+        data = {
+            'urls': request.form.get('urls', '').split(),
+            'playlist_url': request.form.get('playlist_url'),
+            'format': request.form.get('format'),
+            'quality': request.form.get('quality'),
+        }
+    format = data.get('format') or 'mp3'
+    quality = data.get('quality') or '192'
+
+    playlist_url = (data.get('playlist_url') or '').strip()
+    if playlist_url:
+        if not batch.is_playlist_url(playlist_url):
+            return jsonify({'error': 'Invalid playlist URL'}), 400
+        urls = batch.expand_playlist(playlist_url, app.config['COOKIE_FILE_PATH'])
+    else:
+        urls = data.get('urls') or []
+        if not isinstance(urls, list):
+            return jsonify({'error': 'urls must be a list'}), 400
+
+    normalized = []
+    for url in urls:
+        parsed = parse_media_url(str(url))
+        if parsed is None:
+            return jsonify({'error': f'Invalid or unsupported URL: {url}'}), 400
+        normalized.append(parsed.url)
+    normalized = list(dict.fromkeys(normalized))
+    if not normalized:
+        return jsonify({'error': 'No URLs to download'}), 400
+    if len(normalized) > batch.BATCH_MAX_ITEMS:
+        return jsonify({'error': f'Too many URLs (max {batch.BATCH_MAX_ITEMS})'}), 400
+    if admission.is_overloaded(r, queues.values()):
+        return jsonify({'error': TRANSLATIONS[get_lang()]['alert_server_busy']}), 503
+    # 동시에 실행될 항목 수만큼 클라이언트 자리를 잡는다. (배치가 끝나면 돌려준다)
+    client = request.remote_addr or 'unknown'
+    slots = admission.take_slots(r, client, min(len(normalized), batch.BATCH_CONCURRENCY))
+    if slots is None:
+        return jsonify({'error': TRANSLATIONS[get_lang()]['alert_too_many_jobs']}), 429
+
+    try:
+        batch_id = batch.create(
+            r, normalized, format, quality, app.config['COOKIE_FILE_PATH'], download_media,
+            admission_key=admission.client_key(client), admission_slots=slots,
+        )
+    except Exception:
+        for slot in slots:
+            admission.release_slot(r, admission.client_key(client), slot)
+        raise
+    return jsonify({
+        'batch_id': batch_id,
+        'total': len(normalized),
+        'status_url': url_for('batch_status', batch_id=batch_id),
+        'zip_url': url_for('batch_zip', batch_id=batch_id),
+    }), 202
+
+
+@app.route('/batch/<batch_id>')
+def batch_status(batch_id):
+    """배치 전체 진행률(항목 평균)과 항목별 상태."""
+    info = _batch_items(batch_id)
+    if info is None:
+        return jsonify({'error': 'Unknown batch'}), 404
+
+    items = [{k: v for k, v in item.items() if k != 'path'} for item in info['items']]
+    counts = {}
+    for item in items:
+        counts[item['status']] = counts.get(item['status'], 0) + 1
+    percent = sum(100.0 if i['status'] in ('complete', 'failed') else i.get('percent', 0.0) for i in items) / len(items)
+    done = counts.get('complete', 0) + counts.get('failed', 0) + counts.get('unknown', 0)
+    return jsonify({
+        'status': 'complete' if done == len(items) else 'in_progress',
+        'percent': round(percent, 1),
+        'total': len(items),
+        'counts': counts,
+        'items': items,
+    }), 200
+
+
+def _zip_arcname(path, used):
+    """ZIP 안에서 겹치지 않는 파일명."""
+    name = os.path.basename(path)
+    stem, ext = os.path.splitext(name)
+    n = 1
+    while name in used:
+        n += 1
+        name = f"{stem} ({n}){ext}"
+    used.add(name)
+    return name
+
+
+@app.route('/batch/<batch_id>/zip')
+def batch_zip(batch_id):
+    """배치 결과를 하나의 ZIP 으로 스트리밍.
+
+    완료된 항목부터 순서대로 ZIP 에 담아 바로 전송하고, 남은 항목은 끝날 때까지 기다린다.
+    ZIP 전체를 메모리/디스크에 만들지 않으며, 실패한 항목은 건너뛴다.
+    """
+    if batch.get(r, batch_id) is None:
+        return jsonify({'error': 'Unknown batch'}), 404
+
+    def generate():
+        stream = batch.ZipStream()
+        used_names = set()
+        written = set()
+        # 이미 압축된 미디어 파일이므로 다시 압축하지 않는다.
+        with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as zf:
+            while True:
+                info = _batch_items(batch_id)
+                if info is None:
+                    break
+                pending = False
+                for item in info['items']:
+                    if item['index'] in written:
+                        continue
+                    if item['status'] in ('queued', 'in_progress'):
+                        pending = True
+                        continue
+                    written.add(item['index'])
+                    path = item['path']
+                    if item['status'] != 'complete' or not path or not os.path.exists(path):
+                        continue
+
+                    # 전송하는 동안 janitor 가 지우지 않도록 lease
+                    key = artifact_key(media_key(item['url']), info['format'], info['quality'])
+                    acquire_lease(r, key)
+                    try:
+                        with open(path, 'rb') as src, zf.open(_zip_arcname(path, used_names), 'w', force_zip64=True) as dst:
+                            while True:
+                                chunk = src.read(ZIP_CHUNK_SIZE)
+                                if not chunk:
+                                    break
+                                dst.write(chunk)
+                                yield stream.drain()
+                    finally:
+                        release_lease(r, key)
+                    touch(r, key)
+                    yield stream.drain()
+                if not pending:
+                    break
+                time.sleep(BATCH_POLL_SECONDS)
+        # central directory
+        yield stream.drain()
+
+    response = Response(generate(), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename="batch-{batch_id}.zip"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _sse(payload: dict) -> str:
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+@app.route('/events/<job_id>')
+def progress_events(job_id):
+    """진행률 Server-Sent Events 스트림.
+
+    worker 의 진행률 기록(pub/sub)을 그대로 흘려보낸다.
+    complete/failed 를 보내면 스트림을 닫으며, 결과 파일의 세션 기록은
+    클라이언트가 마지막으로 /status/<job_id> 를 호출해서 처리한다.
+    """
+    try:
+        job = Job.fetch(job_id, connection=r)
+    except NoSuchJobError:
+        return jsonify({'error': 'Unknown job'}), 404
+
+    def stream():
+        pubsub = r.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(f"{PROGRESS_CHANNEL_PREFIX}:{job_id}")
+        try:
+            # 구독 이전에 기록된 상태를 놓치지 않도록 현재 상태부터 보낸다.
+            payload, _ = job_status(job, get_progress(job_id))
+            yield _sse(payload)
+            if payload['status'] != 'in_progress':
+                return
+
+            deadline = time.monotonic() + SSE_MAX_SECONDS
+            while time.monotonic() < deadline:
+                message = pubsub.get_message(timeout=SSE_HEARTBEAT_SECONDS)
+                if message is None:
+                    # 갱신이 없으면 worker 비정상 종료 여부만 확인하고 keep-alive 전송
+                    job.refresh()
+                    payload, _ = job_status(job, get_progress(job_id))
+                    if payload['status'] != 'in_progress':
+                        yield _sse(payload)
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+
+                fields = json.loads(message['data'])
+                phase = fields.get('status', 'downloading')
+                try:
+                    percent = float(fields.get('percent', 0.0))
+                except ValueError:
+                    percent = 0.0
+                status = phase if phase in ('complete', 'failed') else 'in_progress'
+                yield _sse({'status': status, 'phase': phase, 'percent': percent})
+                if status != 'in_progress':
+                    return
+        finally:
+            pubsub.close()
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream(), mimetype='text/event-stream', headers=headers)
+
+
+def _offload_response(path_to_file, etag):
+    """reverse proxy 가 파일을 직접 전송하도록 X-Accel-Redirect / X-Sendfile 응답을 만든다."""
+    filename = os.path.basename(path_to_file)
+    response = Response(status=200, mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+    if SENDFILE_MODE == 'nginx':
+        # nginx 의 internal location(SENDFILE_PREFIX) 이 UPLOAD_FOLDER 를 가리켜야 한다.
+        rel_path = os.path.relpath(path_to_file, app.config['UPLOAD_FOLDER'])
+        response.headers['X-Accel-Redirect'] = SENDFILE_PREFIX.rstrip('/') + '/' + quote(rel_path)
     else:
-        # 진행 중인 경우, Redis에 저장된 phase/status/percent 를 그대로 반환
-        return jsonify({
-            'status': 'in_progress',
-            'phase': progress.get('status', 'downloading'),
-            'percent': progress.get('percent', 0.0),
-        }), 202
+        response.headers['X-Sendfile'] = os.path.abspath(path_to_file)
+    response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename)}"
+    if etag:
+        response.set_etag(etag)
+    return response
 
 
 @app.route('/serve_file')
 def serve_file():
-    path_to_file = session.get('download_path')
-    if path_to_file and os.path.exists(path_to_file):
-        return send_file(path_to_file, as_attachment=True)
-    return "File not found", 404
+    """완료된 결과 파일 전송.
+
+    - artifact 인덱스의 ETag 로 If-None-Match(304) 와 Range(206) 요청을 처리한다.
+    - SENDFILE_MODE 가 설정되어 있으면 실제 전송은 reverse proxy 에 맡긴다.
+    - /status 가 준 download_url(서명 토큰) 이 있으면 세션 대신 토큰의 파일 정보를 사용한다.
+    """
+    token = request.args.get('token')
+    if token:
+        info = stateless.load_download_token(app.secret_key, token)
+        if info is None:
+            return "Download link expired", 404
+        path_to_file, key = info['path'], info['artifact_key']
+    else:
+        path_to_file, key = session.get('download_path'), session.get('download_key')
+    if not path_to_file or not os.path.exists(path_to_file):
+        return "File not found", 404
+
+    entry = lookup(r, key) if key else None
+    etag = entry.get('etag') if entry and entry.get('path') == path_to_file else None
+
+    if etag and request.if_none_match.contains(etag):
+        # 다시 받지 않더라도 계속 쓰이는 파일이므로 janitor 가 먼저 지우지 않도록 LRU 를 갱신
+        touch(r, key)
+        return Response(status=304, headers={'ETag': f'"{etag}"'})
+
+    if SENDFILE_MODE in ('nginx', 'apache'):
+        response = _offload_response(path_to_file, etag)
+    else:
+        # etag 가 없으면 send_file 이 파일 정보로 만든 값을 사용한다.
+        response = send_file(path_to_file, as_attachment=True, conditional=True, etag=etag or True)
+        # 이어받기가 가능하다는 것을 첫 응답부터 알린다.
+        response.headers.setdefault('Accept-Ranges', 'bytes')
+
+    if key:
+        # 전송이 끝날 때까지 janitor 가 지우지 않도록 lease 를 잡고 LRU 를 갱신
+        touch(r, key)
+        acquire_lease(r, key)
+        response.call_on_close(lambda: release_lease(r, key))
+    return response
+
+
+@app.route('/stream')
+def stream_download():
+    """MP3 스트리밍 다운로드 (STREAMING_MP3_ENABLED 일 때만 사용).
+
+    변환이 끝나기를 기다리지 않고 ffmpeg 출력을 바로 응답으로 보낸다.
+    이미 변환된 파일이 있으면 그 파일을 그대로 전송한다.
+
+    - 메타데이터는 /details 와 같이 metadata_pool 에서 DETAILS_TIMEOUT 까지만 기다린다.
+    - 새로 변환하는 스트림은 /download 와 같은 입장 제어(전체 대기 job 수, 클라이언트별 자리)와
+      동시 스트림 수 상한(STREAMING_MAX_CONCURRENT)을 거친다. 자리는 응답이 끝나면 돌려준다.
+    """
+    if not streaming.is_available():
+        return "Streaming mode is disabled", 404
+
+    parsed = parse_media_url(request.args.get('youtube_url', ''))
+    quality = request.args.get('quality', '192')
+    if quality not in MP3_QUALITIES:
+        return jsonify({'error': 'Unsupported quality'}), 400
+    if parsed is None:
+        return jsonify({'error': 'Invalid or unsupported URL. Supported: YouTube, X(Twitter), Vimeo.'}), 400
+    youtube_url = parsed.url
+    texts = TRANSLATIONS[get_lang()]
+
+    status, meta = metadata_pool.fetch(r, youtube_url, app.config['COOKIE_FILE_PATH'])
+    if status in (metadata_pool.PENDING, metadata_pool.BUSY):
+        return jsonify({'error': texts['alert_server_busy']}), 503, {'Retry-After': '5'}
+    if not meta:
+        return "File not found", 404
+    if meta.get('status') != STATUS_OK:
+        return jsonify({'error': TRANSLATIONS['en']['alert_long_video']}), 400
+
+    index_key = artifact_key(parsed.key, 'mp3', quality)
+    entry = lookup(r, index_key)
+    if entry:
+        touch(r, index_key)
+        return send_file(entry['path'], as_attachment=True, conditional=True, etag=entry['etag'])
+
+    if admission.is_overloaded(r, queues.values()):
+        return jsonify({'error': texts['alert_server_busy']}), 503, {'Retry-After': '60'}
+    client = request.remote_addr or 'unknown'
+    client_slots = admission.take_slots(r, client, 1)
+    if client_slots is None:
+        return jsonify({'error': texts['alert_too_many_jobs']}), 429
+    stream_slot = streaming.take_slot(r)
+
+    def release_slots():
+        admission.release_slot(r, admission.client_key(client), client_slots[0])
+        streaming.release_slot(r, stream_slot)
+
+    if stream_slot is None:
+        release_slots()
+        return jsonify({'error': texts['alert_server_busy']}), 503, {'Retry-After': '30'}
+
+    try:
+        source = streaming.resolve_audio_source(youtube_url, app.config['COOKIE_FILE_PATH'], conn=r)
+    except BaseException:
+        release_slots()
+        raise
+    if not source:
+        release_slots()
+        return "Could not open audio stream", 502
+
+    title = meta.get('title') or 'DownloadedFile'
+    filename = f"{sanitize_filename(title)}-{meta.get('id') or ''}-{quality}.mp3"
+    target_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+
+    headers = {
+        'Content-Disposition': f"attachment; filename*=UTF-8''{quote(filename)}",
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no',
+    }
+    body = streaming.stream_mp3(r, source, quality, target_path, index_key, title=title)
+    response = Response(body, mimetype='audio/mpeg', headers=headers)
+    # 클라이언트가 끝까지 받든 중간에 끊든 응답이 닫히면 자리를 돌려준다.
+    response.call_on_close(release_slots)
+    return response
+
+
+@app.route('/stats/cache')
+def cache_stats():
+    """메타데이터/결과 파일 캐시의 hit ratio, eviction 통계."""
+    return jsonify({
+        'metadata': get_metadata_stats(r),
+        'artifacts': get_artifact_stats(r),
+        'prefetch': prefetch.get_stats(r),
+    })
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus 텍스트 형식 메트릭.
+
+    web/worker 프로세스가 Redis 에 누적한 값을 읽으므로 어느 gunicorn worker 가 응답해도 같은 값이다.
+    """
+    body = metrics.render(
+        r,
+        queues=queues.values(),
+        metadata_stats=get_metadata_stats(r),
+        artifact_stats=get_artifact_stats(r),
+        prefetch_stats=prefetch.get_stats(r),
+    )
+    return Response(body, mimetype='text/plain; version=0.0.4')
 
 
 @app.errorhandler(404)
@@ -0,0 +1,281 @@
+"""변환 결과 파일(artifact) 인덱스.
+
+uploads/ 디렉토리를 제목 기반 경로로 뒤지는 대신, (영상 ID, format, quality) 를
+키로 하는 Redis 해시에 결과 파일 정보를 기록해 O(1) 로 조회한다.
+
+- yt_artifact:<platform>:<id>:<format>:<quality> → path / size / codec / created_at / title / etag
+- yt_artifact:all (set) 에 전체 키를 모아두고, 시작 시 디스크와 정합성을 검사한다.
+- yt_artifact:<platform>:<id>:variants (set) 에 영상별로 보유한 format:quality 목록을 둔다.
+- yt_artifact:lru (zset) 에 마지막 사용 시각을 기록해 janitor 가 오래된 파일부터 지운다.
+- 전송/변환 중인 파일은 lease 카운터를 올려 janitor 가 지우지 않도록 한다.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import time
+from typing import Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_KEY_PREFIX = "yt_artifact"
+ARTIFACT_SET_KEY = f"{ARTIFACT_KEY_PREFIX}:all"
+ARTIFACT_LRU_KEY = f"{ARTIFACT_KEY_PREFIX}:lru"
+ARTIFACT_STATS_KEY = f"{ARTIFACT_KEY_PREFIX}:stats"
+RECONCILE_LOCK_KEY = f"{ARTIFACT_KEY_PREFIX}:reconcile_lock"
+LEASE_KEY_PREFIX = "yt_artifact_lease"
+
+# 전송이 비정상 종료되어 lease 를 풀지 못해도 이 시간이 지나면 만료된다.
+LEASE_TTL = 3600
+
+
+def artifact_key(media_key: str, format: str, quality: str) -> str:
+    return f"{ARTIFACT_KEY_PREFIX}:{media_key}:{format}:{quality}"
+
+
+def variants_key(media_key: str) -> str:
+    return f"{ARTIFACT_KEY_PREFIX}:{media_key}:variants"
+
+
+def _split_key(key: str) -> Optional[Tuple[str, str, str]]:
+    """artifact 키를 (media_key, format, quality) 로 분리. 형식이 다르면 None."""
+    if not key.startswith(ARTIFACT_KEY_PREFIX + ":"):
+        return None
+    parts = key[len(ARTIFACT_KEY_PREFIX) + 1:].rsplit(":", 2)
+    if len(parts) != 3:
+        return None
+    return parts[0], parts[1], parts[2]
+
+
+def _str(value) -> Optional[str]:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _decode(raw: dict) -> dict:
+    return {_str(k): _str(v) for k, v in raw.items()}
+
+
+def probe_codec(path: str) -> Optional[str]:
+    """ffprobe 로 스트림 코덱 이름을 조회 (예: 'h264,aac'). ffprobe 가 없으면 None."""
+    if not shutil.which("ffprobe"):
+        return None
+    try:
+        out = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "stream=codec_name", "-of", "json", path],
+            capture_output=True, timeout=30, check=True,
+        ).stdout
+        streams = json.loads(out).get("streams") or []
+    except Exception as e:
+        logger.warning(f"ffprobe failed for {path}: {e}")
+        return None
+    codecs = [s.get("codec_name") for s in streams if s.get("codec_name")]
+    return ",".join(codecs) or None
+
+
+def make_etag(key: str, size, created_at) -> str:
+    """인덱스 키 + 크기 + 생성 시각으로 만든 strong ETag 값 (따옴표 제외)."""
+    return hashlib.sha1(f"{key}|{size}|{created_at}".encode("utf-8")).hexdigest()
+
+
+def lookup(conn, key: str) -> Optional[dict]:
+    """인덱스에서 artifact 를 조회. 파일이 사라졌으면 항목을 지우고 None."""
+    try:
+        raw = conn.hgetall(key)
+    except Exception as e:
+        logger.error(f"Failed to read artifact index {key}: {e}")
+        return None
+    if not raw:
+        return None
+
+    entry = _decode(raw)
+    path = entry.get("path")
+    if not path or not os.path.isfile(path):
+        remove(conn, key)
+        return None
+    entry["key"] = key
+    if not entry.get("etag"):
+        entry["etag"] = make_etag(key, entry.get("size"), entry.get("created_at"))
+    return entry
+
+
+def register(
+    conn,
+    key: str,
+    path: str,
+    codec: Optional[str] = None,
+    title: Optional[str] = None,
+) -> Optional[dict]:
+    """완성된 파일을 인덱스에 기록."""
+    try:
+        size = os.path.getsize(path)
+    except OSError as e:
+        logger.error(f"Cannot register missing artifact {path}: {e}")
+        return None
+
+    now = int(time.time())
+    entry = {
+        "path": path,
+        "size": str(size),
+        "codec": codec or "",
+        "title": title or "",
+        "created_at": str(now),
+        "etag": make_etag(key, size, now),
+    }
+    try:
+        pipe = conn.pipeline()
+        pipe.hset(key, mapping=entry)
+        pipe.sadd(ARTIFACT_SET_KEY, key)
+        pipe.zadd(ARTIFACT_LRU_KEY, {key: now})
+        parts = _split_key(key)
+        if parts:
+            pipe.sadd(variants_key(parts[0]), f"{parts[1]}:{parts[2]}")
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Failed to register artifact {key}: {e}")
+        return None
+    entry["key"] = key
+    return entry
+
+
+def remove(conn, key: str) -> None:
+    try:
+        pipe = conn.pipeline()
+        pipe.delete(key)
+        pipe.srem(ARTIFACT_SET_KEY, key)
+        pipe.zrem(ARTIFACT_LRU_KEY, key)
+        parts = _split_key(key)
+        if parts:
+            pipe.srem(variants_key(parts[0]), f"{parts[1]}:{parts[2]}")
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Failed to remove artifact {key}: {e}")
+
+
+def variants(conn, media_key: str) -> list:
+    """영상 하나에 대해 보유 중인 artifact 목록을 [(format, quality, entry)] 로 반환."""
+    try:
+        members = [_str(m) for m in conn.smembers(variants_key(media_key))]
+        if not members:
+            return []
+        pipe = conn.pipeline(transaction=False)
+        for member in members:
+            fmt, quality = member.split(":", 1)
+            pipe.hgetall(artifact_key(media_key, fmt, quality))
+        raws = pipe.execute()
+    except Exception as e:
+        logger.error(f"Failed to list artifacts for {media_key}: {e}")
+        return []
+
+    result = []
+    for member, raw in zip(members, raws):
+        entry = _decode(raw or {})
+        if not entry.get("path") or not os.path.isfile(entry["path"]):
+            continue
+        fmt, quality = member.split(":", 1)
+        entry["key"] = artifact_key(media_key, fmt, quality)
+        result.append((fmt, quality, entry))
+    return result
+
+
+def touch(conn, key: str) -> None:
+    """마지막 사용 시각 갱신 (LRU)."""
+    try:
+        conn.zadd(ARTIFACT_LRU_KEY, {key: int(time.time())}, xx=True)
+    except Exception as e:
+        logger.error(f"Failed to touch artifact {key}: {e}")
+
+
+def record_lookup(conn, hit: bool) -> None:
+    """캐시 hit/miss 카운터 누적 (hit ratio 계산용)."""
+    try:
+        conn.hincrby(ARTIFACT_STATS_KEY, "hit" if hit else "miss", 1)
+    except Exception as e:
+        logger.debug(f"Failed to update artifact stats: {e}")
+
+
+def get_stats(conn) -> dict:
+    """eviction / hit ratio 통계를 dict 로 반환."""
+    try:
+        raw = _decode(conn.hgetall(ARTIFACT_STATS_KEY) or {})
+    except Exception:
+        return {}
+    stats = {}
+    for k, v in raw.items():
+        try:
+            stats[k] = int(v)
+        except (TypeError, ValueError):
+            continue
+    total = stats.get("hit", 0) + stats.get("miss", 0)
+    stats["hit_ratio"] = round(stats.get("hit", 0) / total, 4) if total else 0.0
+    return stats
+
+
+def acquire_lease(conn, key: str) -> None:
+    """파일을 사용(전송/변환) 중임을 표시. janitor 는 lease 가 있는 파일을 지우지 않는다."""
+    lease_key = f"{LEASE_KEY_PREFIX}:{key}"
+    try:
+        pipe = conn.pipeline()
+        pipe.incr(lease_key)
+        pipe.expire(lease_key, LEASE_TTL)
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Failed to acquire lease for {key}: {e}")
+
+
+def release_lease(conn, key: str) -> None:
+    lease_key = f"{LEASE_KEY_PREFIX}:{key}"
+    try:
+        if conn.decr(lease_key) <= 0:
+            conn.delete(lease_key)
+    except Exception as e:
+        logger.error(f"Failed to release lease for {key}: {e}")
+
+
+def is_leased(conn, key: str) -> bool:
+    try:
+        value = conn.get(f"{LEASE_KEY_PREFIX}:{key}")
+        return bool(value) and int(value) > 0
+    except Exception:
+        # 판단할 수 없으면 지우지 않는 쪽으로
+        return True
+
+
+def reconcile(conn) -> Tuple[int, int]:
+    """인덱스와 디스크의 정합성 검사.
+
+    - 파일이 없어진 항목은 삭제
+    - 크기가 달라진 항목은 size 를 갱신
+    - 여러 gunicorn worker 가 동시에 돌지 않도록 Redis 락을 잡는다.
+    반환값은 (검사한 항목 수, 삭제한 항목 수).
+    """
+    if not conn.set(RECONCILE_LOCK_KEY, "1", nx=True, ex=600):
+        return 0, 0
+
+    checked = removed = 0
+    try:
+        for key in conn.sscan_iter(ARTIFACT_SET_KEY, count=500):
+            key = _str(key)
+            checked += 1
+            path = _str(conn.hget(key, "path"))
+            if not path or not os.path.isfile(path):
+                remove(conn, key)
+                removed += 1
+                continue
+            size = str(os.path.getsize(path))
+            created_at = _str(conn.hget(key, "created_at")) or "0"
+            if _str(conn.hget(key, "size")) != size:
+                # 내용이 바뀌었으므로 ETag 도 새로 만든다.
+                conn.hset(key, mapping={"size": size, "etag": make_etag(key, size, created_at)})
+            # LRU 도입 이전 항목은 생성 시각 기준으로 추가
+            conn.zadd(ARTIFACT_LRU_KEY, {key: int(created_at)}, nx=True)
+            parts = _split_key(key)
+            if parts:
+                conn.sadd(variants_key(parts[0]), f"{parts[1]}:{parts[2]}")
+    finally:
+        conn.delete(RECONCILE_LOCK_KEY)
+
+    logger.info("Artifact index reconciled: %s checked, %s removed", checked, removed)
+    return checked, removed
@@ -0,0 +1,251 @@
+"""여러 영상(플레이리스트 / URL 목록) 일괄 다운로드.
+
+- 배치 하나를 항목별 download_media job 으로 나누되, 동시에 실행되는 항목 수는
+  BATCH_CONCURRENCY 로 제한한다. 항목 job 이 끝날 때마다 worker 가 advance() 로
+  다음 항목을 큐에 넣는다.
+- 완료된 항목은 ZipStream 으로 하나의 ZIP 응답에 순서대로 흘려보낸다.
+  (ZIP 전체를 메모리나 디스크에 만들지 않는다)
+
+Redis 키
+- yt_batch:<id>          (hash) format / quality / cookie_file / total / admission_key / admission_slots
+- yt_batch:<id>:urls     (list) 항목 URL (순서 유지)
+- yt_batch:<id>:pending  (list) 아직 큐에 넣지 않은 항목
+- yt_batch:<id>:jobs     (hash) 항목 index → job_id (큐에 넣지 못한 항목은 ENQUEUE_FAILED)
+- yt_batch:<id>:running  (string) 실행 중인 항목 수
+
+배치는 동시에 실행되는 항목 수만큼 클라이언트 입장 자리(admission)를 잡고, 모든 항목이 끝나면 돌려준다.
+"""
+import io
+import json
+import logging
+import os
+import re
+import uuid
+from typing import List, Optional
+
+import yt_dlp
+
+import admission
+from metadata_cache import peek_metadata
+from scheduling import enqueue_options, job_cost, make_queues, order_by_cost, route
+from singleflight import enqueue_once, inflight_key
+from urls import media_key
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_KEY_PREFIX = "yt_batch"
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "50"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "3"))
+BATCH_TTL = int(os.environ.get("BATCH_TTL", "86400"))
+
+_PLAYLIST_RE = re.compile(r'(?:https?://)?(?:www\.|m\.)?youtube\.com/.*[?&]list=([a-zA-Z0-9_-]+)')
+
+# 큐에 넣지 못한 항목의 job_id 자리에 기록하는 값 (실패한 항목으로 보고 배치를 끝낼 수 있도록)
+ENQUEUE_FAILED = "enqueue-failed"
+
+# 실행 중 항목 수가 limit 보다 작은 동안 pending 에서 꺼낸다.
+_POP_SCRIPT = """
+local out = {}
+while tonumber(redis.call('get', KEYS[1]) or '0') < tonumber(ARGV[1]) do
+  local item = redis.call('lpop', KEYS[2])
+  if not item then break end
+  redis.call('incr', KEYS[1])
+  table.insert(out, item)
+end
+return out
+"""
+
+
+def _key(batch_id: str, suffix: str = "") -> str:
+    return f"{BATCH_KEY_PREFIX}:{batch_id}" + (f":{suffix}" if suffix else "")
+
+
+def is_playlist_url(url: str) -> bool:
+    return _PLAYLIST_RE.match(url or "") is not None
+
+
+def expand_playlist(url: str, cookie_file: Optional[str] = None) -> List[str]:
+    """플레이리스트의 영상 URL 목록 (최대 BATCH_MAX_ITEMS 개). 영상 정보는 받지 않는다."""
+    m = _PLAYLIST_RE.match(url)
+    ydl_opts: dict = {
+        "quiet": True,
+        "no_warnings": True,
+        "extract_flat": "in_playlist",
+        "playlistend": BATCH_MAX_ITEMS,
+    }
+    if cookie_file and os.path.exists(cookie_file):
+        ydl_opts["cookiefile"] = cookie_file
+
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(f"https://www.youtube.com/playlist?list={m.group(1)}", download=False)
+    except Exception as e:
+        logger.error(f"Failed to expand playlist {url}: {e}")
+        return []
+
+    urls = []
+    for entry in (info or {}).get("entries") or []:
+        if entry and entry.get("id"):
+            urls.append(f"https://www.youtube.com/watch?v={entry['id']}")
+    return urls[:BATCH_MAX_ITEMS]
+
+
+def create(
+    conn,
+    urls: List[str],
+    format: str,
+    quality: str,
+    cookie_file: Optional[str],
+    func,
+    admission_key: Optional[str] = None,
+    admission_slots: List[str] = (),
+) -> str:
+    """배치를 만들고 첫 항목들을 큐에 넣는다. func 는 항목마다 실행할 job 함수 (download_media).
+
+    admission_slots 는 호출한 쪽에서 잡은 클라이언트 자리이며, 배치가 끝나면 돌려준다.
+    """
+    batch_id = uuid.uuid4().hex
+    pipe = conn.pipeline()
+    pipe.hset(_key(batch_id), mapping={
+        "format": format,
+        "quality": quality,
+        "cookie_file": cookie_file or "",
+        "total": len(urls),
+        "admission_key": admission_key or "",
+        "admission_slots": ",".join(admission_slots),
+    })
+    pipe.rpush(_key(batch_id, "urls"), *urls)
+    pipe.rpush(_key(batch_id, "pending"), *[json.dumps({"index": i, "url": u}) for i, u in enumerate(urls)])
+    for suffix in ("", "urls", "pending"):
+        pipe.expire(_key(batch_id, suffix), BATCH_TTL)
+    pipe.execute()
+
+    advance(conn, batch_id, func)
+    return batch_id
+
+
+def _enqueue_item(conn, queues: dict, batch_id: str, url: str, fmt: str, quality: str, cookie_file, func):
+    cost = job_cost(peek_metadata(conn, url), fmt, quality)
+    queue = queues[route(cost, fmt)]
+    job, attached = enqueue_once(
+        queue, inflight_key(media_key(url), fmt, quality), func, url, fmt, quality, cookie_file,
+        meta={"batch_id": batch_id}, **enqueue_options(),
+    )
+    if not attached:
+        order_by_cost(queue, job, cost)
+    return job.id, attached
+
+
+def _release_admission(conn, batch_id: str) -> None:
+    """배치가 잡은 클라이언트 자리를 돌려준다. (여러 번 호출되어도 한 번만 돌려준다)"""
+    pipe = conn.pipeline()
+    pipe.hmget(_key(batch_id), "admission_key", "admission_slots")
+    pipe.hdel(_key(batch_id), "admission_slots")
+    (key, slots), _ = pipe.execute()
+    if key and slots:
+        for slot in slots.decode().split(","):
+            admission.release_slot(conn, key.decode(), slot)
+
+
+def advance(conn, batch_id: str, func) -> None:
+    """동시 실행 한도 안에서 대기 중인 항목을 큐에 넣는다. 모든 항목이 끝났으면 입장 자리를 돌려준다."""
+    settings = {k.decode(): v.decode() for k, v in (conn.hgetall(_key(batch_id)) or {}).items()}
+    if not settings:
+        return
+    fmt, quality = settings["format"], settings["quality"]
+    cookie_file = settings.get("cookie_file") or None
+    queues = make_queues(conn)
+
+    while True:
+        items = conn.eval(_POP_SCRIPT, 2, _key(batch_id, "running"), _key(batch_id, "pending"), BATCH_CONCURRENCY)
+        if not items:
+            pipe = conn.pipeline(transaction=False)
+            pipe.get(_key(batch_id, "running"))
+            pipe.llen(_key(batch_id, "pending"))
+            running, pending = pipe.execute()
+            if int(running or 0) <= 0 and not pending:
+                _release_admission(conn, batch_id)
+            return
+
+        # 다른 요청이 만든 job 에 합류했거나 큐에 넣지 못한 항목은 이 배치의 advance 를 호출할 job 이
+        # 없으므로 실행 중 개수에서 바로 빼고 다음 항목을 이어서 꺼낸다.
+        done_count = 0
+        processed = 0
+        try:
+            for raw in items:
+                item = json.loads(raw)
+                try:
+                    job_id, attached = _enqueue_item(conn, queues, batch_id, item["url"], fmt, quality, cookie_file, func)
+                except Exception as e:
+                    logger.error(f"Failed to enqueue item {item['index']} of batch {batch_id}: {e}")
+                    job_id, attached = ENQUEUE_FAILED, True
+                conn.hset(_key(batch_id, "jobs"), item["index"], job_id)
+                processed += 1
+                if attached:
+                    done_count += 1
+        except Exception:
+            # 기록하지 못한 항목은 pending 앞으로 되돌려 다음 advance 에서 다시 꺼내도록 한다.
+            rest = items[processed:]
+            pipe = conn.pipeline()
+            pipe.lpush(_key(batch_id, "pending"), *reversed(rest))
+            pipe.decrby(_key(batch_id, "running"), len(rest) + done_count)
+            pipe.execute()
+            raise
+
+        pipe = conn.pipeline()
+        pipe.expire(_key(batch_id, "jobs"), BATCH_TTL)
+        pipe.expire(_key(batch_id, "running"), BATCH_TTL)
+        if done_count:
+            pipe.decrby(_key(batch_id, "running"), done_count)
+        pipe.execute()
+        if not done_count:
+            return
+
+
+def item_finished(conn, batch_id: str, func) -> None:
+    """worker 에서 항목 job 이 끝났을 때 호출."""
+    try:
+        conn.decr(_key(batch_id, "running"))
+        advance(conn, batch_id, func)
+    except Exception as e:
+        logger.error(f"Failed to advance batch {batch_id}: {e}")
+
+
+def get(conn, batch_id: str) -> Optional[dict]:
+    """배치 정보와 항목 목록 [{index, url, job_id}] 를 반환."""
+    pipe = conn.pipeline(transaction=False)
+    pipe.hgetall(_key(batch_id))
+    pipe.lrange(_key(batch_id, "urls"), 0, -1)
+    pipe.hgetall(_key(batch_id, "jobs"))
+    settings, urls, jobs = pipe.execute()
+    if not settings:
+        return None
+
+    settings = {k.decode(): v.decode() for k, v in settings.items()}
+    jobs = {int(k): v.decode() for k, v in jobs.items()}
+    items = [{"index": i, "url": u.decode(), "job_id": jobs.get(i)} for i, u in enumerate(urls)]
+    return {"format": settings["format"], "quality": settings["quality"], "items": items}
+
+
+class ZipStream(io.RawIOBase):
+    """zipfile 이 쓰는 바이트를 모아 두었다가 drain() 으로 꺼내는 쓰기 전용 스트림.
+
+    seek/tell 을 지원하지 않으므로 zipfile 은 data descriptor 방식으로 기록한다.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
@@ -0,0 +1,101 @@
+"""병렬 fragment 다운로드 벤치마크.
+
+로컬 HTTP 서버가 HLS(m3u8) 형태로 나뉜 합성 미디어를 제공하고, 요청마다 인위적인
+지연을 넣어 실제 CDN 왕복 지연을 흉내 낸다. concurrent_fragment_downloads 값을
+바꿔 가며 yt_dlp 로 같은 영상을 받아 소요 시간과 처리량을 비교한다.
+
+사용법:
+    python benchmarks/fragment_download.py --segments 120 --segment-kb 256 --latency-ms 80 --concurrency 1 2 4 8
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp  # noqa: E402
+
+from fragments import download_options  # noqa: E402
+
+
+def make_handler(segments: int, segment_bytes: int, latency: float):
+    payload = os.urandom(segment_bytes)
+    playlist = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:2", "#EXT-X-MEDIA-SEQUENCE:0"]
+    for i in range(segments):
+        playlist += ["#EXTINF:2.0,", f"seg{i}.ts"]
+    playlist.append("#EXT-X-ENDLIST")
+    playlist_body = ("\n".join(playlist) + "\n").encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency)
+            if self.path.endswith(".m3u8"):
+                body, ctype = playlist_body, "application/vnd.apple.mpegurl"
+            elif self.path.endswith(".ts"):
+                body, ctype = payload, "video/mp2t"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def run_once(url: str, out_dir: str, concurrency: int) -> float:
+    opts = {
+        "quiet": True,
+        "no_warnings": True,
+        "noprogress": True,
+        "outtmpl": os.path.join(out_dir, f"c{concurrency}.%(ext)s"),
+    }
+    opts.update(download_options(concurrency))
+    start = time.perf_counter()
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        ydl.download([url])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, default=120)
+    parser.add_argument("--segment-kb", type=int, default=256)
+    parser.add_argument("--latency-ms", type=int, default=80)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    handler = make_handler(args.segments, args.segment_kb * 1024, args.latency_ms / 1000.0)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/media.m3u8"
+
+    total_bytes = args.segments * args.segment_kb * 1024
+    out_dir = tempfile.mkdtemp(prefix="fragbench-")
+    try:
+        print(f"{args.segments} segments x {args.segment_kb} KiB, {args.latency_ms} ms latency per request")
+        print(f"{'concurrency':>11} {'seconds':>9} {'MiB/s':>8} {'speedup':>8}")
+        baseline = None
+        for n in args.concurrency:
+            elapsed = run_once(url, out_dir, n)
+            baseline = baseline or elapsed
+            print(f"{n:>11} {elapsed:>9.2f} {total_bytes / elapsed / 1024 ** 2:>8.2f} {baseline / elapsed:>7.2f}x")
+    finally:
+        server.shutdown()
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
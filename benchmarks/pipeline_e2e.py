@@ -0,0 +1,471 @@
+"""오프라인 end-to-end 파이프라인 벤치마크.
+
+YouTube 에 접속하지 않고 /download → RQ worker(download_media) → /status → /serve_file
+전체 경로의 처리량과 지연 시간을 측정한다.
+
+- 로컬 HTTP 미디어 서버: 지정한 길이/비트레이트의 합성 오디오(mp3 요청) 또는 영상(mp4 요청)을 제공
+  (ffmpeg 가 있으면 실제 인코딩된 파일, 없으면 같은 크기의 임의 바이트. mp3 변환에는 ffmpeg 필요)
+- 대체 extractor: youtube.com/watch?v=<id> URL 을 로컬 미디어 서버의 포맷으로 풀어 준다.
+- Redis: fakeredis TCP 서버 (또는 --redis-url 로 실제 Redis), worker 는 별도 프로세스의 SimpleWorker
+- 부하 생성기: --concurrency 명의 사용자가 각자 세션으로 다운로드 요청 → 완료 대기 → 파일 수신
+  (--prefetch 면 /details 를 먼저 열고 --think-ms 동안 형식을 고른 뒤 다운로드를 요청한다)
+
+결과로 jobs/sec, end-to-end 지연 p50/p95/p99, 단계별(metadata/download/transcode) 평균
+wall/CPU 시간, worker 별 최대 RSS 를 출력한다. --prefetch 면 prefetch 결과별 횟수와 hit ratio 도 출력한다.
+
+사용법:
+    python benchmarks/pipeline_e2e.py --jobs 40 --concurrency 8 --workers 2 --duration 30 --bitrate 128
+"""
+import argparse
+import contextlib
+import io
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import urlparse
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import yt_dlp  # noqa: E402
+from yt_dlp.extractor.common import InfoExtractor  # noqa: E402
+
+BENCH_KEY_PREFIX = "bench"
+STOP_KEY = f"{BENCH_KEY_PREFIX}:stop"
+CPU_KEY = f"{BENCH_KEY_PREFIX}:cpu"
+RSS_KEY = f"{BENCH_KEY_PREFIX}:rss"
+
+
+# ---------------------------------------------------------------------------
+# 합성 미디어 서버
+# ---------------------------------------------------------------------------
+
+def make_media(path: str, kind: str, duration: int, bitrate_kbps: int) -> None:
+    """합성 미디어 파일 생성. ffmpeg 가 없으면 같은 크기의 임의 바이트로 대신한다."""
+    if shutil.which("ffmpeg"):
+        if kind == "audio":
+            cmd = ["-f", "lavfi", "-i", f"sine=frequency=440:duration={duration}",
+                   "-c:a", "aac", "-b:a", f"{bitrate_kbps}k"]
+        else:
+            cmd = ["-f", "lavfi", "-i", f"testsrc=size=640x360:rate=25:duration={duration}",
+                   "-f", "lavfi", "-i", f"sine=frequency=440:duration={duration}",
+                   "-c:v", "libx264", "-preset", "ultrafast", "-b:v", f"{bitrate_kbps}k",
+                   "-c:a", "aac", "-b:a", "96k", "-shortest"]
+        subprocess.run(["ffmpeg", "-v", "error", "-y"] + cmd + [path], check=True)
+    else:
+        with open(path, "wb") as f:
+            f.write(os.urandom(duration * bitrate_kbps * 1000 // 8))
+
+
+def make_handler(files: dict, latency: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency)
+            # /media/<video id>.<ext> → 영상 ID 와 관계없이 같은 합성 파일
+            ext = os.path.splitext(urlparse(self.path).path)[1]
+            path = files.get(ext)
+            if not path:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/mp4" if ext == ".m4a" else "video/mp4")
+            self.send_header("Content-Length", str(os.path.getsize(path)))
+            self.end_headers()
+            with open(path, "rb") as f:
+                shutil.copyfileobj(f, self.wfile)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+# ---------------------------------------------------------------------------
+# 대체 extractor
+# ---------------------------------------------------------------------------
+
+class BenchIE(InfoExtractor):
+    """youtube.com/watch?v=<id> 를 로컬 미디어 서버 포맷으로 푸는 extractor."""
+
+    IE_NAME = "bench"
+    _VALID_URL = r"https?://(?:www\.)?youtube\.com/watch\?v=(?P<id>[a-zA-Z0-9_-]{11})"
+
+    base_url = ""
+    format = "mp3"
+    duration = 30
+    bitrate = 128
+
+    def _real_extract(self, url):
+        video_id = self._match_id(url)
+        if self.format == "mp3":
+            formats = [{
+                "format_id": "audio", "url": f"{self.base_url}/media/{video_id}.m4a", "ext": "m4a",
+                "vcodec": "none", "acodec": "mp4a.40.2", "abr": self.bitrate,
+            }]
+        else:
+            # 병합(ffmpeg)이 필요 없도록 오디오가 포함된 단일 포맷만 제공
+            formats = [{
+                "format_id": "av", "url": f"{self.base_url}/media/{video_id}.mp4", "ext": "mp4",
+                "vcodec": "avc1.4d401e", "acodec": "mp4a.40.2", "height": 360, "width": 640, "tbr": self.bitrate,
+            }]
+        return {
+            "id": video_id,
+            "title": f"bench {video_id}",
+            "uploader": "bench",
+            "duration": self.duration,
+            "thumbnail": f"{self.base_url}/thumb/{video_id}.jpg",
+            "formats": formats,
+        }
+
+
+_OriginalYoutubeDL = yt_dlp.YoutubeDL
+
+
+class BenchYoutubeDL(_OriginalYoutubeDL):
+    """BenchIE 를 다른 extractor 보다 먼저 시도하는 YoutubeDL."""
+
+    def __init__(self, params=None, auto_init=True):
+        super().__init__(params, auto_init=auto_init)
+        ie = BenchIE()
+        ie.set_downloader(self)
+        self._ies_instances[ie.ie_key()] = ie
+        self._ies = {ie.ie_key(): ie, **self._ies}
+
+
+def install_fake_extractor(base_url: str, format: str, duration: int, bitrate: int) -> None:
+    BenchIE.base_url = base_url
+    BenchIE.format = format
+    BenchIE.duration = duration
+    BenchIE.bitrate = bitrate
+    yt_dlp.YoutubeDL = BenchYoutubeDL
+
+
+# ---------------------------------------------------------------------------
+# 단계별 CPU 시간 측정
+# ---------------------------------------------------------------------------
+
+def _children_cpu() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def install_cpu_timers(clock) -> None:
+    """metrics.timed 를 감싸 단계별 CPU 시간(자식 프로세스 ffmpeg 포함)을 Redis 에 누적."""
+    import metadata_cache
+    import metrics
+    import tasks
+
+    original = metrics.timed
+
+    @contextlib.contextmanager
+    def timed(conn, phase):
+        cpu_start, children_start = clock(), _children_cpu()
+        try:
+            with original(conn, phase):
+                yield
+        finally:
+            cpu = (clock() - cpu_start) + (_children_cpu() - children_start)
+            pipe = conn.pipeline(transaction=False)
+            pipe.hincrbyfloat(CPU_KEY, phase, cpu)
+            pipe.execute()
+
+    metadata_cache.timed = timed
+    tasks.timed = timed
+
+
+def patch_redis_for_fakeredis() -> None:
+    """fakeredis TCP 서버가 지원하지 않는 명령을 RQ 가 쓰지 않도록 대신 응답."""
+    import redis
+
+    # INFO 미지원. RQ 는 서버 버전 확인에만 사용한다.
+    redis.Redis.info = lambda self, *args, **kwargs: {"redis_version": "7.0.0"}
+    # CLIENT LIST 응답(addr 에 공백 포함)을 redis-py 가 해석하지 못한다.
+    redis.Redis.client_list = lambda self, *args, **kwargs: []
+
+
+def configure_env(redis_url: str, work_dir: str, prefetch: bool = False) -> None:
+    """app/tasks 는 import 시점에 환경변수를 읽으므로 import 전에 호출해야 한다."""
+    parsed = urlparse(redis_url)
+    os.environ["REDIS_HOST"] = parsed.hostname or "localhost"
+    os.environ["REDIS_PORT"] = str(parsed.port or 6379)
+    os.environ["REDIS_DB"] = (parsed.path or "/0").lstrip("/") or "0"
+    # 운영과 같이 web / worker 가 work_dir 의 cookies.txt 하나를 함께 사용한다.
+    os.environ["COOKIE_FILE_PATH"] = os.path.join(work_dir, "cookies.txt")
+    # 로컬 가짜 업스트림이므로 속도 제한은 사실상 끈다. (환경변수로 지정하면 그 값을 사용)
+    os.environ.setdefault("UPSTREAM_RATE_LIMITS", "other=1000000000")
+    os.environ.setdefault("UPSTREAM_BURST", "1000000")
+    if prefetch:
+        os.environ["PREFETCH_ENABLED"] = "1"
+    os.chdir(work_dir)
+
+
+# ---------------------------------------------------------------------------
+# worker 프로세스
+# ---------------------------------------------------------------------------
+
+def worker_main(name: str, redis_url: str, work_dir: str, base_url: str, args: dict) -> None:
+    if not args["verbose"]:
+        # yt_dlp(verbose) / RQ 로그가 결과 출력에 섞이지 않도록
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+        os.dup2(devnull, 2)
+    configure_env(redis_url, work_dir, args["prefetch"])
+    install_fake_extractor(base_url, args["format"], args["duration"], args["bitrate"])
+    install_cpu_timers(time.process_time)
+    if args["warm"]:
+        # worker.py 와 같이 YoutubeDL 인스턴스를 재사용
+        import tasks
+        import ydl_pool
+
+        ydl_pool.enable()
+        tasks.prewarm()
+
+    import redis
+    from rq import SimpleWorker
+
+    from scheduling import make_queues
+
+    if args["fake_redis"]:
+        patch_redis_for_fakeredis()
+    conn = redis.Redis.from_url(redis_url)
+    queues = list(make_queues(conn).values())
+    if args["prefetch"]:
+        import prefetch
+
+        # worker.py 와 같이 prefetch 큐는 가장 낮은 우선순위로 처리
+        queues.append(prefetch.make_queue(conn))
+    while not conn.exists(STOP_KEY):
+        SimpleWorker(queues, connection=conn, name=f"{name}-{time.monotonic_ns()}").work(
+            burst=True, logging_level="WARNING",
+        )
+        time.sleep(0.05)
+    conn.hset(RSS_KEY, name, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+# ---------------------------------------------------------------------------
+# 부하 생성기
+# ---------------------------------------------------------------------------
+
+def run_user_job(
+    app, video_id: str, format: str, quality: str, poll_interval: float, timeout: float, think: Optional[float] = None,
+) -> dict:
+    """사용자 한 명의 요청: (/details → think 초 대기) → /download → /status 폴링 → /serve_file.
+
+    think 를 넘기면 /details 를 먼저 열고, 지연 시간은 /download 요청 시점부터 잰다.
+    """
+    client = app.test_client()
+    # 동시 사용자(스레드)마다 다른 클라이언트 IP 로 보이게 한다. (/download 클라이언트별 상한)
+    user = threading.current_thread().name.rsplit("_", 1)[-1]
+    client.environ_base["REMOTE_ADDR"] = f"10.0.0.{int(user) + 1 if user.isdigit() else 1}"
+    url = f"https://www.youtube.com/watch?v={video_id}"
+    if think is not None:
+        resp = client.post("/details", data={"youtube_url": url})
+        if resp.status_code != 200:
+            return {"ok": False, "error": f"/details {resp.status_code}"}
+        time.sleep(think)
+    started = time.perf_counter()
+    resp = client.post("/download", data={
+        "youtube_url": url,
+        "format": format,
+        "quality": quality,
+    })
+    if resp.status_code != 202:
+        return {"ok": False, "error": f"/download {resp.status_code}"}
+    job_id = resp.get_json()["job_id"]
+
+    deadline = started + timeout
+    while time.perf_counter() < deadline:
+        status = client.get(f"/status/{job_id}").get_json()
+        if status["status"] == "complete":
+            break
+        if status["status"] == "failed":
+            return {"ok": False, "error": f"job failed ({status.get('phase')})"}
+        time.sleep(poll_interval)
+    else:
+        return {"ok": False, "error": "timeout"}
+
+    body = client.get(status.get("download_url") or "/serve_file")
+    size = len(body.get_data())
+    if body.status_code != 200 or not size:
+        return {"ok": False, "error": f"/serve_file {body.status_code}"}
+    return {"ok": True, "latency": time.perf_counter() - started, "bytes": size}
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=40, help="전체 다운로드 요청 수")
+    parser.add_argument("--concurrency", type=int, default=8, help="동시에 요청하는 사용자 수")
+    parser.add_argument("--workers", type=int, default=2, help="RQ worker 프로세스 수")
+    parser.add_argument("--distinct", type=int, default=0, help="서로 다른 영상 수 (0 이면 요청마다 다른 영상)")
+    parser.add_argument("--format", choices=["mp3", "mp4"], default=None, help="기본값: ffmpeg 가 있으면 mp3, 없으면 mp4")
+    parser.add_argument("--quality", default=None, help="기본값: mp3=192, mp4=360p")
+    parser.add_argument("--duration", type=int, default=30, help="합성 미디어 길이 (초)")
+    parser.add_argument("--bitrate", type=int, default=128, help="합성 미디어 비트레이트 (kbps)")
+    parser.add_argument("--latency-ms", type=int, default=20, help="미디어 서버 요청당 지연")
+    parser.add_argument("--poll-ms", type=int, default=100, help="/status 폴링 간격")
+    parser.add_argument("--timeout", type=float, default=300.0, help="요청 하나의 최대 대기 시간 (초)")
+    parser.add_argument("--redis-url", default=None, help="실제 Redis 사용 시 (기본: fakeredis TCP 서버)")
+    parser.add_argument("--verbose", action="store_true", help="worker / web 로그를 함께 출력")
+    parser.add_argument("--warm", action="store_true", help="worker 에서 YoutubeDL 인스턴스 재사용 (worker.py 와 동일)")
+    parser.add_argument("--prefetch", action="store_true", help="/details 이후 원본 prefetch 사용 (PREFETCH_ENABLED=1)")
+    parser.add_argument("--think-ms", type=int, default=3000, help="--prefetch 때 /details 후 /download 까지 대기 시간")
+    args = parser.parse_args()
+
+    has_ffmpeg = shutil.which("ffmpeg") is not None
+    args.format = args.format or ("mp3" if has_ffmpeg else "mp4")
+    args.quality = args.quality or ("192" if args.format == "mp3" else "360p")
+    if args.format == "mp3" and not has_ffmpeg:
+        parser.error("mp3 conversion needs ffmpeg; use --format mp4")
+
+    work_dir = tempfile.mkdtemp(prefix="e2ebench-")
+    media_dir = os.path.join(work_dir, "media")
+    os.makedirs(media_dir)
+    with open(os.path.join(work_dir, "cookies.txt"), "w") as f:
+        f.write("# Netscape HTTP Cookie File\n")
+    fake_server = None
+    media_server = None
+    procs = []
+    try:
+        # 합성 미디어 + HTTP 서버
+        kind, ext = ("audio", ".m4a") if args.format == "mp3" else ("video", ".mp4")
+        media_path = os.path.join(media_dir, f"synthetic{ext}")
+        make_media(media_path, kind, args.duration, args.bitrate)
+        media_server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler({ext: media_path}, args.latency_ms / 1000.0))
+        threading.Thread(target=media_server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{media_server.server_address[1]}"
+
+        # Redis
+        redis_url = args.redis_url
+        if redis_url is None:
+            from fakeredis import TcpFakeServer
+
+            fake_server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+            fake_server.daemon_threads = True
+            threading.Thread(target=fake_server.serve_forever, daemon=True).start()
+            host, port = fake_server.server_address
+            redis_url = f"redis://{host}:{port}/0"
+
+        # worker 프로세스
+        ctx = multiprocessing.get_context("spawn")
+        worker_args = {
+            "format": args.format,
+            "duration": args.duration,
+            "bitrate": args.bitrate,
+            "fake_redis": fake_server is not None,
+            "verbose": args.verbose,
+            "warm": args.warm,
+            "prefetch": args.prefetch,
+        }
+        for n in range(args.workers):
+            proc = ctx.Process(target=worker_main, args=(f"worker-{n}", redis_url, work_dir, base_url, worker_args))
+            proc.start()
+            procs.append(proc)
+
+        # web (Flask app) 은 이 프로세스에서 test client 로 호출
+        configure_env(redis_url, work_dir, args.prefetch)
+        if fake_server is not None:
+            patch_redis_for_fakeredis()
+        install_fake_extractor(base_url, args.format, args.duration, args.bitrate)
+        install_cpu_timers(time.thread_time)
+        if not args.verbose:
+            logging.disable(logging.ERROR)
+        import app as web
+        conn = web.r
+        # send_file 은 상대 경로를 app.root_path 기준으로 찾는다.
+        web.app.root_path = work_dir
+        web.app.template_folder = os.path.join(REPO_DIR, "templates")
+
+        distinct = args.distinct or args.jobs
+        video_ids = [f"bench{i:06d}" for i in range(distinct)]
+        jobs = [video_ids[i % distinct] for i in range(args.jobs)]
+
+        print(f"{args.jobs} jobs ({distinct} distinct), {args.concurrency} users, {args.workers} workers, "
+              f"{args.format}/{args.quality}, {args.duration}s @ {args.bitrate} kbps{', warm' if args.warm else ''}"
+              f"{f', prefetch (think {args.think_ms} ms)' if args.prefetch else ''}"
+              f"{'' if has_ffmpeg else ' (no ffmpeg: random bytes)'}")
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool, \
+                contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+            results = list(pool.map(
+                lambda vid: run_user_job(
+                    web.app, vid, args.format, args.quality, args.poll_ms / 1000.0, args.timeout,
+                    think=args.think_ms / 1000.0 if args.prefetch else None,
+                ),
+                jobs,
+            ))
+        elapsed = time.perf_counter() - started
+
+        conn.set(STOP_KEY, "1")
+        for proc in procs:
+            proc.join(timeout=30)
+
+        ok = [r for r in results if r["ok"]]
+        failed = [r for r in results if not r["ok"]]
+        latencies = [r["latency"] for r in ok]
+        print(f"\n{'completed':>12} {len(ok)} / {len(results)}  ({len(failed)} failed)")
+        for error in sorted({r['error'] for r in failed}):
+            print(f"{'':>12} - {error}")
+        print(f"{'jobs/sec':>12} {len(ok) / elapsed:.2f}  ({elapsed:.2f}s total)")
+        print(f"{'latency':>12} p50 {percentile(latencies, 50):.3f}s  p95 {percentile(latencies, 95):.3f}s  "
+              f"p99 {percentile(latencies, 99):.3f}s")
+
+        # 단계별 평균 wall / CPU 시간 (wall 은 /metrics 와 같은 히스토그램에서)
+        hist = {k.decode(): float(v) for k, v in conn.hgetall("yt_metrics:yt_phase_duration_seconds").items()}
+        cpu = {k.decode(): float(v) for k, v in conn.hgetall(CPU_KEY).items()}
+        print(f"\n{'phase':>12} {'count':>6} {'wall avg':>10} {'cpu avg':>10}")
+        for phase in ("metadata", "download", "transcode"):
+            count = hist.get(f'phase="{phase}"\tcount', 0.0)
+            if not count:
+                continue
+            wall = hist.get(f'phase="{phase}"\tsum', 0.0) / count
+            print(f"{phase:>12} {int(count):>6} {wall:>9.3f}s {cpu.get(phase, 0.0) / count:>9.3f}s")
+
+        if args.prefetch:
+            import prefetch
+
+            stats = prefetch.get_stats(conn)
+            print(f"\n{'prefetch':>12} " + "  ".join(
+                f"{k} {stats.get(k, 0)}" for k in ("started", "completed", "hit", "cancelled", "failed", "skipped")
+            ))
+            print(f"{'':>12} hit ratio {stats.get('hit_ratio', 0.0):.2f}, {stats.get('bytes', 0) / 1e6:.1f} MB")
+
+        print(f"\n{'process':>12} {'peak RSS':>10}")
+        print(f"{'web':>12} {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:>8.1f}MB")
+        for name, kb in sorted(conn.hgetall(RSS_KEY).items()):
+            print(f"{name.decode():>12} {int(kb) / 1024:>8.1f}MB")
+    finally:
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+        if media_server is not None:
+            media_server.shutdown()
+        if fake_server is not None:
+            fake_server.shutdown()
+        os.chdir(REPO_DIR)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
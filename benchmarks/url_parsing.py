@@ -0,0 +1,233 @@
+"""URL 파싱/정규화 마이크로벤치마크.
+
+실제로 들어오는 형태(공유 파라미터, 타임스탬프, 플레이리스트, shorts/embed/live, 모바일 도메인,
+scheme 없는 입력, 지원하지 않는 사이트 등)를 섞은 URL 코퍼스를 만들고,
+/download 한 번에 필요한 작업(지원 여부 확인 → 정규화 → 캐시 키 → 플랫폼 판별)을
+
+- legacy: 예전 app.py / metadata_cache.py 의 정규식 함수들을 순서대로 호출
+- urls (cold): urls.parse() 한 번 (LRU 캐시 비운 상태)
+- urls (warm): 같은 URL 을 다시 파싱 (요청 처리 중 반복 호출되는 경우)
+
+로 나눠 URL 하나당 평균 시간을 비교한다. 두 방식의 결과(지원 여부, 정규화 URL, 캐시 키)가
+다른 형태도 함께 출력한다.
+
+사용법:
+    python benchmarks/url_parsing.py --urls 200000 --repeat 3
+"""
+import argparse
+import hashlib
+import os
+import random
+import re
+import string
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import urls  # noqa: E402
+
+
+# ---------------------------------------------------------------------------
+# 예전 구현 (비교 기준)
+# ---------------------------------------------------------------------------
+
+def legacy_is_valid_youtube_url(url):
+    youtube_regex = (
+        r'(?:https?://)?(?:www\.|m\.)?'
+        r'(?:youtube\.com|youtu\.be)/'
+        r'(?:watch\?v=|embed/|v/|shorts/|.+\?v=)?'
+        r'([a-zA-Z0-9_-]{11})'
+        r'(?:&[a-zA-Z0-9=%-]*)*'
+    )
+    return re.match(youtube_regex, url)
+
+
+def legacy_is_twitter_url(url):
+    return re.match(r'(https?://)?(www\.)?(x\.com|twitter\.com)/.+', url) is not None
+
+
+def legacy_is_vimeo_url(url):
+    return re.match(r'(https?://)?(www\.)?vimeo\.com/.+', url) is not None
+
+
+def legacy_is_supported_url(url):
+    return bool(legacy_is_valid_youtube_url(url) or legacy_is_twitter_url(url) or legacy_is_vimeo_url(url))
+
+
+def legacy_normalize_youtube_url(url):
+    m = re.match(r'(https?://)?(www\.)?youtube\.com/shorts/([a-zA-Z0-9\-_]{11})', url)
+    if m:
+        return f"https://www.youtube.com/watch?v={m.group(3)}"
+    youtube_regex = (
+        r'(https?://)?(www\.)?'
+        r'(youtube\.com|youtu\.be)/'
+        r'(watch\?v=|embed/|v/|.+\?v=)?([a-zA-Z0-9\-_]{11})'
+    )
+    m = re.match(youtube_regex, url)
+    if not m:
+        return url
+    return f"https://www.youtube.com/watch?v={m.group(5)}"
+
+
+_LEGACY_YOUTUBE_ID_RE = re.compile(
+    r'(?:https?://)?(?:www\.|m\.)?(?:youtube\.com|youtu\.be)/'
+    r'(?:watch\?v=|embed/|v/|shorts/|.+\?v=)?([a-zA-Z0-9_-]{11})'
+)
+_LEGACY_TWITTER_ID_RE = re.compile(r'(?:https?://)?(?:www\.)?(?:x\.com|twitter\.com)/.+/status/(\d+)')
+_LEGACY_VIMEO_ID_RE = re.compile(r'(?:https?://)?(?:www\.)?vimeo\.com/(?:.*/)?(\d+)')
+
+
+def legacy_media_key(url):
+    url = (url or "").strip()
+    for platform, regex in (("youtube", _LEGACY_YOUTUBE_ID_RE), ("twitter", _LEGACY_TWITTER_ID_RE), ("vimeo", _LEGACY_VIMEO_ID_RE)):
+        m = regex.match(url)
+        if m:
+            return f"{platform}:{m.group(1)}"
+    return "url:" + hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def legacy_pipeline(url):
+    """/download + download_video 가 예전에 하던 순서 그대로."""
+    if not legacy_is_supported_url(url):
+        return None
+    if legacy_is_valid_youtube_url(url):
+        url = legacy_normalize_youtube_url(url)
+    key = legacy_media_key(url)
+    lower = url.lower()
+    best = "twitter.com" in lower or "x.com" in lower or "vimeo.com" in lower
+    return url, key, best
+
+
+def new_pipeline(url):
+    parsed = urls.parse(url)
+    if parsed is None:
+        return None
+    return parsed.url, parsed.key, not urls.PLATFORMS[parsed.platform].honors_quality
+
+
+# ---------------------------------------------------------------------------
+# 코퍼스
+# ---------------------------------------------------------------------------
+
+_ID_CHARS = string.ascii_letters + string.digits + "-_"
+
+
+def _yt_id(rnd):
+    return "".join(rnd.choice(_ID_CHARS) for _ in range(11))
+
+
+def _digits(rnd, n=19):
+    return str(rnd.randrange(10 ** (n - 1), 10 ** n))
+
+
+def _token(rnd, n=16):
+    return "".join(rnd.choice(string.ascii_letters + string.digits) for _ in range(n))
+
+
+SHAPES = {
+    "yt_watch": lambda r: f"https://www.youtube.com/watch?v={_yt_id(r)}",
+    "yt_watch_t": lambda r: f"https://www.youtube.com/watch?v={_yt_id(r)}&t={r.randrange(1, 600)}s",
+    "yt_watch_list": lambda r: f"https://www.youtube.com/watch?v={_yt_id(r)}&list=PL{_token(r, 32)}&index={r.randrange(1, 50)}",
+    "yt_watch_share": lambda r: f"https://youtube.com/watch?v={_yt_id(r)}&feature=share",
+    "yt_watch_v_later": lambda r: f"https://www.youtube.com/watch?feature=youtu.be&v={_yt_id(r)}",
+    "yt_mobile": lambda r: f"https://m.youtube.com/watch?v={_yt_id(r)}",
+    "yt_music": lambda r: f"https://music.youtube.com/watch?v={_yt_id(r)}&feature=share",
+    "yt_no_scheme": lambda r: f"youtube.com/watch?v={_yt_id(r)}",
+    "youtu_be": lambda r: f"https://youtu.be/{_yt_id(r)}",
+    "youtu_be_si": lambda r: f"https://youtu.be/{_yt_id(r)}?si={_token(r)}",
+    "yt_shorts": lambda r: f"https://www.youtube.com/shorts/{_yt_id(r)}",
+    "yt_shorts_share": lambda r: f"https://youtube.com/shorts/{_yt_id(r)}?feature=share",
+    "yt_embed": lambda r: f"https://www.youtube.com/embed/{_yt_id(r)}?autoplay=1",
+    "yt_v": lambda r: f"https://www.youtube.com/v/{_yt_id(r)}",
+    "yt_live": lambda r: f"https://www.youtube.com/live/{_yt_id(r)}?si={_token(r)}",
+    "yt_playlist": lambda r: f"https://www.youtube.com/playlist?list=PL{_token(r, 32)}",
+    "x_status": lambda r: f"https://x.com/{_token(r, 8)}/status/{_digits(r)}",
+    "twitter_status_params": lambda r: f"https://twitter.com/{_token(r, 8)}/status/{_digits(r)}?s=20&t={_token(r, 22)}",
+    "twitter_mobile": lambda r: f"https://mobile.twitter.com/{_token(r, 8)}/status/{_digits(r)}",
+    "x_web_status": lambda r: f"https://x.com/i/web/status/{_digits(r)}",
+    "x_status_video": lambda r: f"https://x.com/{_token(r, 8)}/status/{_digits(r)}/video/1",
+    "x_profile": lambda r: f"https://x.com/{_token(r, 8)}",
+    "vimeo": lambda r: f"https://vimeo.com/{_digits(r, 9)}",
+    "vimeo_channel": lambda r: f"https://vimeo.com/channels/staffpicks/{_digits(r, 9)}",
+    "vimeo_share": lambda r: f"https://www.vimeo.com/{_digits(r, 9)}?share=copy",
+    "vimeo_player": lambda r: f"https://player.vimeo.com/video/{_digits(r, 9)}",
+    "dailymotion": lambda r: f"https://www.dailymotion.com/video/x{_token(r, 6)}",
+    "lookalike": lambda r: f"https://www.youtube.com.example.net/watch?v={_yt_id(r)}",
+    "garbage": lambda r: _token(r, 24),
+}
+
+# 실제 유입 비율에 가깝게 YouTube watch / youtu.be 공유 링크 비중을 높인다.
+WEIGHTS = {
+    "yt_watch": 30, "yt_watch_t": 6, "yt_watch_list": 8, "yt_watch_share": 4, "yt_watch_v_later": 2,
+    "yt_mobile": 5, "yt_music": 2, "yt_no_scheme": 2, "youtu_be": 8, "youtu_be_si": 12,
+    "yt_shorts": 6, "yt_shorts_share": 4, "yt_embed": 1, "yt_v": 1, "yt_live": 1, "yt_playlist": 1,
+    "x_status": 4, "twitter_status_params": 2, "twitter_mobile": 1, "x_web_status": 1, "x_status_video": 1,
+    "x_profile": 1, "vimeo": 2, "vimeo_channel": 1, "vimeo_share": 1, "vimeo_player": 1,
+    "dailymotion": 1, "lookalike": 1, "garbage": 1,
+}
+
+
+def make_corpus(count: int, seed: int):
+    rnd = random.Random(seed)
+    names = list(WEIGHTS)
+    shapes = rnd.choices(names, weights=[WEIGHTS[n] for n in names], k=count)
+    return [(name, SHAPES[name](rnd)) for name in shapes]
+
+
+def bench(func, corpus, repeat: int, before=None) -> float:
+    """URL 하나당 평균 시간 (ns, repeat 중 최솟값)."""
+    best = None
+    for _ in range(repeat):
+        if before:
+            before()
+        start = time.perf_counter()
+        for url in corpus:
+            func(url)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(corpus) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--urls", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.urls, args.seed)
+    plain = [url for _, url in corpus]
+
+    # urls.parse 의 LRU 캐시보다 코퍼스가 크면 cold 측정은 캐시 hit 없이 진행된다.
+    legacy_ns = bench(legacy_pipeline, plain, args.repeat)
+    cold_ns = bench(new_pipeline, plain, args.repeat, before=urls.parse.cache_clear)
+    warm_sample = plain[:1000]
+    warm_ns = bench(new_pipeline, warm_sample * 10, args.repeat)
+
+    print(f"{len(plain)} URLs, {len(SHAPES)} shapes")
+    print(f"{'pipeline':>14} {'ns/url':>9} {'speedup':>8}")
+    print(f"{'legacy':>14} {legacy_ns:>9.0f} {1.0:>7.2f}x")
+    print(f"{'urls (cold)':>14} {cold_ns:>9.0f} {legacy_ns / cold_ns:>7.2f}x")
+    print(f"{'urls (warm)':>14} {warm_ns:>9.0f} {legacy_ns / warm_ns:>7.2f}x")
+
+    urls.parse.cache_clear()
+    diffs = Counter()
+    examples = {}
+    for name, url in corpus:
+        old, new = legacy_pipeline(url), new_pipeline(url)
+        if old != new:
+            diffs[name] += 1
+            examples.setdefault(name, (url, old, new))
+    if diffs:
+        print("\nshapes where results differ (legacy → urls):")
+        for name, count in sorted(diffs.items()):
+            url, old, new = examples[name]
+            print(f"  {name:<22} {count:>6}  {url}")
+            print(f"  {'':<22} {'':>6}    {old}")
+            print(f"  {'':<22} {'':>6}  → {new}")
+
+
+if __name__ == "__main__":
+    main()
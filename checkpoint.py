@@ -0,0 +1,163 @@
+"""다운로드 job 체크포인트와 남은 조각(partial) 파일 정리.
+
+worker 가 죽거나 job timeout 으로 중간에 끝나면 uploads/ 에 yt_dlp 의 .part 파일이 남는다.
+같은 결과(영상, format, quality)를 만드는 job 이 다시 실행되면(RQ 재시도 또는 사용자가 다시 요청)
+체크포인트를 보고 이미 끝난 단계는 건너뛰고, 받던 파일은 yt_dlp 의 이어받기(continuedl)로 계속 받는다.
+
+- yt_checkpoint:<platform>:<id>:<format>:<quality> (hash)
+  stage / output_prefix / download_path / sources(JSON) / job_id / updated_at
+- stage: downloading → downloaded(원본 다운로드 완료) → converting. 결과 파일이 등록되면 지운다.
+- yt_checkpoint:all (set) 에 키를 모아 두고, worker 시작 시 체크포인트가 없는(또는 만료된)
+  오래된 조각 파일을 지운다.
+"""
+import json
+import logging
+import os
+import re
+import time
+from typing import Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_KEY_PREFIX = "yt_checkpoint"
+CHECKPOINT_SET_KEY = f"{CHECKPOINT_KEY_PREFIX}:all"
+
+# 체크포인트(와 이어받을 조각 파일) 유지 시간 (기본 1일)
+CHECKPOINT_TTL = int(os.environ.get("CHECKPOINT_TTL", "86400"))
+# 체크포인트가 없는 조각 파일은 마지막 수정 후 이 시간이 지나면 지운다. (가장 긴 job timeout 이상)
+STALE_PARTIAL_SECONDS = int(os.environ.get("STALE_PARTIAL_SECONDS", "3600"))
+
+STAGE_DOWNLOADING = "downloading"
+STAGE_DOWNLOADED = "downloaded"
+STAGE_CONVERTING = "converting"
+
+# yt_dlp: <name>.part, <name>.part-Frag<n>(.part), <name>.ytdl / ffmpeg 변환(transcode.run): <name>.part.<ext>
+_PARTIAL_RE = re.compile(r"\.part(?:-Frag\d+(?:\.part)?)?$|\.ytdl$|\.part\.\w+$")
+
+
+def checkpoint_key(media_key: str, format: str, quality: str) -> str:
+    return f"{CHECKPOINT_KEY_PREFIX}:{media_key}:{format}:{quality}"
+
+
+def _str(value) -> Optional[str]:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def load(conn, key: Optional[str]) -> dict:
+    """저장된 체크포인트. 없거나 Redis 장애 시 빈 dict."""
+    if not key:
+        return {}
+    try:
+        raw = conn.hgetall(key) or {}
+    except Exception as e:
+        logger.error(f"Failed to read checkpoint {key}: {e}")
+        return {}
+    cp = {_str(k): _str(v) for k, v in raw.items()}
+    if cp.get("sources"):
+        try:
+            cp["sources"] = json.loads(cp["sources"])
+        except ValueError:
+            cp["sources"] = []
+    return cp
+
+
+def save(conn, key: Optional[str], stage: str, **fields) -> None:
+    """단계와 필드를 기록. (None 값은 건너뛰고, list/dict 는 JSON 으로 저장)"""
+    if not key:
+        return
+    mapping = {"stage": stage, "updated_at": str(int(time.time()))}
+    for k, v in fields.items():
+        if v is None:
+            continue
+        mapping[k] = json.dumps(v) if isinstance(v, (list, dict)) else str(v)
+    try:
+        pipe = conn.pipeline()
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, CHECKPOINT_TTL)
+        pipe.sadd(CHECKPOINT_SET_KEY, key)
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Failed to save checkpoint {key}: {e}")
+
+
+def clear(conn, key: Optional[str]) -> None:
+    if not key:
+        return
+    try:
+        pipe = conn.pipeline()
+        pipe.delete(key)
+        pipe.srem(CHECKPOINT_SET_KEY, key)
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Failed to clear checkpoint {key}: {e}")
+
+
+def resumable_download(cp: dict) -> Optional[str]:
+    """원본 다운로드까지 끝난 체크포인트면 받아 둔 파일 경로 (파일이 없으면 None)."""
+    path = cp.get("download_path")
+    if cp.get("stage") in (STAGE_DOWNLOADED, STAGE_CONVERTING) and path and os.path.isfile(path):
+        return path
+    return None
+
+
+def is_partial(name: str) -> bool:
+    return bool(_PARTIAL_RE.search(name))
+
+
+def _live_prefixes(conn) -> set:
+    """아직 유효한 체크포인트의 output_prefix 목록. 만료된 키는 set 에서 정리한다."""
+    prefixes = set()
+    keys = [_str(k) for k in conn.smembers(CHECKPOINT_SET_KEY)]
+    if not keys:
+        return prefixes
+    pipe = conn.pipeline(transaction=False)
+    for key in keys:
+        pipe.hget(key, "output_prefix")
+    expired = []
+    for key, prefix in zip(keys, pipe.execute()):
+        if prefix is None:
+            expired.append(key)
+        else:
+            prefixes.add(os.path.abspath(_str(prefix)))
+    if expired:
+        conn.srem(CHECKPOINT_SET_KEY, *expired)
+    return prefixes
+
+
+def cleanup_stale(conn, base_dir: str, max_age: int = STALE_PARTIAL_SECONDS) -> Tuple[int, int]:
+    """체크포인트가 가리키지 않는 오래된 조각 파일을 지우고 (파일 수, 바이트) 를 반환.
+
+    Redis 를 읽지 못하면 이어받을 파일을 지울 수 있으므로 아무것도 지우지 않는다.
+    """
+    try:
+        live = _live_prefixes(conn)
+    except Exception as e:
+        logger.error(f"Failed to read checkpoints, skipping partial cleanup: {e}")
+        return 0, 0
+
+    removed = freed = 0
+    now = time.time()
+    try:
+        entries = list(os.scandir(base_dir))
+    except FileNotFoundError:
+        return 0, 0
+    for entry in entries:
+        if not is_partial(entry.name):
+            continue
+        path = os.path.abspath(entry.path)
+        if any(path.startswith(prefix + ".") for prefix in live):
+            continue
+        try:
+            stat = entry.stat(follow_symlinks=False)
+            if now - stat.st_mtime < max_age:
+                continue
+            os.remove(entry.path)
+        except OSError as e:
+            logger.warning(f"Failed to remove stale partial {entry.path}: {e}")
+            continue
+        removed += 1
+        freed += stat.st_size
+    if removed:
+        logger.info("Removed %s stale partial files (%s bytes) from %s", removed, freed, base_dir)
+    return removed, freed
@@ -0,0 +1,65 @@
+"""병렬 fragment / chunk 다운로드 설정.
+
+DASH/HLS 영상은 수백 개의 작은 fragment 로 나뉘어 있어서, 기본 설정(한 번에 하나씩)
+으로는 대역폭보다 왕복 지연(latency)에 묶인다. job 마다 여러 fragment 를 동시에 받도록
+yt_dlp 옵션을 구성하되, 같은 호스트의 worker 들이 쓰는 동시 연결 수 합계는 제한한다.
+
+- FRAGMENT_CONCURRENCY: job 하나가 동시에 받는 fragment 수
+- WORKER_MAX_CONNECTIONS: 한 호스트(컨테이너)의 모든 worker 가 쓰는 동시 연결 수 상한
+- HTTP_CHUNK_SIZE: fragment 가 없는 단일 파일을 range 요청으로 나눠 받는 크기 (0 이면 사용 안 함)
+"""
+import logging
+import os
+import socket
+
+
+logger = logging.getLogger(__name__)
+
+FRAGMENT_CONCURRENCY = int(os.environ.get("FRAGMENT_CONCURRENCY", "4"))
+WORKER_MAX_CONNECTIONS = int(os.environ.get("WORKER_MAX_CONNECTIONS", "16"))
+HTTP_CHUNK_SIZE = int(os.environ.get("HTTP_CHUNK_SIZE", str(10 * 1024 * 1024)))
+
+CONNECTION_BUDGET_KEY_PREFIX = "yt_conn_budget"
+
+# worker 가 비정상 종료되어 반납하지 못한 연결 수는 job timeout 이후 초기화된다.
+_BUDGET_TTL = 3600
+
+# 남은 예산 안에서 요청 수만큼 예약. 예산이 없어도 최소 1개는 허용해 job 이 멈추지 않게 한다.
+_RESERVE_SCRIPT = """
+local used = tonumber(redis.call('get', KEYS[1]) or '0')
+local n = math.min(tonumber(ARGV[2]), tonumber(ARGV[1]) - used)
+if n < 1 then n = 1 end
+redis.call('incrby', KEYS[1], n)
+redis.call('expire', KEYS[1], ARGV[3])
+return n
+"""
+
+
+def _budget_key() -> str:
+    return f"{CONNECTION_BUDGET_KEY_PREFIX}:{socket.gethostname()}"
+
+
+def reserve_connections(conn, wanted: int = FRAGMENT_CONCURRENCY) -> int:
+    """이 job 이 사용할 동시 연결 수를 호스트 예산에서 예약하고 그 수를 반환."""
+    wanted = max(1, wanted)
+    try:
+        return int(conn.eval(_RESERVE_SCRIPT, 1, _budget_key(), WORKER_MAX_CONNECTIONS, wanted, _BUDGET_TTL))
+    except Exception as e:
+        logger.error(f"Failed to reserve download connections: {e}")
+        return 1
+
+
+def release_connections(conn, count: int) -> None:
+    try:
+        if conn.decrby(_budget_key(), count) < 0:
+            conn.set(_budget_key(), 0, ex=_BUDGET_TTL)
+    except Exception as e:
+        logger.error(f"Failed to release download connections: {e}")
+
+
+def download_options(connections: int) -> dict:
+    """예약한 연결 수에 맞는 yt_dlp 옵션."""
+    opts = {"concurrent_fragment_downloads": max(1, connections)}
+    if HTTP_CHUNK_SIZE > 0:
+        opts["http_chunk_size"] = HTTP_CHUNK_SIZE
+    return opts
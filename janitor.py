@@ -0,0 +1,118 @@
+"""uploads/ 디렉토리 용량 관리 (LRU eviction).
+
+APScheduler 의 BackgroundScheduler 로 주기 실행된다.
+
+- 사용량이 UPLOADS_MAX_BYTES * UPLOADS_HIGH_WATERMARK 를 넘으면
+  UPLOADS_MAX_BYTES * UPLOADS_LOW_WATERMARK 이하가 될 때까지
+  마지막 사용 시각이 가장 오래된 artifact 부터 삭제한다.
+- lease 가 걸린(전송/변환 중인) 파일과 인덱스에 없는(생성 중인) 파일은 지우지 않는다.
+- 여러 gunicorn worker 에서 동시에 실행되지 않도록 Redis 락을 잡는다.
+"""
+import logging
+import os
+from typing import Optional
+
+from artifacts import (
+    ARTIFACT_LRU_KEY,
+    ARTIFACT_STATS_KEY,
+    get_stats,
+    is_leased,
+    remove,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# 기본 예산 10GiB, 90% 를 넘으면 75% 까지 정리
+UPLOADS_MAX_BYTES = int(os.environ.get("UPLOADS_MAX_BYTES", str(10 * 1024 ** 3)))
+UPLOADS_HIGH_WATERMARK = float(os.environ.get("UPLOADS_HIGH_WATERMARK", "0.9"))
+UPLOADS_LOW_WATERMARK = float(os.environ.get("UPLOADS_LOW_WATERMARK", "0.75"))
+JANITOR_INTERVAL_SECONDS = int(os.environ.get("JANITOR_INTERVAL_SECONDS", "300"))
+
+JANITOR_LOCK_KEY = "yt_artifact:janitor_lock"
+
+# 한 번에 LRU 에서 꺼내 볼 후보 수
+_BATCH = 100
+
+
+def disk_usage(base_dir: str) -> int:
+    """base_dir 바로 아래 파일들의 크기 합."""
+    total = 0
+    try:
+        with os.scandir(base_dir) as it:
+            for entry in it:
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    continue
+    except FileNotFoundError:
+        return 0
+    return total
+
+
+def _evict_one(conn, key: str) -> Optional[int]:
+    """artifact 하나를 삭제하고 해제된 바이트 수를 반환. 지울 수 없으면 None."""
+    if is_leased(conn, key):
+        return None
+
+    path = conn.hget(key, "path")
+    path = path.decode() if isinstance(path, bytes) else path
+    freed = 0
+    if path:
+        try:
+            freed = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            freed = 0
+        except OSError as e:
+            logger.error(f"Failed to evict {path}: {e}")
+            return None
+    remove(conn, key)
+    return freed
+
+
+def run(conn, base_dir: str = "uploads") -> dict:
+    """한 번의 정리 작업을 수행하고 결과를 반환."""
+    result = {"usage": 0, "evicted": 0, "freed": 0}
+    if not conn.set(JANITOR_LOCK_KEY, "1", nx=True, ex=max(JANITOR_INTERVAL_SECONDS, 60)):
+        return result
+
+    try:
+        usage = disk_usage(base_dir)
+        result["usage"] = usage
+        if usage <= UPLOADS_MAX_BYTES * UPLOADS_HIGH_WATERMARK:
+            return result
+
+        target = UPLOADS_MAX_BYTES * UPLOADS_LOW_WATERMARK
+        offset = 0
+        while usage > target:
+            keys = conn.zrange(ARTIFACT_LRU_KEY, offset, offset + _BATCH - 1)
+            if not keys:
+                break
+            for key in keys:
+                key = key.decode() if isinstance(key, bytes) else key
+                freed = _evict_one(conn, key)
+                if freed is None:
+                    # lease 중인 항목은 건너뛰고 다음 후보를 본다.
+                    offset += 1
+                    continue
+                usage -= freed
+                result["evicted"] += 1
+                result["freed"] += freed
+                if usage <= target:
+                    break
+
+        result["usage"] = usage
+        pipe = conn.pipeline()
+        pipe.hincrby(ARTIFACT_STATS_KEY, "evictions", result["evicted"])
+        pipe.hincrby(ARTIFACT_STATS_KEY, "evicted_bytes", result["freed"])
+        pipe.execute()
+    finally:
+        conn.delete(JANITOR_LOCK_KEY)
+
+    logger.info(
+        "Janitor evicted %s files (%s bytes), usage now %s bytes, stats=%s",
+        result["evicted"], result["freed"], result["usage"], get_stats(conn),
+    )
+    return result
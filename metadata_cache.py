@@ -0,0 +1,214 @@
+"""yt_dlp 메타데이터 공용 캐시.
+
+app.py(/details) 와 tasks.py(RQ worker) 가 같은 Redis 에 메타데이터를 공유해서
+같은 영상에 대해 extract_info 네트워크 호출이 한 번만 일어나도록 한다.
+
+- 키는 URL 문자열이 아니라 플랫폼 + 영상 ID 기준 (yt_meta:<platform>:<id>)
+- 정상 메타데이터는 길게, 조회 실패(삭제/비공개 등)는 짧게 TTL 을 둔다.
+- 길이 제한을 넘는 영상도 status=too_long 으로 캐시해서 재조회하지 않는다.
+- hit/miss 카운터는 yt_meta:stats 해시에 누적한다.
+"""
+import json
+import logging
+import os
+from typing import Optional
+
+from metrics import timed
+import ratelimit
+from urls import media_key, platform_of
+import ydl_pool
+
+
+logger = logging.getLogger(__name__)
+
+META_KEY_PREFIX = "yt_meta"
+META_STATS_KEY = f"{META_KEY_PREFIX}:stats"
+
+# 정상 메타데이터 TTL (기본 6시간), 조회 실패 시 negative TTL (기본 5분)
+META_CACHE_TTL = int(os.environ.get("META_CACHE_TTL", "21600"))
+META_NEGATIVE_TTL = int(os.environ.get("META_NEGATIVE_TTL", "300"))
+
+# 최대 영상 길이 (초 단위, 기본값 600초=10분)
+MAX_DURATION_SECONDS = int(os.environ.get("MAX_DURATION_SECONDS", "600"))
+
+STATUS_OK = "ok"
+STATUS_TOO_LONG = "too_long"
+STATUS_UNAVAILABLE = "unavailable"
+# 업스트림 throttling 으로 조회하지 못한 경우. 영상 문제가 아니므로 캐시하지 않는다.
+STATUS_THROTTLED = "throttled"
+
+def _pick_thumbnail(info_dict: dict) -> Optional[str]:
+    # 썸네일은 플랫폼마다 위치가 다를 수 있으므로 몇 가지 후보를 순서대로 찾는다.
+    thumbnail = info_dict.get('thumbnail')
+    if not thumbnail:
+        # yt_dlp 표준 thumbnails 필드
+        thumbs = info_dict.get('thumbnails') or []
+        if isinstance(thumbs, list) and thumbs:
+            # 가장 마지막(보통 가장 고해상도)을 사용
+            thumbnail = thumbs[-1].get('url') or thumbs[0].get('url')
+    if not thumbnail:
+        # 일부 사이트(예: Twitter/X)에서 쓰는 필드명 대비
+        thumbnail = info_dict.get('thumbnail_url')
+    return thumbnail
+
+
+def _summarize(info_dict: dict) -> dict:
+    """extract_info 결과에서 캐시에 보관할 필드만 추린다.
+
+    process=False 결과에는 generator 등 직렬화할 수 없는 값이 섞여 있을 수 있다.
+    """
+    duration = info_dict.get('duration') or 0
+    if duration == 0 or duration > MAX_DURATION_SECONDS:
+        status = STATUS_TOO_LONG
+    else:
+        status = STATUS_OK
+    return {
+        'status': status,
+        'id': info_dict.get('id'),
+        'title': info_dict.get('title'),
+        'uploader': info_dict.get('uploader') or info_dict.get('channel') or info_dict.get('uploader_id'),
+        'thumbnail': _pick_thumbnail(info_dict),
+        'duration': info_dict.get('duration'),
+        'extractor_key': info_dict.get('extractor_key'),
+        'webpage_url': info_dict.get('webpage_url'),
+    }
+
+
+def _incr_stat(conn, field: str) -> None:
+    try:
+        conn.hincrby(META_STATS_KEY, field, 1)
+    except Exception as e:
+        logger.debug(f"Failed to update metadata cache stats: {e}")
+
+
+def extract_metadata(url: str, cookie_file: Optional[str] = None, conn=None) -> Optional[dict]:
+    """캐시를 거치지 않고 yt_dlp 로 메타데이터를 직접 조회한다.
+
+    conn 을 넘기면 업스트림 속도 제한(ratelimit)을 거치고, 쿠키 풀에서 쿠키를 고른다.
+    이때 throttling 응답을 받으면 {'status': 'throttled'} 를 반환한다.
+    """
+    # 영상 정보만 조회할 때는 포맷을 강제할 필요가 없으므로
+    # format 옵션은 제거한다. (일부 영상에서 "Requested format is not available" 에러를 유발)
+    ydl_opts: dict = {
+        'quiet': True,
+        'no_warnings': True,
+    }
+    platform = platform_of(url)
+    if conn is not None:
+        cookie_file = ratelimit.acquire(conn, platform, ratelimit.cookie_candidates(cookie_file))
+    if cookie_file and os.path.exists(cookie_file):
+        ydl_opts['cookiefile'] = cookie_file
+
+    try:
+        with ydl_pool.session(ydl_opts) as ydl:
+            # process=False 로 설정해 포맷 선택 과정을 건너뛰고 원시 메타데이터만 가져온다.
+            info_dict = ydl.extract_info(url, download=False, process=False)
+    except Exception as e:
+        logger.error(f"Failed to retrieve video info: {e}")
+        if conn is not None and ratelimit.is_throttled(e):
+            ratelimit.penalize(conn, platform, cookie_file)
+            return {'status': STATUS_THROTTLED}
+        return None
+
+    if conn is not None:
+        ratelimit.reward(conn, platform, cookie_file)
+
+    if not isinstance(info_dict, dict):
+        return None
+    return _summarize(info_dict)
+
+
+def get_metadata(conn, url: str, cookie_file: Optional[str] = None) -> Optional[dict]:
+    """캐시를 우선 조회하고, 없으면 yt_dlp 로 조회한 뒤 캐시에 저장한다.
+
+    - 반환값의 'status' 가 ok / too_long 인 dict, 조회 불가면 None
+    - Redis 장애 시에는 캐시 없이 직접 조회한다.
+    """
+    key = f"{META_KEY_PREFIX}:{media_key(url)}"
+
+    cached = None
+    try:
+        cached = conn.get(key)
+    except Exception as e:
+        logger.error(f"Failed to read metadata cache for {url}: {e}")
+
+    if cached:
+        try:
+            meta = json.loads(cached)
+        except ValueError:
+            meta = None
+        if meta is not None:
+            if meta.get('status') == STATUS_UNAVAILABLE:
+                _incr_stat(conn, "negative_hit")
+                return None
+            _incr_stat(conn, "hit")
+            meta['url'] = url
+            return meta
+
+    _incr_stat(conn, "miss")
+    with timed(conn, "metadata"):
+        meta = extract_metadata(url, cookie_file, conn)
+
+    if meta is not None and meta.get('status') == STATUS_THROTTLED:
+        return None
+    if meta is None:
+        value, ttl = {'status': STATUS_UNAVAILABLE}, META_NEGATIVE_TTL
+    else:
+        value, ttl = meta, META_CACHE_TTL
+
+    try:
+        conn.set(key, json.dumps(value, ensure_ascii=False), ex=ttl)
+    except Exception as e:
+        logger.error(f"Failed to write metadata cache for {url}: {e}")
+
+    if meta is not None:
+        meta['url'] = url
+    return meta
+
+
+def peek_metadata(conn, url: str, count_hit: bool = False) -> Optional[dict]:
+    """캐시에 있는 메타데이터만 반환 (없으면 조회하지 않고 None).
+
+    count_hit=True 이면 찾은 경우 hit 통계에 반영한다. (miss 는 이어서 get_metadata 가 집계)
+    """
+    return peek_by_key(conn, media_key(url), count_hit)
+
+
+def is_unavailable(conn, url: str) -> bool:
+    """조회 실패(삭제/비공개 등)로 negative 캐시된 영상인지. (throttling 은 캐시하지 않으므로 해당 없음)"""
+    try:
+        cached = conn.get(f"{META_KEY_PREFIX}:{media_key(url)}")
+        meta = json.loads(cached) if cached else None
+    except Exception:
+        return False
+    return bool(meta) and meta.get('status') == STATUS_UNAVAILABLE
+
+
+def peek_by_key(conn, mkey: str, count_hit: bool = False) -> Optional[dict]:
+    """peek_metadata 와 같지만 URL 대신 media key('<platform>:<id>')로 찾는다."""
+    try:
+        cached = conn.get(f"{META_KEY_PREFIX}:{mkey}")
+        meta = json.loads(cached) if cached else None
+    except Exception:
+        return None
+    if not meta or meta.get('status') == STATUS_UNAVAILABLE:
+        return None
+    if count_hit:
+        _incr_stat(conn, "hit")
+    return meta
+
+
+def get_stats(conn) -> dict:
+    """캐시 hit/miss 카운터를 정수 dict 로 반환."""
+    try:
+        raw = conn.hgetall(META_STATS_KEY) or {}
+    except Exception:
+        return {}
+    stats = {}
+    for k, v in raw.items():
+        k = k.decode() if isinstance(k, bytes) else k
+        try:
+            stats[k] = int(v)
+        except (TypeError, ValueError):
+            continue
+    return stats
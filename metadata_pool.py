@@ -0,0 +1,87 @@
+"""/details 요청의 메타데이터 조회를 요청 스레드 밖에서 실행하는 스레드 풀.
+
+yt_dlp 조회는 수 초~수십 초 걸릴 수 있어 요청 스레드에서 직접 실행하면 느린 영상 하나가
+gunicorn 스레드를 붙잡는다. 조회는 크기가 정해진 스레드 풀에서 실행하고, 요청은 마감 시간까지만
+기다린 뒤 끝나지 않았으면 제목 없이 먼저 응답한다. (페이지가 /details/info 로 이어서 채운다)
+
+- 같은 영상(media_key)을 동시에 조회하면 진행 중인 조회 하나를 함께 기다린다.
+- 대기 중인 조회가 METADATA_MAX_PENDING 개를 넘으면 새 조회를 받지 않는다.
+- 캐시에 있는 메타데이터는 스레드 풀을 거치지 않는다.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Optional, Tuple
+
+from metadata_cache import get_metadata, peek_metadata
+from urls import media_key
+
+
+logger = logging.getLogger(__name__)
+
+# 동시에 실행할 yt_dlp 조회 수
+METADATA_WORKERS = int(os.environ.get("METADATA_WORKERS", "8"))
+# 실행 대기 + 실행 중 조회 수 상한
+METADATA_MAX_PENDING = int(os.environ.get("METADATA_MAX_PENDING", "64"))
+# /details 가 조회 완료를 기다리는 최대 시간 (초)
+DETAILS_TIMEOUT = float(os.environ.get("DETAILS_TIMEOUT", "5"))
+
+PENDING = "pending"
+BUSY = "busy"
+DONE = "done"
+
+_executor = ThreadPoolExecutor(max_workers=METADATA_WORKERS, thread_name_prefix="metadata")
+_lock = threading.Lock()
+# media_key → 진행 중인 조회
+_inflight: dict = {}
+
+
+def _forget(key: str, future: Future) -> None:
+    with _lock:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+
+
+def submit(conn, url: str, cookie_file: Optional[str] = None) -> Optional[Future]:
+    """조회를 시작하거나 진행 중인 조회에 합류. 대기 조회가 상한이면 None."""
+    key = media_key(url)
+    with _lock:
+        future = _inflight.get(key)
+        if future is not None:
+            return future
+        if len(_inflight) >= METADATA_MAX_PENDING:
+            return None
+        future = _executor.submit(get_metadata, conn, url, cookie_file)
+        _inflight[key] = future
+    future.add_done_callback(lambda f: _forget(key, f))
+    return future
+
+
+def fetch(conn, url: str, cookie_file: Optional[str] = None, timeout: Optional[float] = None) -> Tuple[str, Optional[dict]]:
+    """timeout(기본 DETAILS_TIMEOUT) 초까지 메타데이터를 기다린다.
+
+    - (DONE, meta): 조회 완료 (조회 불가면 meta 는 None)
+    - (PENDING, None): 아직 조회 중 (백그라운드에서 계속 진행)
+    - (BUSY, None): 대기 조회가 너무 많아 받지 않음
+    """
+    cached = peek_metadata(conn, url, count_hit=True)
+    if cached is not None:
+        cached['url'] = url
+        return DONE, cached
+
+    future = submit(conn, url, cookie_file)
+    if future is None:
+        return BUSY, None
+    try:
+        return DONE, future.result(timeout=DETAILS_TIMEOUT if timeout is None else timeout)
+    except FutureTimeout:
+        return PENDING, None
+    except Exception as e:
+        logger.error(f"Failed to retrieve video info for {url}: {e}")
+        return DONE, None
+
+
+def pending_count() -> int:
+    with _lock:
+        return len(_inflight)
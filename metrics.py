@@ -0,0 +1,217 @@
+"""Prometheus 텍스트 형식 메트릭.
+
+gunicorn web worker 와 RQ worker 는 서로 다른 프로세스이므로, 카운터/히스토그램 값은
+프로세스 메모리가 아니라 Redis 해시에 누적하고 /metrics 요청 시 한 번에 읽어 렌더링한다.
+
+- yt_metrics:<metric name> (hash) 필드는 '<label 문자열>\\t<suffix>' 형식
+  (카운터: suffix 없음, 히스토그램: bucket 상한 / sum / count)
+- 큐 길이/대기 시간처럼 현재 상태를 나타내는 값은 렌더링 시점에 직접 계산한다.
+- 메트릭 기록 실패는 요청/작업 처리에 영향을 주지 않도록 debug 로그만 남긴다.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from datetime import timezone
+from typing import Iterable, Optional
+
+from rq.job import Job
+
+from scheduling import oldest_waiting
+
+
+logger = logging.getLogger(__name__)
+
+METRICS_KEY_PREFIX = "yt_metrics"
+
+# 단계별 소요 시간 히스토그램 bucket (초)
+PHASE_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+COUNTERS = {
+    "yt_downloaded_bytes_total": "Bytes downloaded from upstream platforms.",
+    "yt_job_failures_total": "Failed download jobs by reason.",
+    "yt_artifact_results_total": "How job results were produced (index hit, legacy path reuse, local derive, download).",
+    "yt_upstream_throttled_total": "Throttling responses (429, bot check) received from upstream platforms.",
+    "yt_upstream_wait_seconds_total": "Seconds spent waiting for upstream rate limit tokens.",
+}
+HISTOGRAMS = {
+    "yt_phase_duration_seconds": ("Latency of pipeline phases (metadata, download, transcode).", PHASE_BUCKETS),
+}
+
+
+def _labels(labels: dict) -> str:
+    return ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+
+
+def inc(conn, name: str, amount: float = 1, **labels) -> None:
+    """카운터 증가."""
+    try:
+        conn.hincrbyfloat(f"{METRICS_KEY_PREFIX}:{name}", _labels(labels), amount)
+    except Exception as e:
+        logger.debug(f"Failed to record metric {name}: {e}")
+
+
+def observe(conn, name: str, value: float, **labels) -> None:
+    """히스토그램에 값 기록. bucket 은 누적하지 않고 해당 구간만 올리고, 렌더링할 때 누적한다."""
+    buckets = HISTOGRAMS[name][1]
+    label_str = _labels(labels)
+    le = next((str(b) for b in buckets if value <= b), "+Inf")
+    try:
+        pipe = conn.pipeline(transaction=False)
+        key = f"{METRICS_KEY_PREFIX}:{name}"
+        pipe.hincrby(key, f"{label_str}\tbucket:{le}", 1)
+        pipe.hincrbyfloat(key, f"{label_str}\tsum", value)
+        pipe.hincrby(key, f"{label_str}\tcount", 1)
+        pipe.execute()
+    except Exception as e:
+        logger.debug(f"Failed to record metric {name}: {e}")
+
+
+@contextmanager
+def timed(conn, phase: str):
+    """with 블록의 소요 시간을 yt_phase_duration_seconds{phase=...} 로 기록 (예외가 나도 기록)."""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        observe(conn, "yt_phase_duration_seconds", time.monotonic() - started, phase=phase)
+
+
+def _str(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _fmt(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _sample(name: str, label_str: str, value: float) -> str:
+    return f"{name}{{{label_str}}} {_fmt(value)}" if label_str else f"{name} {_fmt(value)}"
+
+
+def _render_counters(name: str, raw: dict) -> list:
+    lines = [f"# HELP {name} {COUNTERS[name]}", f"# TYPE {name} counter"]
+    for label_str, value in sorted(raw.items()):
+        lines.append(_sample(name, label_str, float(value)))
+    return lines
+
+
+def _render_histogram(name: str, raw: dict) -> list:
+    help_text, buckets = HISTOGRAMS[name]
+    series = {}
+    for field, value in raw.items():
+        label_str, _, suffix = field.partition("\t")
+        series.setdefault(label_str, {})[suffix] = float(value)
+
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for label_str, values in sorted(series.items()):
+        cumulative = 0.0
+        for le in [str(b) for b in buckets] + ["+Inf"]:
+            cumulative += values.get(f"bucket:{le}", 0.0)
+            bucket_labels = f'{label_str},le="{le}"' if label_str else f'le="{le}"'
+            lines.append(_sample(f"{name}_bucket", bucket_labels, cumulative))
+        lines.append(_sample(f"{name}_sum", label_str, values.get("sum", 0.0)))
+        lines.append(_sample(f"{name}_count", label_str, values.get("count", 0.0)))
+    return lines
+
+
+def _render_queues(conn, queues: Iterable) -> list:
+    """큐 길이와 가장 오래 기다린 job 의 대기 시간."""
+    depth = ["# HELP yt_queue_depth Jobs waiting in each RQ queue.", "# TYPE yt_queue_depth gauge"]
+    age = [
+        "# HELP yt_queue_oldest_job_age_seconds Age of the oldest waiting job in each RQ queue.",
+        "# TYPE yt_queue_oldest_job_age_seconds gauge",
+    ]
+    now = time.time()
+    for queue in queues:
+        label_str = f'queue="{queue.name}"'
+        try:
+            count = queue.count
+            # 큐는 비용 순서라 맨 앞 job 이 가장 오래 기다린 job 이 아니다. 비용 순서로 넣지 않은 job
+            # (재시도로 다시 들어온 job 등) 도 빠지지 않도록 맨 앞 job 과 대기 목록 중 더 이른 쪽을 쓴다.
+            candidates = [oldest_waiting(conn, queue.name)]
+            head_ids = queue.get_job_ids(0, 0)
+            head = Job.fetch(head_ids[0], connection=conn) if head_ids else None
+        except Exception as e:
+            logger.debug(f"Failed to inspect queue {queue.name}: {e}")
+            continue
+        depth.append(_sample("yt_queue_depth", label_str, count))
+        if head is not None and head.enqueued_at is not None:
+            candidates.append(head.enqueued_at.replace(tzinfo=timezone.utc).timestamp())
+        enqueued = [ts for ts in candidates if ts is not None]
+        seconds = now - min(enqueued) if enqueued else 0.0
+        age.append(_sample("yt_queue_oldest_job_age_seconds", label_str, max(0.0, seconds)))
+    return depth + age
+
+
+def _render_cache_stats(name: str, help_text: str, stats: dict) -> list:
+    lines = [f"# HELP {name}_lookups_total {help_text}", f"# TYPE {name}_lookups_total counter"]
+    for result in ("hit", "miss", "negative_hit"):
+        if result in stats:
+            lines.append(_sample(f"{name}_lookups_total", f'result="{result}"', stats[result]))
+    hits = stats.get("hit", 0)
+    total = hits + stats.get("miss", 0)
+    lines += [
+        f"# HELP {name}_hit_ratio Hit ratio of {name.replace('_', ' ')} lookups.",
+        f"# TYPE {name}_hit_ratio gauge",
+        _sample(f"{name}_hit_ratio", "", round(hits / total, 4) if total else 0.0),
+    ]
+    return lines
+
+
+def _render_prefetch_stats(stats: dict) -> list:
+    lines = ["# HELP yt_prefetch_total Speculative source prefetch jobs by result.", "# TYPE yt_prefetch_total counter"]
+    for result in ("started", "completed", "hit", "cancelled", "failed", "skipped"):
+        lines.append(_sample("yt_prefetch_total", f'result="{result}"', stats.get(result, 0)))
+    lines += [
+        "# HELP yt_prefetch_bytes_total Bytes downloaded by speculative prefetch jobs.",
+        "# TYPE yt_prefetch_bytes_total counter",
+        _sample("yt_prefetch_bytes_total", "", stats.get("bytes", 0)),
+        "# HELP yt_prefetch_hit_ratio Completed prefetches later used by a download.",
+        "# TYPE yt_prefetch_hit_ratio gauge",
+        _sample("yt_prefetch_hit_ratio", "", stats.get("hit_ratio", 0.0)),
+    ]
+    return lines
+
+
+def render(
+    conn,
+    queues: Iterable = (),
+    metadata_stats: Optional[dict] = None,
+    artifact_stats: Optional[dict] = None,
+    prefetch_stats: Optional[dict] = None,
+) -> str:
+    """모든 메트릭을 Prometheus 텍스트 형식(0.0.4)으로 렌더링."""
+    names = list(COUNTERS) + list(HISTOGRAMS)
+    try:
+        pipe = conn.pipeline(transaction=False)
+        for name in names:
+            pipe.hgetall(f"{METRICS_KEY_PREFIX}:{name}")
+        raws = pipe.execute()
+    except Exception as e:
+        logger.error(f"Failed to read metrics: {e}")
+        raws = [{} for _ in names]
+
+    lines = []
+    for name, raw in zip(names, raws):
+        raw = {_str(k): _str(v) for k, v in (raw or {}).items()}
+        if name in COUNTERS:
+            lines += _render_counters(name, raw)
+        else:
+            lines += _render_histogram(name, raw)
+
+    lines += _render_queues(conn, queues)
+    if metadata_stats is not None:
+        lines += _render_cache_stats("yt_metadata_cache", "Metadata cache lookups.", metadata_stats)
+    if artifact_stats is not None:
+        lines += _render_cache_stats("yt_artifact_cache", "Artifact index lookups.", artifact_stats)
+        lines += [
+            "# HELP yt_artifact_evictions_total Files evicted by the uploads janitor.",
+            "# TYPE yt_artifact_evictions_total counter",
+            _sample("yt_artifact_evictions_total", "", artifact_stats.get("evictions", 0)),
+            "# HELP yt_artifact_evicted_bytes_total Bytes freed by the uploads janitor.",
+            "# TYPE yt_artifact_evicted_bytes_total counter",
+            _sample("yt_artifact_evicted_bytes_total", "", artifact_stats.get("evicted_bytes", 0)),
+        ]
+    if prefetch_stats is not None:
+        lines += _render_prefetch_stats(prefetch_stats)
+    return "\n".join(lines) + "\n"
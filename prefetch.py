@@ -0,0 +1,225 @@
+"""/details 이후 원본 오디오 스트림을 미리 받아 두는 추측(speculative) prefetch.
+
+사용자가 details.html 에서 형식/품질을 고르는 동안, 낮은 우선순위의 prefetch 큐에
+bestaudio 원본 스트림만 받는 job 을 넣는다. 받은 파일은 source:audio artifact 로 등록되므로
+이후 MP3 /download job 은 네트워크 없이 로컬 변환(_derive_locally)만 한다.
+
+- PREFETCH_ENABLED=1 일 때만 동작한다. (기본 꺼짐)
+- 동시에 진행(대기 + 실행)하는 prefetch 는 PREFETCH_MAX_CONCURRENT 개까지. 넘으면 건너뛴다.
+- 같은 영상의 prefetch 는 하나로 합친다. (yt_prefetch:<platform>:<id> → job_id)
+- 사용자가 페이지를 떠나거나 MP4 를 고르면 페이지가 취소를 요청한다.
+  대기 중인 job 은 바로 취소하고, 실행 중인 job 은 progress hook 에서 취소 플래그를 보고 멈춘다.
+- 결과(started / completed / hit / cancelled / failed / skipped)와 받은 바이트를 yt_prefetch:stats 에 누적한다.
+  hit 는 prefetch 로 받은 원본을 /download 가 실제로 사용한 경우이다.
+"""
+import logging
+import os
+import time
+from typing import Optional
+
+from rq import Queue
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
+
+from admission import reserve_slot
+from artifacts import artifact_key, lookup
+from singleflight import enqueue_once, release
+from transcode import SOURCE_AUDIO, SOURCE_FORMAT
+from urls import media_key
+
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_ENABLED = os.environ.get("PREFETCH_ENABLED", "0").lower() in ("1", "true", "yes")
+PREFETCH_MAX_CONCURRENT = int(os.environ.get("PREFETCH_MAX_CONCURRENT", "2"))
+# MP3 job 이 진행 중인 prefetch 를 기다리는 최대 시간 (초)
+PREFETCH_WAIT_SECONDS = float(os.environ.get("PREFETCH_WAIT_SECONDS", "120"))
+
+PREFETCH_QUEUE = "prefetch"
+PREFETCH_TIMEOUT = 600
+
+PREFETCH_KEY_PREFIX = "yt_prefetch"
+PREFETCH_STATS_KEY = f"{PREFETCH_KEY_PREFIX}:stats"
+_ACTIVE_KEY = f"{PREFETCH_KEY_PREFIX}:active"
+
+# prefetch 로 받은 원본이 사용되기를 기다리는 시간 (이후에는 hit 로 세지 않는다)
+_READY_TTL = 3600
+_CANCEL_TTL = PREFETCH_TIMEOUT
+
+
+class PrefetchCancelled(Exception):
+    """실행 중인 prefetch 다운로드를 멈출 때 progress hook 에서 올린다."""
+
+
+def inflight_key(mkey: str) -> str:
+    return f"{PREFETCH_KEY_PREFIX}:{mkey}"
+
+
+def _ready_key(mkey: str) -> str:
+    return f"{PREFETCH_KEY_PREFIX}:ready:{mkey}"
+
+
+def _cancel_key(job_id: str) -> str:
+    return f"{PREFETCH_KEY_PREFIX}:cancel:{job_id}"
+
+
+def make_queue(conn) -> Queue:
+    return Queue(PREFETCH_QUEUE, connection=conn, default_timeout=PREFETCH_TIMEOUT)
+
+
+def record(conn, result: str, amount: int = 1) -> None:
+    try:
+        conn.hincrby(PREFETCH_STATS_KEY, result, amount)
+    except Exception as e:
+        logger.debug(f"Failed to update prefetch stats: {e}")
+
+
+def _take_slot(conn, slot: str) -> bool:
+    try:
+        return reserve_slot(conn, _ACTIVE_KEY, slot, PREFETCH_MAX_CONCURRENT, PREFETCH_TIMEOUT)
+    except Exception as e:
+        logger.error(f"Failed to reserve prefetch slot: {e}")
+        return False
+
+
+def release_slot(conn, slot: Optional[str]) -> None:
+    if not slot:
+        return
+    try:
+        conn.zrem(_ACTIVE_KEY, slot)
+    except Exception as e:
+        logger.error(f"Failed to release prefetch slot {slot}: {e}")
+
+
+def start(conn, queue: Queue, url: str, func, cookie_file: Optional[str] = None) -> Optional[str]:
+    """원본 오디오 prefetch job 을 넣고 job_id 를 반환. 꺼져 있거나 건너뛰면 None."""
+    if not PREFETCH_ENABLED or PREFETCH_MAX_CONCURRENT <= 0:
+        return None
+    mkey = media_key(url)
+    if lookup(conn, artifact_key(mkey, SOURCE_FORMAT, SOURCE_AUDIO)):
+        return None
+
+    try:
+        existing = conn.get(inflight_key(mkey))
+    except Exception as e:
+        logger.error(f"Failed to read prefetch key for {url}: {e}")
+        return None
+    if existing:
+        # 같은 영상을 이미 받는 중이면 그 job 을 함께 사용한다.
+        return existing.decode() if isinstance(existing, bytes) else existing
+
+    # 영상당 prefetch 는 하나뿐이므로 media key 를 자리 토큰으로 쓴다.
+    slot = mkey
+    if not _take_slot(conn, slot):
+        record(conn, "skipped")
+        return None
+    try:
+        job, attached = enqueue_once(queue, inflight_key(mkey), func, url, cookie_file, meta={"prefetch_slot": slot})
+    except Exception as e:
+        logger.error(f"Failed to enqueue prefetch for {url}: {e}")
+        release_slot(conn, slot)
+        return None
+    if attached:
+        release_slot(conn, slot)
+    else:
+        record(conn, "started")
+    return job.id
+
+
+def _fetch(conn, job_id: str) -> Optional[Job]:
+    try:
+        job = Job.fetch(job_id, connection=conn)
+    except NoSuchJobError:
+        return None
+    # 다운로드 job 등 다른 큐의 job 은 건드리지 않는다.
+    return job if job.origin == PREFETCH_QUEUE else None
+
+
+def cancel(conn, job_id: str) -> bool:
+    """prefetch 취소. 대기 중이면 큐에서 빼고, 실행 중이면 취소 플래그를 남긴다."""
+    try:
+        job = _fetch(conn, job_id)
+        if job is None:
+            return False
+        status = job.get_status(refresh=False)
+        if status in ("queued", "deferred", "scheduled"):
+            job.cancel()
+            release(conn, job.meta.get("inflight_key"), job.id)
+            release_slot(conn, job.meta.get("prefetch_slot"))
+            record(conn, "cancelled")
+        elif status == "started":
+            conn.set(_cancel_key(job_id), 1, ex=_CANCEL_TTL)
+        else:
+            return False
+    except Exception as e:
+        logger.error(f"Failed to cancel prefetch {job_id}: {e}")
+        return False
+    return True
+
+
+def is_cancelled(conn, job_id: Optional[str]) -> bool:
+    if not job_id:
+        return False
+    try:
+        return bool(conn.exists(_cancel_key(job_id)))
+    except Exception:
+        return False
+
+
+def wait_for(conn, mkey: str, timeout: float = PREFETCH_WAIT_SECONDS) -> None:
+    """같은 영상의 prefetch 가 실행 중이면 끝날 때까지(최대 timeout 초) 기다린다.
+
+    아직 큐에서 대기 중인 prefetch 는 기다리는 대신 취소한다. (어차피 이 job 이 직접 받는다)
+    """
+    try:
+        job_id = conn.get(inflight_key(mkey))
+        job = _fetch(conn, job_id.decode() if isinstance(job_id, bytes) else job_id) if job_id else None
+        if job is None:
+            return
+        if job.get_status(refresh=False) != "started":
+            cancel(conn, job.id)
+            return
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.5)
+            if job.get_status(refresh=True) != "started":
+                return
+    except Exception as e:
+        logger.error(f"Failed to wait for prefetch of {mkey}: {e}")
+        return
+    logger.warning(f"Prefetch {job.id} still running after {timeout}s, downloading directly")
+
+
+def mark_ready(conn, mkey: str) -> None:
+    try:
+        conn.set(_ready_key(mkey), 1, ex=_READY_TTL)
+    except Exception as e:
+        logger.debug(f"Failed to mark prefetch ready: {e}")
+
+
+def claim(conn, mkey: str) -> None:
+    """prefetch 로 받은 원본을 사용했으면 hit 로 기록 (영상당 한 번)."""
+    try:
+        if conn.delete(_ready_key(mkey)):
+            record(conn, "hit")
+    except Exception as e:
+        logger.debug(f"Failed to claim prefetch: {e}")
+
+
+def get_stats(conn) -> dict:
+    """결과별 횟수와 받은 바이트(bytes), hit_ratio(= hit / completed)."""
+    try:
+        raw = conn.hgetall(PREFETCH_STATS_KEY) or {}
+    except Exception:
+        return {}
+    stats = {}
+    for k, v in raw.items():
+        k = k.decode() if isinstance(k, bytes) else k
+        try:
+            stats[k] = int(v)
+        except (TypeError, ValueError):
+            continue
+    completed = stats.get("completed", 0)
+    stats["hit_ratio"] = round(stats.get("hit", 0) / completed, 4) if completed else 0.0
+    return stats
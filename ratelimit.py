@@ -0,0 +1,196 @@
+"""업스트림(YouTube/X/Vimeo) 요청 속도 제한과 throttling 대응.
+
+여러 worker 가 같은 쿠키로 동시에 요청하면 429 / 봇 확인 응답을 받고 job 이 실패한다.
+요청 전에 Redis 공용 token bucket 에서 토큰을 받고, throttling 응답을 받으면
+해당 (플랫폼, 쿠키) 조합을 잠시 쉬게 한 뒤 다른 쿠키로 재시도한다.
+
+- yt_ratelimit:<platform>:<cookie id> (hash) tokens / ts / cooldown_until / strikes
+- 토큰은 UPSTREAM_RATE_LIMITS(분당 요청 수)만큼 채워지고 UPSTREAM_BURST 개까지 쌓인다.
+- throttling 을 받을 때마다 쉬는 시간을 두 배로 늘리고(지터 포함), 성공하면 초기화한다.
+- COOKIE_POOL_DIR 의 쿠키 파일들 중 토큰이 가장 많이 남은 쿠키를 골라 사용한다.
+- Redis 장애 시에는 제한 없이 진행한다.
+"""
+import glob
+import hashlib
+import logging
+import os
+import random
+import re
+import time
+from typing import List, Optional
+
+from metrics import inc as inc_metric
+
+
+logger = logging.getLogger(__name__)
+
+RATELIMIT_KEY_PREFIX = "yt_ratelimit"
+
+# 플랫폼별 분당 요청 수 (쿠키 하나 기준). 예: "youtube=30,twitter=30,vimeo=30,other=60"
+UPSTREAM_RATE_LIMITS = os.environ.get("UPSTREAM_RATE_LIMITS", "youtube=30,twitter=30,vimeo=30,other=60")
+UPSTREAM_BURST = int(os.environ.get("UPSTREAM_BURST", "3"))
+# 토큰을 기다리는 최대 시간 (초). 넘으면 토큰 없이 진행한다.
+UPSTREAM_MAX_WAIT = float(os.environ.get("UPSTREAM_MAX_WAIT", "120"))
+# throttling 응답을 받았을 때 재시도 횟수와 쉬는 시간 (초, 2배씩 증가)
+UPSTREAM_RETRIES = int(os.environ.get("UPSTREAM_RETRIES", "3"))
+UPSTREAM_BACKOFF_BASE = float(os.environ.get("UPSTREAM_BACKOFF_BASE", "5"))
+UPSTREAM_BACKOFF_MAX = float(os.environ.get("UPSTREAM_BACKOFF_MAX", "300"))
+# 번갈아 사용할 쿠키 파일(*.txt) 디렉토리
+COOKIE_POOL_DIR = os.environ.get("COOKIE_POOL_DIR", "")
+
+_BUCKET_TTL = 3600
+# yt_dlp 내부 재시도(fragment/http) 사이의 최대 대기 시간 (초)
+_RETRY_SLEEP_MAX = 30.0
+
+_THROTTLE_RE = re.compile(
+    r"HTTP Error 429|Too Many Requests|rate.?limit|confirm you.?re not a bot",
+    re.IGNORECASE,
+)
+
+# 후보 쿠키(KEYS) 중 토큰이 가장 많이 남은 쿠키에서 토큰 하나를 가져간다.
+# 받을 수 있는 쿠키가 없으면 가장 빨리 풀리는 쿠키와 대기 시간을 돌려준다.
+_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local best, best_tokens = 0, -1
+local soonest, soonest_wait = 1, nil
+for i, key in ipairs(KEYS) do
+  local v = redis.call('hmget', key, 'tokens', 'ts', 'cooldown_until')
+  local tokens = tonumber(v[1]) or burst
+  local ts = tonumber(v[2]) or now
+  local cooldown = tonumber(v[3]) or 0
+  tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+  local wait = 0
+  if now < cooldown then
+    wait = cooldown - now
+  elseif tokens < 1 then
+    wait = (1 - tokens) / rate
+  end
+  if wait == 0 and tokens > best_tokens then
+    best, best_tokens = i, tokens
+  end
+  if soonest_wait == nil or wait < soonest_wait then
+    soonest, soonest_wait = i, wait
+  end
+end
+if best > 0 then
+  redis.call('hset', KEYS[best], 'tokens', best_tokens - 1, 'ts', now)
+  redis.call('expire', KEYS[best], ARGV[4])
+  return {best, '0'}
+end
+return {soonest, tostring(soonest_wait)}
+"""
+
+# throttling 횟수(strikes)만큼 쉬는 시간을 늘리고, 쉬는 동안에는 토큰도 채우지 않는다.
+_PENALIZE_SCRIPT = """
+local strikes = redis.call('hincrby', KEYS[1], 'strikes', 1)
+local delay = math.min(tonumber(ARGV[3]), tonumber(ARGV[2]) * 2 ^ (strikes - 1)) * tonumber(ARGV[4])
+local resume = tonumber(ARGV[1]) + delay
+redis.call('hset', KEYS[1], 'tokens', 0, 'ts', resume, 'cooldown_until', resume)
+redis.call('expire', KEYS[1], ARGV[5])
+return tostring(delay)
+"""
+
+
+def _parse_rates(value: str) -> dict:
+    rates = {}
+    for item in value.split(","):
+        name, _, per_minute = item.partition("=")
+        try:
+            rates[name.strip()] = float(per_minute) / 60.0
+        except ValueError:
+            continue
+    return rates
+
+
+_RATES = _parse_rates(UPSTREAM_RATE_LIMITS)
+
+
+def _rate(platform: str) -> float:
+    """초당 토큰 수."""
+    return _RATES.get(platform) or _RATES.get("other") or 1.0
+
+
+def cookie_identity(cookie_file: Optional[str]) -> str:
+    if not cookie_file:
+        return "anon"
+    return hashlib.sha1(os.path.abspath(cookie_file).encode("utf-8")).hexdigest()[:12]
+
+
+def bucket_key(platform: str, cookie_file: Optional[str]) -> str:
+    return f"{RATELIMIT_KEY_PREFIX}:{platform}:{cookie_identity(cookie_file)}"
+
+
+def cookie_candidates(cookie_file: Optional[str]) -> List[Optional[str]]:
+    """요청에 사용할 수 있는 쿠키 파일 목록 (기본 쿠키 + COOKIE_POOL_DIR). 없으면 [None]."""
+    candidates = []
+    if cookie_file and os.path.exists(cookie_file):
+        candidates.append(cookie_file)
+    if COOKIE_POOL_DIR:
+        for path in sorted(glob.glob(os.path.join(COOKIE_POOL_DIR, "*.txt"))):
+            if path not in candidates:
+                candidates.append(path)
+    return candidates or [None]
+
+
+def acquire(conn, platform: str, cookie_files: List[Optional[str]], max_wait: float = UPSTREAM_MAX_WAIT) -> Optional[str]:
+    """토큰을 받을 때까지(최대 max_wait 초) 기다린 뒤 사용할 쿠키 파일을 반환."""
+    keys = [bucket_key(platform, cookie_file) for cookie_file in cookie_files]
+    deadline = time.monotonic() + max_wait
+    waited = 0.0
+    while True:
+        try:
+            index, wait = conn.eval(_ACQUIRE_SCRIPT, len(keys), *keys, time.time(), _rate(platform), UPSTREAM_BURST, _BUCKET_TTL)
+            chosen, wait = cookie_files[int(index) - 1], float(wait)
+        except Exception as e:
+            logger.error(f"Failed to acquire upstream rate limit token: {e}")
+            return cookie_files[0]
+
+        remaining = deadline - time.monotonic()
+        if wait <= 0 or remaining <= 0:
+            if wait > 0:
+                logger.warning(f"Upstream rate limit wait exceeded {max_wait}s for {platform}, proceeding anyway")
+            if waited:
+                inc_metric(conn, "yt_upstream_wait_seconds_total", waited, platform=platform)
+            return chosen
+
+        # 여러 worker 가 같은 시각에 깨어나 다시 몰리지 않도록 지터를 더한다.
+        sleep = min(remaining, wait + random.uniform(0, min(1.0, wait * 0.2)))
+        time.sleep(sleep)
+        waited += sleep
+
+
+def is_throttled(error: BaseException) -> bool:
+    """yt_dlp 에러 메시지가 업스트림 throttling(429, 봇 확인) 인지."""
+    return bool(_THROTTLE_RE.search(str(error)))
+
+
+def penalize(conn, platform: str, cookie_file: Optional[str]) -> float:
+    """throttling 을 받은 (플랫폼, 쿠키) 를 쉬게 하고 쉬는 시간(초)을 반환."""
+    inc_metric(conn, "yt_upstream_throttled_total", platform=platform)
+    jitter = random.uniform(0.5, 1.0)
+    try:
+        return float(conn.eval(
+            _PENALIZE_SCRIPT, 1, bucket_key(platform, cookie_file),
+            time.time(), UPSTREAM_BACKOFF_BASE, UPSTREAM_BACKOFF_MAX, jitter, _BUCKET_TTL,
+        ))
+    except Exception as e:
+        logger.error(f"Failed to record upstream throttling: {e}")
+        return UPSTREAM_BACKOFF_BASE * jitter
+
+
+def reward(conn, platform: str, cookie_file: Optional[str]) -> None:
+    """요청이 성공하면 backoff 단계를 초기화."""
+    try:
+        conn.hset(bucket_key(platform, cookie_file), "strikes", 0)
+    except Exception as e:
+        logger.debug(f"Failed to reset upstream backoff: {e}")
+
+
+def retry_sleep(n: int) -> float:
+    """yt_dlp retry_sleep_functions 용 지터 포함 지수 backoff (full jitter)."""
+    return random.uniform(0, min(_RETRY_SLEEP_MAX, 2.0 ** n))
+
+
+RETRY_SLEEP_FUNCTIONS = {"http": retry_sleep, "fragment": retry_sleep, "extractor": retry_sleep}
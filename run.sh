@@ -19,7 +19,7 @@ source venv/bin/activate
 
 # Gunicorn을 nohup을 사용하여 백그라운드에서 실행
 echo "Starting gunicorn..."
-nohup gunicorn "app:app" --pid "$PID_PATH" -b 0.0.0.0:8000 &
+nohup gunicorn "app:app" --pid "$PID_PATH" -b 0.0.0.0:8000 --worker-class gthread --threads 16 &
 
 echo "Gunicorn started with new process."
 
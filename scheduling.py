@@ -0,0 +1,163 @@
+"""작업 길이(영상 길이 × 형식 비용) 기반 RQ 큐 라우팅.
+
+/download 시점에 캐시된 메타데이터로 job 비용을 계산해 큐를 나눈다.
+긴 mp4 변환이 짧은 mp3 요청을 막지 않도록 큐마다 전용 worker 를 둔다.
+
+- fast-audio : 짧은 오디오 (비용 <= FAST_AUDIO_MAX_COST)
+- standard   : 그 외
+- heavy-video: 긴 고해상도 영상 (비용 >= HEAVY_VIDEO_MIN_COST)
+
+같은 큐 안에서는 비용이 작은 job 이 앞에 오도록 끼워 넣되(shortest-job-first),
+대기 중인 job 중 가장 오래 기다린 job 이 STARVATION_SECONDS 를 넘으면 순서대로 뒤에 넣는다.
+
+- rq:job:<id> 의 sjf_cost 필드에 job 비용을 둔다. (길이를 모르면 가장 큰 값으로 취급)
+- yt_sjf_waiting:<queue> (sorted set) 에 대기 중인 job 의 enqueue 시각을 두고, 이미 큐를 떠난 job 은 조회할 때 정리한다.
+- 위치를 정하거나 가장 오래 기다린 job 을 찾는 Lua 스크립트는 읽을 rq:job:<id> 해시가 스크립트 안에서 정해지므로
+  KEYS 로 넘기지 않고 직접 읽는다. 단일 Redis 노드를 전제로 하며 Redis Cluster 에서는 동작하지 않는다.
+"""
+import logging
+import os
+import time
+from typing import Optional
+
+from rq import Queue, Retry
+from rq.job import Job
+
+
+logger = logging.getLogger(__name__)
+
+QUEUE_FAST_AUDIO = "fast-audio"
+QUEUE_STANDARD = "standard"
+QUEUE_HEAVY_VIDEO = "heavy-video"
+
+# 큐별 job timeout (초)
+QUEUE_TIMEOUTS = {
+    QUEUE_FAST_AUDIO: 600,
+    QUEUE_STANDARD: 1800,
+    QUEUE_HEAVY_VIDEO: 3600,
+}
+
+# 영상 1초당 상대 처리 비용
+FORMAT_COST = {
+    ("mp3", None): 1.0,
+    ("mp4", "360p"): 2.0,
+    ("mp4", "720p"): 4.0,
+    ("mp4", None): 4.0,
+}
+
+FAST_AUDIO_MAX_COST = float(os.environ.get("FAST_AUDIO_MAX_COST", "360"))
+HEAVY_VIDEO_MIN_COST = float(os.environ.get("HEAVY_VIDEO_MIN_COST", "1200"))
+STARVATION_SECONDS = int(os.environ.get("STARVATION_SECONDS", "120"))
+# worker 비정상 종료 / job timeout 시 다시 큐에 넣는 횟수. 재시도는 체크포인트부터 이어서 진행한다.
+JOB_RETRIES = int(os.environ.get("JOB_RETRIES", "1"))
+
+SJF_WAITING_KEY_PREFIX = "yt_sjf_waiting"
+# 끼워 넣을 위치를 찾을 때 비교하는 큐 앞쪽 job 수 (여기서 못 찾으면 맨 뒤에 넣는다)
+_SJF_SCAN_DEPTH = 100
+# 길이를 모르는 job 의 비용
+_UNKNOWN_COST = 1e18
+# 대기 job 목록이 쓰이지 않으면 사라지도록 하는 TTL
+_WAITING_TTL = 86400
+
+# 앞에서부터 이미 큐를 떠난 job 을 정리해 가장 오래 기다린 job 의 enqueue 시각(oldest)을 찾는다.
+# (waiting_key, job_prefix 를 정의한 스크립트 안에 넣어 쓴다)
+_OLDEST_WAITING = """
+local oldest = nil
+for _ = 1, 100 do
+  local head = redis.call('zrange', waiting_key, 0, 0, 'WITHSCORES')
+  if #head == 0 then break end
+  if redis.call('hget', job_prefix .. head[1], 'status') == 'queued' then
+    oldest = tonumber(head[2])
+    break
+  end
+  redis.call('zrem', waiting_key, head[1])
+end
+"""
+
+# KEYS: 대기 job sorted set / ARGV: job 해시 prefix
+_OLDEST_SCRIPT = """
+local waiting_key, job_prefix = KEYS[1], ARGV[1]
+""" + _OLDEST_WAITING + """
+if oldest == nil then return false end
+return tostring(oldest)
+"""
+
+# KEYS: 큐 목록, 대기 job sorted set, job 해시 / ARGV: job_id, 비용, 현재 시각, STARVATION_SECONDS, 탐색 깊이, job 해시 prefix, 대기 목록 TTL
+# 반환값: 1 = 비용 순서로 끼워 넣음, 0 = 맨 뒤에 둠, -1 = 이미 worker 가 가져감
+_PLACE_SCRIPT = """
+if redis.call('lrem', KEYS[1], -1, ARGV[1]) == 0 then
+  return -1
+end
+local cost = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+redis.call('hset', KEYS[3], 'sjf_cost', ARGV[2])
+local waiting_key, job_prefix = KEYS[2], ARGV[6]
+""" + _OLDEST_WAITING + """redis.call('zadd', KEYS[2], now, ARGV[1])
+redis.call('expire', KEYS[2], ARGV[7])
+
+if oldest == nil or now - oldest <= tonumber(ARGV[4]) then
+  local ids = redis.call('lrange', KEYS[1], 0, tonumber(ARGV[5]) - 1)
+  for _, id in ipairs(ids) do
+    local other = tonumber(redis.call('hget', job_prefix .. id, 'sjf_cost'))
+    if other == nil or other > cost then
+      redis.call('linsert', KEYS[1], 'BEFORE', id, ARGV[1])
+      return 1
+    end
+  end
+end
+redis.call('rpush', KEYS[1], ARGV[1])
+return 0
+"""
+
+
+def job_cost(meta: Optional[dict], format: str, quality: str) -> Optional[float]:
+    """영상 길이 × 형식 비용. 길이를 모르면 None."""
+    duration = (meta or {}).get("duration") or 0
+    if not duration:
+        return None
+    weight = FORMAT_COST.get((format, quality)) or FORMAT_COST.get((format, None)) or FORMAT_COST[("mp4", None)]
+    return float(duration) * weight
+
+
+def route(cost: Optional[float], format: str) -> str:
+    if cost is None:
+        return QUEUE_STANDARD
+    if format == "mp3" and cost <= FAST_AUDIO_MAX_COST:
+        return QUEUE_FAST_AUDIO
+    if cost >= HEAVY_VIDEO_MIN_COST:
+        return QUEUE_HEAVY_VIDEO
+    return QUEUE_STANDARD
+
+
+def make_queues(conn) -> dict:
+    return {name: Queue(name, connection=conn, default_timeout=timeout) for name, timeout in QUEUE_TIMEOUTS.items()}
+
+
+def waiting_key(queue_name: str) -> str:
+    return f"{SJF_WAITING_KEY_PREFIX}:{queue_name}"
+
+
+def enqueue_options() -> dict:
+    """JOB_RETRIES 가 있으면 재시도 설정을 넣는다. (scheduler 없이 동작하도록 간격 없이 바로 다시 넣는다)"""
+    return {"retry": Retry(max=JOB_RETRIES)} if JOB_RETRIES > 0 else {}
+
+
+def oldest_waiting(conn, queue_name: str) -> Optional[float]:
+    """대기 중인 job 중 가장 먼저 enqueue 된 job 의 시각 (epoch 초). 없으면 None.
+
+    비용 순서로 넣으므로 큐 맨 앞 job 이 가장 오래 기다린 job 이라는 보장이 없다.
+    """
+    oldest = conn.eval(_OLDEST_SCRIPT, 1, waiting_key(queue_name), Job.redis_job_namespace_prefix)
+    return float(oldest) if oldest is not None else None
+
+
+def order_by_cost(queue: Queue, job, cost: Optional[float]) -> None:
+    """방금 큐 맨 뒤에 넣은 job 을 비용 순서 위치로 옮긴다. (실패하면 맨 뒤에 그대로 둔다)"""
+    try:
+        queue.connection.eval(
+            _PLACE_SCRIPT, 3, queue.key, waiting_key(queue.name), job.key,
+            job.id, _UNKNOWN_COST if cost is None else cost, time.time(), STARVATION_SECONDS,
+            _SJF_SCAN_DEPTH, Job.redis_job_namespace_prefix, _WAITING_TTL,
+        )
+    except Exception as e:
+        logger.error(f"Failed to order job {job.id} in queue {queue.name}: {e}")
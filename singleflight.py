@@ -0,0 +1,94 @@
+"""동일한 다운로드 요청을 하나의 RQ job 으로 합치는(single-flight) 헬퍼.
+
+(영상 ID, format, quality) 가 같은 요청이 동시에 여러 번 들어오면
+처음 요청만 job 을 만들고, 나머지는 진행 중인 job_id 를 그대로 돌려받는다.
+같은 job 을 바라보므로 진행률/결과 파일도 자연스럽게 공유된다.
+
+- yt_inflight:<platform>:<id>:<format>:<quality> → job_id (SET NX + TTL)
+- worker 는 job 이 끝나면(성공/실패 무관) 자신의 job_id 일 때만 키를 지운다.
+"""
+import logging
+import uuid
+from typing import Optional, Tuple
+
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
+
+
+logger = logging.getLogger(__name__)
+
+INFLIGHT_KEY_PREFIX = "yt_inflight"
+
+# job 이 비정상 종료되어 키를 지우지 못해도 job timeout 이후에는 풀리도록 한다.
+INFLIGHT_TTL = 3600
+
+# 값이 자신의 job_id 일 때만 삭제 (compare-and-delete)
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+  return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def inflight_key(media_key: str, format: str, quality: str) -> str:
+    return f"{INFLIGHT_KEY_PREFIX}:{media_key}:{format}:{quality}"
+
+
+def _fetch_active_job(conn, job_id: str) -> Optional[Job]:
+    """job_id 에 해당하는 job 이 아직 진행 중(대기/실행)일 때만 반환."""
+    try:
+        job = Job.fetch(job_id, connection=conn)
+    except NoSuchJobError:
+        return None
+    if job.is_finished or job.is_failed or job.is_canceled or job.is_stopped:
+        return None
+    return job
+
+
+def release(conn, key: Optional[str], job_id: Optional[str]) -> None:
+    """worker 에서 job 종료 시 호출. 다른 job 이 차지한 키는 건드리지 않는다."""
+    if not key or not job_id:
+        return
+    try:
+        conn.eval(_RELEASE_SCRIPT, 1, key, job_id)
+    except Exception as e:
+        logger.error(f"Failed to release in-flight key {key}: {e}")
+
+
+def enqueue_once(queue, key: str, func, *args, **kwargs) -> Tuple[Job, bool]:
+    """key 기준으로 진행 중인 job 이 있으면 그 job 을, 없으면 새 job 을 반환.
+
+    반환값은 (job, attached) 이며 attached=True 면 기존 job 에 합류한 것이다.
+    """
+    conn = queue.connection
+    job_id = str(uuid.uuid4())
+
+    # 기존 job 이 끝났는데 키가 남아 있는 경우를 대비해 몇 번만 재시도한다.
+    for _ in range(3):
+        if conn.set(key, job_id, nx=True, ex=INFLIGHT_TTL):
+            meta = dict(kwargs.pop('meta', None) or {})
+            meta['inflight_key'] = key
+            try:
+                job = queue.enqueue(func, *args, job_id=job_id, meta=meta, **kwargs)
+            except Exception:
+                release(conn, key, job_id)
+                raise
+            return job, False
+
+        existing_id = conn.get(key)
+        if existing_id is None:
+            continue
+        if isinstance(existing_id, bytes):
+            existing_id = existing_id.decode()
+
+        job = _fetch_active_job(conn, existing_id)
+        if job is not None:
+            return job, True
+
+        # 이미 끝난(또는 사라진) job 의 키 → 정리 후 다시 시도
+        release(conn, key, existing_id)
+
+    # 경합이 계속되면 합치기를 포기하고 그냥 새 job 을 만든다.
+    logger.warning(f"Could not acquire in-flight key {key}, enqueueing without coalescing")
+    return queue.enqueue(func, *args, **kwargs), False
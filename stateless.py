@@ -0,0 +1,73 @@
+"""세션 없이 처리하는 요청 경로와 다운로드 토큰.
+
+Flask-Session(Redis) 은 쿠키가 있는 모든 요청마다 세션을 Redis 에서 읽고, 값이 바뀌면 다시 쓴다.
+진행률 폴링(/status), SSE(/events), 메트릭처럼 세션이 필요 없는 경로는 세션을 열지 않고,
+완료된 결과 파일 정보(job_id / artifact 키 / 경로)는 서명한 토큰에 담아 /serve_file 로 넘긴다.
+
+- STATELESS_DOWNLOADS=0 이면 예전처럼 /status 가 세션에 결과 파일 경로를 기록한다.
+- 토큰은 app SECRET_KEY 로 서명하고 DOWNLOAD_TOKEN_TTL 초 동안 유효하다.
+"""
+import os
+from typing import Optional
+
+from flask.sessions import SessionInterface
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+
+STATELESS_DOWNLOADS = os.environ.get("STATELESS_DOWNLOADS", "1").lower() in ("1", "true", "yes")
+DOWNLOAD_TOKEN_TTL = int(os.environ.get("DOWNLOAD_TOKEN_TTL", "3600"))
+
+# 세션을 열지 않는 경로 (prefix)
+SESSIONLESS_PATH_PREFIXES = ("/status", "/details/", "/events/", "/metrics", "/stats/", "/prefetch/", "/thumb/", "/static/", "/batch")
+
+_TOKEN_SALT = "download-token"
+
+
+class HotPathSessionInterface(SessionInterface):
+    """세션이 필요 없는 요청에서는 Redis 세션을 읽지 않는 래퍼.
+
+    open_session 이 None 을 반환하면 Flask 는 쓰기 불가능한 NullSession 을 사용한다.
+    """
+
+    def __init__(self, inner: SessionInterface):
+        self.inner = inner
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def open_session(self, app, request):
+        if is_sessionless(request):
+            return None
+        return self.inner.open_session(app, request)
+
+    def save_session(self, app, session, response):
+        if self.is_null_session(session):
+            return None
+        return self.inner.save_session(app, session, response)
+
+
+def is_sessionless(request) -> bool:
+    if not STATELESS_DOWNLOADS:
+        return False
+    if request.path.startswith(SESSIONLESS_PATH_PREFIXES):
+        return True
+    return request.path == "/serve_file" and "token" in request.args
+
+
+def _serializer(secret_key: str) -> URLSafeTimedSerializer:
+    return URLSafeTimedSerializer(secret_key, salt=_TOKEN_SALT)
+
+
+def make_download_token(secret_key: str, job_id: str, path: str, artifact_key: Optional[str]) -> str:
+    return _serializer(secret_key).dumps({"j": job_id, "p": path, "k": artifact_key or ""})
+
+
+def load_download_token(secret_key: str, token: str) -> Optional[dict]:
+    """유효한 토큰이면 {'job_id', 'path', 'artifact_key'}, 위조/만료면 None."""
+    try:
+        data = _serializer(secret_key).loads(token, max_age=DOWNLOAD_TOKEN_TTL)
+    except BadSignature:
+        return None
+    if not isinstance(data, dict) or not data.get("p"):
+        return None
+    return {"job_id": data.get("j"), "path": data["p"], "artifact_key": data.get("k") or None}
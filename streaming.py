@@ -0,0 +1,163 @@
+"""MP3 스트리밍 변환 모드.
+
+RQ job 으로 전체 다운로드/변환이 끝나기를 기다리지 않고,
+원본 오디오 스트림을 ffmpeg 로 바로 MP3 로 변환하면서 HTTP 응답으로 흘려보낸다.
+변환된 바이트는 동시에 uploads/ 에 기록해 두었다가, 끝까지 성공하면
+artifact 인덱스에 등록해 이후 요청은 캐시에서 바로 처리한다.
+
+- 스트림마다 web 스레드에서 yt-dlp 와 ffmpeg 가 실행되므로 동시 스트림 수를
+  STREAMING_MAX_CONCURRENT 로 제한한다. (yt_stream:active zset, 모든 web 프로세스 공유)
+- 원본 주소 조회는 업스트림 속도 제한(ratelimit)을 거치되, 요청 안에서 오래 기다리지 않도록
+  STREAMING_UPSTREAM_MAX_WAIT 초까지만 기다린다.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import uuid
+from typing import Iterator, Optional
+
+import yt_dlp
+
+import ratelimit
+from admission import reserve_slot
+from artifacts import probe_codec, register
+from urls import platform_of
+
+
+logger = logging.getLogger(__name__)
+
+# 기본은 비활성화. 1/true 로 설정하면 /details 에서 MP3 를 스트리밍으로 받는다.
+STREAMING_MP3_ENABLED = os.environ.get("STREAMING_MP3_ENABLED", "").lower() in ("1", "true", "yes")
+
+STREAMING_MAX_CONCURRENT = int(os.environ.get("STREAMING_MAX_CONCURRENT", "4"))
+STREAMING_UPSTREAM_MAX_WAIT = float(os.environ.get("STREAMING_UPSTREAM_MAX_WAIT", "5"))
+
+_ACTIVE_KEY = "yt_stream:active"
+# 비정상 종료로 반납하지 못한 자리는 이 시간 뒤에 정리한다.
+_SLOT_TTL = 3600
+
+_CHUNK_SIZE = 64 * 1024
+
+
+def take_slot(conn) -> Optional[str]:
+    """스트림 자리 하나를 차지하고 자리 토큰을 반환. 상한이면 None (Redis 장애 시에는 허용)."""
+    slot = uuid.uuid4().hex
+    if STREAMING_MAX_CONCURRENT <= 0:
+        return slot
+    try:
+        return slot if reserve_slot(conn, _ACTIVE_KEY, slot, STREAMING_MAX_CONCURRENT, _SLOT_TTL) else None
+    except Exception as e:
+        logger.error(f"Failed to reserve streaming slot: {e}")
+        return slot
+
+
+def release_slot(conn, slot: Optional[str]) -> None:
+    if not slot:
+        return
+    try:
+        conn.zrem(_ACTIVE_KEY, slot)
+    except Exception as e:
+        logger.error(f"Failed to release streaming slot {slot}: {e}")
+
+
+def resolve_audio_source(url: str, cookie_file: Optional[str] = None, conn=None) -> Optional[dict]:
+    """bestaudio 포맷의 직접 다운로드 URL 과 요청 헤더를 조회.
+
+    conn 을 넘기면 업스트림 속도 제한(ratelimit)을 거치고, 쿠키 풀에서 쿠키를 고른다.
+    """
+    ydl_opts: dict = {
+        "quiet": True,
+        "no_warnings": True,
+        "format": "bestaudio/best",
+        # EJS/SABR 대응은 tasks.download_video 와 동일하게 설정
+        "js_runtimes": {"deno": {}},
+        "remote_components": ["ejs:npm"],
+    }
+    platform = platform_of(url)
+    if conn is not None:
+        cookie_file = ratelimit.acquire(
+            conn, platform, ratelimit.cookie_candidates(cookie_file), max_wait=STREAMING_UPSTREAM_MAX_WAIT,
+        )
+    if cookie_file and os.path.exists(cookie_file):
+        ydl_opts["cookiefile"] = cookie_file
+
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+    except Exception as e:
+        logger.error(f"Failed to resolve audio stream for {url}: {e}")
+        if conn is not None and ratelimit.is_throttled(e):
+            ratelimit.penalize(conn, platform, cookie_file)
+        return None
+    if conn is not None:
+        ratelimit.reward(conn, platform, cookie_file)
+
+    if not isinstance(info, dict):
+        return None
+    # 포맷 선택 결과가 여러 개(분리 스트림)면 첫 번째(오디오)를 사용
+    selected = (info.get("requested_formats") or [info])[0]
+    if not selected.get("url"):
+        return None
+    return {"url": selected["url"], "http_headers": selected.get("http_headers") or {}}
+
+
+def stream_mp3(
+    conn,
+    source: dict,
+    quality: str,
+    target_path: str,
+    index_key: str,
+    title: Optional[str] = None,
+) -> Iterator[bytes]:
+    """ffmpeg 변환 결과를 chunk 단위로 yield 하면서 target_path 에도 기록.
+
+    - 끝까지 성공하면 target_path 로 옮기고 artifact 인덱스에 등록
+    - 클라이언트가 중간에 끊거나 ffmpeg 가 실패하면 임시 파일을 지운다.
+    """
+    headers = "".join(f"{k}: {v}\r\n" for k, v in source["http_headers"].items())
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error"]
+    if headers:
+        cmd += ["-headers", headers]
+    cmd += [
+        "-i", source["url"],
+        "-vn",
+        "-codec:a", "libmp3lame",
+        "-b:a", f"{quality}k",
+        "-f", "mp3",
+        "pipe:1",
+    ]
+
+    # 같은 영상을 동시에 스트리밍해도 서로 덮어쓰지 않도록 임시 파일명은 매번 다르게
+    tmp_path = f"{target_path}.{uuid.uuid4().hex}.stream"
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    completed = False
+    try:
+        with open(tmp_path, "wb") as tee:
+            while True:
+                chunk = proc.stdout.read(_CHUNK_SIZE)
+                if not chunk:
+                    break
+                tee.write(chunk)
+                yield chunk
+
+        returncode = proc.wait()
+        if returncode != 0:
+            logger.error(f"ffmpeg streaming failed ({returncode}): {proc.stderr.read().decode(errors='replace')}")
+            return
+
+        os.replace(tmp_path, target_path)
+        completed = True
+        register(conn, index_key, target_path, codec=probe_codec(target_path), title=title)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+        if not completed and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def is_available() -> bool:
+    return STREAMING_MP3_ENABLED and shutil.which("ffmpeg") is not None
@@ -1,14 +1,51 @@
+import contextlib
+import glob
+import json
 import logging
 import os
 import re
 import shutil
+import time
 from typing import Optional
 
 import redis
 from rq import get_current_job
-import yt_dlp
+from rq.timeouts import JobTimeoutException
 from yt_dlp.utils import DownloadError, ExtractorError
 
+import admission
+from artifacts import (
+  acquire_lease,
+  artifact_key,
+  lookup,
+  probe_codec,
+  record_lookup,
+  register,
+  release_lease,
+  touch,
+  variants,
+)
+from batch import item_finished
+import checkpoint
+from fragments import download_options, release_connections, reserve_connections
+from metadata_cache import get_metadata
+from metrics import inc as inc_metric, timed
+import prefetch
+import ratelimit
+from scheduling import job_cost
+from singleflight import release
+from transcode import (
+  MP4_ARGS,
+  SOURCE_AUDIO,
+  SOURCE_FORMAT,
+  mp3_args,
+  plan as plan_transcode,
+  run as run_transcode,
+  source_video_quality,
+)
+from urls import honors_quality, media_key, platform_of
+import ydl_pool
+
 
 logger = logging.getLogger(__name__)
 
@@ -20,25 +57,122 @@ REDIS_DB = int(os.environ.get("REDIS_DB", "0"))
 # 최대 영상 길이 (초 단위, 기본값 600초=10분)
 MAX_DURATION_SECONDS = int(os.environ.get("MAX_DURATION_SECONDS", "600"))
 
+# 첫 다운로드의 원본 스트림을 보관해 다른 format/quality 요청을 로컬 변환으로 처리 (기본 활성화)
+KEEP_SOURCE_STREAMS = os.environ.get("KEEP_SOURCE_STREAMS", "1").lower() in ("1", "true", "yes")
+
 PROGRESS_KEY_PREFIX = "yt_progress"
+# 진행률이 기록될 때마다 같은 내용을 pub/sub 으로도 알린다. (/events SSE 용)
+PROGRESS_CHANNEL_PREFIX = "yt_progress_events"
+
+# 진행률 키는 job 이 끝난 뒤에도 잠시 조회할 수 있도록 TTL 을 둔다. (기본 1일)
+PROGRESS_TTL = int(os.environ.get("PROGRESS_TTL", "86400"))
+# 진행률 갱신은 최소 간격(초)과 최소 변화량(%) 을 모두 넘을 때만 기록한다.
+PROGRESS_MIN_INTERVAL = float(os.environ.get("PROGRESS_MIN_INTERVAL", "1.0"))
+PROGRESS_MIN_DELTA = float(os.environ.get("PROGRESS_MIN_DELTA", "1.0"))
+
+# worker 프로세스 전체에서 공유하는 Redis 커넥션 풀
+redis_pool = redis.ConnectionPool(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
+
 
+def get_redis() -> redis.Redis:
+  """공유 커넥션 풀을 사용하는 Redis 클라이언트 반환."""
+  return redis.Redis(connection_pool=redis_pool)
+
+
+def _write_progress(job_id: str, fields: dict) -> None:
+  key = f"{PROGRESS_KEY_PREFIX}:{job_id}"
+  try:
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.hset(key, mapping=fields)
+    pipe.expire(key, PROGRESS_TTL)
+    pipe.publish(f"{PROGRESS_CHANNEL_PREFIX}:{job_id}", json.dumps(fields))
+    pipe.execute()
+  except Exception as e:
+    logger.error(f"Failed to update progress for job {job_id}: {e}")
 
-def set_progress(job_id: Optional[str], status: str, percent: float) -> None:
+
+def set_progress(job_id: Optional[str], status: str, percent: float, **extra) -> None:
   """특정 RQ job에 대한 진행률/상태를 Redis에 기록.
 
   - job_id 가 없으면 아무 것도 하지 않는다.
   - percent는 0~100 사이로 클램핑한다.
+  - extra 로 받은 값(예: 완료 시 결과 파일 path)도 같은 해시에 기록한다.
+  - 단계 전환처럼 드문 갱신용이며, 잦은 갱신은 ProgressReporter 를 사용한다.
   """
   if not job_id:
     return
 
   p = max(0.0, min(100.0, float(percent)))
+  fields = {"status": status, "percent": str(p)}
+  fields.update({k: str(v) for k, v in extra.items() if v is not None})
+  _write_progress(job_id, fields)
+
+
+# EJS/SABR 대응: deno 런타임 + EJS challenge solver 스크립트 사용
+# 참고: https://github.com/yt-dlp/yt-dlp/wiki/EJS
+# js_runtimes 형식은 {runtime: {config}} 딕셔너리여야 한다.
+JS_RUNTIME_OPTIONS = {
+  "js_runtimes": {"deno": {}},
+  "remote_components": ["ejs:npm"],
+}
+
+
+def prewarm(cookie_file: Optional[str] = None) -> None:
+  """warm worker 시작 시 download_video 와 같은 설정의 YoutubeDL 을 미리 만들어 둔다."""
+  params = dict(JS_RUNTIME_OPTIONS)
+  if cookie_file:
+    params["cookiefile"] = cookie_file
+  ydl_pool.prewarm(params)
 
-  try:
-    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
-    r.hset(f"{PROGRESS_KEY_PREFIX}:{job_id}", mapping={"status": status, "percent": str(p)})
-  except Exception as e:
-    logger.error(f"Failed to update progress for job {job_id}: {e}")
+
+def _fail(job_id: Optional[str], reason: str, percent: float = 0.0) -> None:
+  """job 실패를 진행률에 기록하고, 실패 원인별 카운터(yt_job_failures_total)를 올린다."""
+  set_progress(job_id, "failed", percent)
+  inc_metric(get_redis(), "yt_job_failures_total", reason=reason)
+
+
+class ProgressReporter:
+  """진행률 갱신을 모아서(coalesce) 일정 빈도 이하로만 Redis 에 기록.
+
+  - 상태(phase)가 바뀌면 즉시 기록
+  - 같은 상태에서는 min_interval 초 이상 지나고 min_delta % 이상 변했을 때만 기록
+  - 그 사이의 갱신은 버리고, 다음 기록 시점의 최신 값만 남긴다.
+  """
+
+  def __init__(
+    self,
+    job_id: Optional[str],
+    min_interval: float = PROGRESS_MIN_INTERVAL,
+    min_delta: float = PROGRESS_MIN_DELTA,
+  ):
+    self.job_id = job_id
+    self.min_interval = min_interval
+    self.min_delta = min_delta
+    self._last_status: Optional[str] = None
+    self._last_percent = 0.0
+    self._last_write = 0.0
+
+  def update(self, status: str, percent: float, force: bool = False, **extra) -> None:
+    if not self.job_id:
+      return
+
+    p = max(0.0, min(100.0, float(percent)))
+    fields = {"status": status, "percent": str(p)}
+    fields.update({k: str(v) for k, v in extra.items() if v is not None})
+
+    now = time.monotonic()
+    due = (
+      force
+      or status != self._last_status
+      or (now - self._last_write >= self.min_interval and abs(p - self._last_percent) >= self.min_delta)
+    )
+    if not due:
+      return
+
+    self._last_status = status
+    self._last_percent = p
+    self._last_write = now
+    _write_progress(self.job_id, fields)
 
 
 INVALID_FILENAME_CHARS = r"\\/:*?\"<>|"
@@ -62,12 +196,47 @@ def sanitize_filename(filename: str) -> str:
   return sanitized or "DownloadedFile"
 
 
-def make_progress_hook(job_id: Optional[str]):
+def _extract_with_backoff(conn, video_url: str, ydl_opts: dict, cookie_file: Optional[str], job_id: Optional[str]):
+  """업스트림 속도 제한을 지키며 extract_info(download=True) 실행.
+
+  - 요청 전에 (플랫폼, 쿠키) token bucket 에서 토큰을 받고, 쿠키 풀에서 여유 있는 쿠키를 고른다.
+  - throttling(429, 봇 확인) 에러면 해당 쿠키를 쉬게 하고 UPSTREAM_RETRIES 번까지 다시 시도한다.
+    (다음 시도는 다른 쿠키가 비어 있으면 바로, 아니면 쉬는 시간이 끝날 때까지 기다린다.)
+  - 그 밖의 에러나 재시도 초과 시에는 마지막 예외를 그대로 올린다.
+  """
+  platform = platform_of(video_url)
+  candidates = ratelimit.cookie_candidates(cookie_file)
+  for attempt in range(ratelimit.UPSTREAM_RETRIES + 1):
+    chosen = ratelimit.acquire(conn, platform, candidates)
+    ydl_opts.pop("cookiefile", None)
+    if chosen:
+      ydl_opts["cookiefile"] = chosen
+    try:
+      with timed(conn, "download"), ydl_pool.session(ydl_opts) as ydl:
+        info = ydl.extract_info(video_url, download=True)
+    except (DownloadError, ExtractorError) as e:
+      if not ratelimit.is_throttled(e) or attempt == ratelimit.UPSTREAM_RETRIES:
+        raise
+      delay = ratelimit.penalize(conn, platform, chosen)
+      logger.warning(
+        "Upstream throttled %s (attempt %s/%s), cooling down for %.1fs",
+        video_url, attempt + 1, ratelimit.UPSTREAM_RETRIES, delay,
+      )
+      set_progress(job_id, "downloading", 0.0, retries=attempt + 1)
+      continue
+    ratelimit.reward(conn, platform, chosen)
+    return info
+
+
+def make_progress_hook(job_id: Optional[str], platform: str = "other"):
   """yt_dlp progress hook 생성.
 
   - 다운로드 중(download status)에는 downloaded/total 로 percent 계산
-  - 거의 끝난 시점(finished)에서는 99%로 올려두고 마무리는 상위 로직에서 100%로 설정
+  - 다운로드가 끝난 시점(finished)에서는 50%로 두고, 변환 진행률은 _convert 에서 기록
+  - yt_dlp 는 초당 여러 번 hook 을 호출하므로 ProgressReporter 로 기록 빈도를 제한한다.
+  - 받은 파일 크기는 플랫폼별 다운로드 바이트(yt_downloaded_bytes_total)로 누적한다.
   """
+  reporter = ProgressReporter(job_id)
 
   def hook(d):
     status = d.get("status")
@@ -80,75 +249,122 @@ def make_progress_hook(job_id: Optional[str]):
         percent = raw_percent * 0.5
       else:
         percent = 0.0
-      set_progress(job_id, "downloading", percent)
+      # 현재 다운로드 속도(bytes/s)도 함께 기록해 job 별 처리량을 확인할 수 있게 한다.
+      speed = d.get("speed")
+      reporter.update("downloading", percent, speed=int(speed) if speed else None)
     elif status == "finished":
-      # 네트워크 다운로드는 끝났고, 이후 ffmpeg 등 변환 단계로 진입
+      # 네트워크 다운로드는 끝났고, 이후 ffmpeg 변환 단계로 진입
       # 다운로드 단계 상한은 50%로 고정하고, 변환 단계는 50~100%로 표현
-      set_progress(job_id, "converting", 50.0)
+      # 완료된 파일의 평균 처리량(bytes/s)을 남긴다.
+      elapsed = d.get("elapsed")
+      size = d.get("total_bytes") or d.get("downloaded_bytes")
+      throughput = int(size / elapsed) if size and elapsed else None
+      reporter.update("converting", 50.0, force=True, throughput=throughput)
+      if size:
+        inc_metric(get_redis(), "yt_downloaded_bytes_total", size, platform=platform)
 
   return hook
 
 
-def download_video(
+def _convert(
+  transcode_plan: dict,
+  output_path: str,
+  duration: Optional[float],
+  job_id: Optional[str],
+  cost: Optional[float] = None,
+) -> bool:
+  """ffmpeg 변환을 실행하면서 실제 변환 진행률(out_time / duration)을 50~100% 구간으로 기록.
+
+  - encode_speed: 실시간 대비 인코딩 배속 (낮으면 CPU 변환이 병목)
+  - convert_seconds: 변환에 걸린 시간 (다운로드 throughput 과 비교용)
+  - cost 를 넘기면 변환 시간을 /download ETA 계산용 통계에 반영한다.
+  """
+  reporter = ProgressReporter(job_id)
+  started = time.monotonic()
+  last_speed = {}
+
+  def on_progress(percent, speed):
+    last_speed["value"] = speed
+    reporter.update("converting", 50.0 + (percent or 0.0) * 0.5, encode_speed=speed)
+
+  reporter.update("converting", 50.0, force=True)
+  with timed(get_redis(), "transcode"):
+    ok = run_transcode(transcode_plan, output_path, duration=duration, on_progress=on_progress)
+  if ok:
+    elapsed = time.monotonic() - started
+    reporter.update(
+      "converting", 100.0, force=True,
+      encode_speed=last_speed.get("value"),
+      convert_seconds=round(elapsed, 2),
+    )
+    admission.record_phase(get_redis(), "transcode", elapsed, cost)
+  return ok
+
+
+def _fetch_source(
+  conn,
   video_url: str,
   output_path: str,
-  format: str = "mp3",
-  quality: str = "192",
-  cookie_file: Optional[str] = None,
-  job_id: Optional[str] = None,
+  format: str,
+  quality: str,
+  cookie_file: Optional[str],
+  job_id: Optional[str],
+  sources: Optional[list],
+  duration: Optional[float],
 ) -> Optional[str]:
-  """yt_dlp 를 사용해 실제 영상/오디오를 다운로드.
+  """download_video 의 네트워크 다운로드 단계. 받은(병합까지 끝난) 파일 경로, 실패 시 None.
 
-  - format='mp3' → 오디오 추출 후 mp3로 변환
-  - format='mp4' → 지정한 해상도에 맞춰 mp4로 저장
-  - 성공 시 최종 파일 경로 문자열 반환, 실패 시 None
+  같은 output_path 로 다시 실행하면 yt_dlp 가 남아 있는 .part 파일부터 이어받는다.
   """
-  if format == "mp3" and not shutil.which("ffmpeg"):
-    logger.error("ffmpeg not found, cannot convert to MP3.")
-    return None
-
   ydl_opts: dict = {
     "geo_bypass": True,
     "nocheckcertificate": True,
-    "ignoreerrors": True,
+    # throttling 등 다운로드 에러를 예외로 받아야 재시도 여부를 판단할 수 있다.
+    "ignoreerrors": False,
     "quiet": False,
     "verbose": True,
     "outtmpl": output_path + ".%(ext)s",
-    # EJS/SABR 대응: deno 런타임 + EJS challenge solver 스크립트 사용
-    # 참고: https://github.com/yt-dlp/yt-dlp/wiki/EJS
-    # js_runtimes 형식은 {runtime: {config}} 딕셔너리여야 한다.
-    "js_runtimes": {"deno": {}},
-    "remote_components": ["ejs:npm"],
+    # 이전 시도가 남긴 .part / fragment 진행 상태(.ytdl)가 있으면 이어받는다.
+    "continuedl": True,
+    # yt_dlp 내부 fragment/http 재시도는 지터를 넣은 지수 backoff 로 대기
+    "retry_sleep_functions": ratelimit.RETRY_SLEEP_FUNCTIONS,
+    **JS_RUNTIME_OPTIONS,
   }
 
+  # 병렬 fragment / chunk 다운로드 (호스트 단위 연결 수 예산 안에서)
+  connections = reserve_connections(conn)
+  ydl_opts.update(download_options(connections))
+
   # 진행률 hook 등록
-  ydl_opts["progress_hooks"] = [make_progress_hook(job_id)]
+  ydl_opts["progress_hooks"] = [make_progress_hook(job_id, platform_of(video_url))]
 
-  if cookie_file:
-    ydl_opts["cookiefile"] = cookie_file
+  if sources is not None:
+    # 원본 스트림을 남겨 두었다가 다른 format/quality 요청 때 로컬 변환에 사용한다.
+    ydl_opts["keepvideo"] = True
+
+    def source_hook(d):
+      if d.get("status") == "finished" and d.get("filename"):
+        info = d.get("info_dict") or {}
+        sources.append({
+          "path": d["filename"],
+          "vcodec": info.get("vcodec"),
+          "acodec": info.get("acodec"),
+          "height": info.get("height"),
+        })
+
+    ydl_opts["progress_hooks"].append(source_hook)
 
   if format == "mp3":
     ydl_opts.update(
       {
         "format": "bestaudio/best",
-        "postprocessors": [
-          {
-            "key": "FFmpegExtractAudio",
-            "preferredcodec": "mp3",
-            "preferredquality": quality,
-          }
-        ],
       }
     )
   elif format == "mp4":
-    # 플랫폼에 따라 품질 처리 방식을 다르게 한다.
+    # 플랫폼에 따라 품질 처리 방식을 다르게 한다. (urls.Platform.honors_quality)
     # - YouTube: UI에서 선택한 해상도(360p/720p 등)를 honor
     # - Twitter/X, Vimeo 등: 가용 포맷이 제한적인 경우가 많으므로 best 로 강제
-    video_url_lower = (video_url or "").lower()
-    is_twitter = "twitter.com" in video_url_lower or "x.com" in video_url_lower
-    is_vimeo = "vimeo.com" in video_url_lower
-
-    if is_twitter or is_vimeo:
+    if not honors_quality(video_url):
       fmt = "bestvideo*+bestaudio/best"
     else:
       # UI에서 선택한 해상도(360p/720p 등)에 따라 포맷을 제한한다.
@@ -168,53 +384,210 @@ def download_video(
     ydl_opts.update(
       {
         "format": fmt,
-        "postprocessors": [
-          {
-            "key": "FFmpegVideoConvertor",
-            "preferedformat": "mp4",
-          }
-        ],
       }
     )
 
+  cost = job_cost({"duration": duration}, format, quality)
+  started = time.monotonic()
   try:
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-      ydl.download([video_url])
+    info = _extract_with_backoff(conn, video_url, ydl_opts, cookie_file, job_id)
   except (DownloadError, ExtractorError) as e:
     logger.error(f"Failed to download video {video_url}: {e}")
-    set_progress(job_id, "failed", 0.0)
+    _fail(job_id, "throttled" if ratelimit.is_throttled(e) else "download_error")
     return None
+  except JobTimeoutException:
+    # RQ 가 job 을 실패로 기록(재시도 설정 시 다시 큐에 넣음)하도록 그대로 올린다. 받던 파일은 남겨 둔다.
+    raise
   except Exception as e:
     logger.error(f"An unexpected error occurred during download: {e}")
-    set_progress(job_id, "failed", 0.0)
+    _fail(job_id, "unexpected")
     return None
+  finally:
+    release_connections(conn, connections)
+  # 성공한 다운로드만 ETA 통계에 반영 (throttling 대기 시간 포함)
+  admission.record_phase(conn, "download", time.monotonic() - started, cost)
 
-  # yt_dlp 가 outtmpl 에 맞춰 생성한 실제 파일명을 기준으로 실제 파일 경로를 찾는다.
+  # yt_dlp 는 후처리(스트림 병합)까지 끝난 파일 경로를 requested_downloads 에 남긴다.
   # 일부 포맷에서는 "-720p.f398.mp4" 처럼 중간에 포맷 ID가 끼는 경우가 있어서,
   # 단순히 ".mp3"/".mp4" 를 붙이는 방식은 실패할 수 있다.
   final_path: Optional[str] = None
-  base_dir = os.path.dirname(output_path) or "."
-  prefix = os.path.basename(output_path)
-
-  # output_path 로 시작하는 파일 중, 흔히 사용하는 확장자를 가진 첫 번째 파일을 선택
-  for ext in (".mp3", ".m4a", ".mp4", ".webm"):
-    candidate = os.path.join(base_dir, prefix + ext)
-    if os.path.exists(candidate):
-      final_path = candidate
-      break
-
-  # 위 패턴으로 못 찾았을 경우, prefix 로 시작하는 모든 파일 중 하나를 fallback 으로 선택
+  if isinstance(info, dict):
+    for download in info.get("requested_downloads") or []:
+      candidate = download.get("filepath")
+      if candidate and os.path.isfile(candidate):
+        final_path = candidate
+        break
+
+  # 위 정보가 없을 경우, output_path 에 흔히 사용하는 확장자를 붙여 확인한다.
+  # (uploads/ 전체를 listdir 하지 않도록 후보 경로만 직접 확인)
   if final_path is None:
-    for name in os.listdir(base_dir):
-      if name.startswith(prefix):
-        candidate = os.path.join(base_dir, name)
-        if os.path.isfile(candidate):
-          final_path = candidate
-          break
+    for ext in (".mp3", ".m4a", ".mp4", ".webm"):
+      candidate = output_path + ext
+      if os.path.isfile(candidate):
+        final_path = candidate
+        break
 
+  if final_path is None:
+    # 예외 없이 끝났지만 결과 파일을 찾지 못한 경우
+    _fail(job_id, "download_error")
+    return None
   return final_path
 
 
+def download_video(
+  video_url: str,
+  output_path: str,
+  format: str = "mp3",
+  quality: str = "192",
+  cookie_file: Optional[str] = None,
+  job_id: Optional[str] = None,
+  sources: Optional[list] = None,
+  duration: Optional[float] = None,
+  checkpoint_key: Optional[str] = None,
+) -> Optional[str]:
+  """yt_dlp 를 사용해 실제 영상/오디오를 다운로드.
+
+  - format='mp3' → 오디오 스트림을 받은 뒤 mp3로 변환
+  - format='mp4' → 지정한 해상도에 맞춰 받고, mp4 가 아니면 mp4로 변환
+  - 변환은 yt_dlp postprocessor 대신 직접 ffmpeg 로 실행해 실제 변환 진행률을 기록한다.
+    (duration 을 넘기면 진행률 계산에 사용)
+  - sources 리스트를 넘기면 변환 전 원본 스트림 파일을 지우지 않고,
+    파일 경로/코덱/해상도 정보를 리스트에 담아 돌려준다.
+  - checkpoint_key 를 넘기면 단계별 진행 상황을 기록하고, 이전 시도가 원본 다운로드까지
+    마쳤으면 다운로드를 건너뛴다. (checkpoint 참고)
+  - 성공 시 최종 파일 경로 문자열 반환, 실패 시 None
+  """
+  if format == "mp3" and not shutil.which("ffmpeg"):
+    logger.error("ffmpeg not found, cannot convert to MP3.")
+    _fail(job_id, "ffmpeg_missing")
+    return None
+
+  conn = get_redis()
+  # 같은 결과를 만들던 job 이 원본 다운로드까지 마쳤다면 다운로드를 건너뛰고 변환부터 한다.
+  cp = checkpoint.load(conn, checkpoint_key)
+  final_path = checkpoint.resumable_download(cp)
+  if final_path:
+    logger.info("Resuming %s from checkpoint (%s): %s", video_url, cp.get("stage"), final_path)
+    if sources is not None:
+      sources.extend(cp.get("sources") or [])
+    set_progress(job_id, "converting", 50.0)
+  else:
+    checkpoint.save(conn, checkpoint_key, checkpoint.STAGE_DOWNLOADING, output_prefix=output_path, job_id=job_id)
+    final_path = _fetch_source(conn, video_url, output_path, format, quality, cookie_file, job_id, sources, duration)
+    if final_path is None:
+      return None
+    checkpoint.save(
+      conn, checkpoint_key, checkpoint.STAGE_DOWNLOADED,
+      download_path=final_path, sources=sources if sources is not None else None,
+    )
+
+  # 요청 형식으로 변환 (mp3 는 비트레이트를 맞추기 위해 항상, mp4 는 컨테이너가 다를 때만)
+  if format == "mp3":
+    convert_args = mp3_args(quality)
+  elif format == "mp4" and not final_path.endswith(".mp4"):
+    convert_args = MP4_ARGS
+  else:
+    return final_path
+
+  converted_path = f"{output_path}.{format}"
+  cost = job_cost({"duration": duration}, format, quality)
+  checkpoint.save(conn, checkpoint_key, checkpoint.STAGE_CONVERTING)
+  if not _convert({"inputs": [{"path": final_path}], "args": convert_args}, converted_path, duration, job_id, cost):
+    _fail(job_id, "transcode_error", 50.0)
+    return None
+
+  # 원본 스트림으로 보관할 파일이 아니면 변환 전 파일은 지운다.
+  kept = {source["path"] for source in sources or []}
+  if final_path != converted_path and final_path not in kept and os.path.exists(final_path):
+    os.remove(final_path)
+  return converted_path
+
+
+def _keep_sources(
+  conn,
+  mkey: str,
+  file_base: str,
+  sources: list,
+  final_path: str,
+  title: Optional[str],
+) -> None:
+  """다운로드한 원본 스트림을 고정된 이름으로 옮기고 artifact 인덱스에 등록."""
+  for source in sources:
+    path = source["path"]
+    # 후처리 없이 그대로 결과 파일이 된 경우(이미 mp4 등)는 건너뛴다.
+    if path == final_path or not os.path.isfile(path):
+      continue
+
+    vcodec = source.get("vcodec") or "none"
+    acodec = source.get("acodec") or "none"
+    if vcodec != "none":
+      kind = source_video_quality(source.get("height"))
+    elif acodec != "none":
+      kind = SOURCE_AUDIO
+    else:
+      continue
+
+    ext = os.path.splitext(path)[1]
+    source_path = f"{file_base}-{SOURCE_FORMAT}-{kind}{ext}"
+    try:
+      os.replace(path, source_path)
+    except OSError as e:
+      logger.error(f"Failed to keep source stream {path}: {e}")
+      continue
+    register(conn, artifact_key(mkey, SOURCE_FORMAT, kind), source_path, codec=f"{vcodec},{acodec}", title=title)
+
+
+def _derive_locally(
+  conn,
+  mkey: str,
+  format: str,
+  quality: str,
+  target_path: str,
+  title: Optional[str],
+  job_id: Optional[str],
+  duration: Optional[float] = None,
+) -> Optional[str]:
+  """보유 중인 원본/결과 파일로 요청 결과를 만들 수 있으면 ffmpeg 로 변환.
+
+  변환할 입력이 없거나 변환에 실패하면 None (호출 측에서 네트워크 다운로드로 진행).
+  """
+  transcode_plan = plan_transcode(variants(conn, mkey), format, quality, platform=mkey.split(":", 1)[0])
+  if not transcode_plan:
+    return None
+
+  input_keys = [entry["key"] for entry in transcode_plan["inputs"]]
+  logger.info("Deriving %s from local artifacts: %s", target_path, input_keys)
+
+  # 변환하는 동안 janitor 가 입력 파일을 지우지 않도록 lease 를 잡는다.
+  for key in input_keys:
+    acquire_lease(conn, key)
+    touch(conn, key)
+  try:
+    ok = _convert(transcode_plan, target_path, duration, job_id, job_cost({"duration": duration}, format, quality))
+  finally:
+    for key in input_keys:
+      release_lease(conn, key)
+
+  if not ok:
+    return None
+
+  register(conn, artifact_key(mkey, format, quality), target_path, codec=probe_codec(target_path), title=title)
+  set_progress(job_id, "complete", 100.0, path=target_path)
+  return target_path
+
+
+def _remember_artifact(index_key: str) -> None:
+  """web 쪽에서 결과 파일의 인덱스 키를 알 수 있도록 job.meta 에 기록 (LRU 갱신용)."""
+  job = get_current_job()
+  if job is None:
+    return
+  try:
+    job.meta["artifact_key"] = index_key
+    job.save_meta()
+  except Exception as e:
+    logger.error(f"Failed to save artifact key for job {job.id}: {e}")
+
+
 def download_media(
   url: str,
   format: str = "mp3",
@@ -223,37 +596,63 @@ def download_media(
 ) -> Optional[str]:
   """app.py 에서 RQ job 으로 사용되는 엔트리 포인트.
 
+  - 실제 처리는 _download_media 에서 수행
+  - 종료 시(성공/실패 무관) single-flight 키를 해제해 이후 요청이 새 job 을 만들 수 있게 한다.
+  - 배치 항목이면 같은 배치의 다음 항목을 큐에 넣는다.
+  - /download 입장 제어 자리를 돌려주고, 처리 시간을 큐별 ETA 통계에 반영한다.
+  - job timeout 등 예외로 끝났지만 RQ 가 다시 실행할(retries_left) job 이면 위 정리를 하지 않는다.
+    (재시도가 같은 single-flight 키 / 입장 자리 / 배치 실행 수를 그대로 이어 쓴다)
+  """
+  # 현재 RQ job 정보(진행률 기록용)
+  job = get_current_job()
+  job_id = job.id if job else None
+  started = time.monotonic()
+  retrying = False
+  try:
+    return _download_media(url, format, quality, cookie_file, job_id)
+  except Exception:
+    # RQ 는 예외로 끝난 job 을 retries_left 가 남아 있으면 다시 큐에 넣는다.
+    retrying = job is not None and bool(job.retries_left)
+    raise
+  finally:
+    if job is not None and not retrying:
+      release(job.connection, job.meta.get("inflight_key"), job.id)
+      admission.release_slot(job.connection, job.meta.get("admission_key"), job.meta.get("admission_slot"))
+      admission.record_job(job.connection, job.origin, time.monotonic() - started)
+      if job.meta.get("batch_id"):
+        item_finished(job.connection, job.meta["batch_id"], download_media)
+
+
+def _download_media(
+  url: str,
+  format: str,
+  quality: str,
+  cookie_file: Optional[str],
+  job_id: Optional[str],
+) -> Optional[str]:
+  """download_media 본체.
+
   - 유튜브 URL에서 메타데이터를 먼저 가져와 길이 등을 검증
   - 파일명 정리 후, 이미 동일 품질 파일이 있으면 재사용
   - 없으면 새로 다운로드하고 최종 경로를 반환
   """
-  # yt_dlp 를 다시 초기화하여 메타 정보만 추출
-  info_opts: dict = {
-    "quiet": True,
-    "no_warnings": True,
-  }
-  if cookie_file and os.path.exists(cookie_file):
-    info_opts["cookiefile"] = cookie_file
-
+  # 메타 정보는 web(app.py) 과 공유하는 Redis 캐시에서 먼저 찾는다.
+  # /details 에서 이미 조회한 영상이면 extract_info 를 다시 호출하지 않는다.
   try:
-    with yt_dlp.YoutubeDL(info_opts) as ydl:
-      # process=False 로 설정해 포맷 선택/다운로드 관련 처리를 건너뛰고
-      # 원시 메타데이터만 가져온다.
-      info_dict = ydl.extract_info(url, download=False, process=False)
+    conn = get_redis()
+    info_dict = get_metadata(conn, url, cookie_file)
   except Exception as e:
     logger.error(f"Failed to retrieve video info: {e}")
+    _fail(job_id, "metadata_unavailable")
     return None
 
   if not isinstance(info_dict, dict):
     logger.error(
       "Failed to retrieve video info. It's possible the video is unavailable or the URL is incorrect."
     )
+    _fail(job_id, "metadata_unavailable")
     return None
 
-  # 현재 RQ job 정보(진행률 기록용)
-  job = get_current_job()
-  job_id = job.id if job else None
-
   # 초기 진행률 0%로 설정 (다운로드 단계 시작)
   set_progress(job_id, "downloading", 0.0)
 
@@ -265,25 +664,57 @@ def download_media(
       MAX_DURATION_SECONDS,
       duration
     )
-    set_progress(job_id, "failed", 0.0)
+    _fail(job_id, "duration_limit")
     return None
 
   title = info_dict.get("title", "DownloadedFile")
   video_id = info_dict.get("id", "")
   sanitized_title = sanitize_filename(title)
 
+  # 결과 파일은 제목이 아닌 (영상 ID, format, quality) 인덱스로 찾는다.
+  # 업로드 후 제목이 바뀌어도 같은 파일을 재사용할 수 있다.
+  mkey = media_key(url)
+  index_key = artifact_key(mkey, format, quality)
+  entry = lookup(conn, index_key)
+  record_lookup(conn, entry is not None)
+  _remember_artifact(index_key)
+  if entry:
+    logger.info("Reusing indexed file: %s", entry["path"])
+    touch(conn, index_key)
+    inc_metric(conn, "yt_artifact_results_total", source="index")
+    set_progress(job_id, "complete", 100.0, path=entry["path"])
+    return entry["path"]
+
   base_dir = "uploads"
   os.makedirs(base_dir, exist_ok=True)
 
   file_base = os.path.join(base_dir, f"{sanitized_title}-{video_id}")
   target_path = f"{file_base}-{quality}.{format}"
 
+  # 인덱스 도입 이전에 만들어진 파일은 인덱스에 등록하고 재사용
   if os.path.exists(target_path):
     logger.info("Reusing existing file: %s", target_path)
+    register(conn, index_key, target_path, codec=probe_codec(target_path), title=title)
+    inc_metric(conn, "yt_artifact_results_total", source="legacy_path")
+    set_progress(job_id, "complete", 100.0, path=target_path)
     return target_path
 
-  # 새로 다운로드
+  # /details 에서 시작한 원본 오디오 prefetch 가 받는 중이면 끝날 때까지 기다렸다가 그 파일을 쓴다.
+  if format == "mp3":
+    prefetch.wait_for(conn, mkey)
+
+  # 로컬에 원본 스트림이나 더 좋은 품질의 결과가 있으면 네트워크 없이 변환
+  derived_path = _derive_locally(conn, mkey, format, quality, target_path, title, job_id, duration)
+  if derived_path:
+    inc_metric(conn, "yt_artifact_results_total", source="derived")
+    if format == "mp3":
+      prefetch.claim(conn, mkey)
+    return derived_path
+
+  # 새로 다운로드 (이전 시도가 남긴 체크포인트가 있으면 이어서)
   output_prefix = f"{file_base}-{quality}"
+  ckey = checkpoint.checkpoint_key(mkey, format, quality)
+  sources: Optional[list] = [] if KEEP_SOURCE_STREAMS else None
   final_path = download_video(
     video_url=url,
     output_path=output_prefix,
@@ -291,15 +722,14 @@ def download_media(
     quality=quality,
     cookie_file=cookie_file,
     job_id=job_id,
+    sources=sources,
+    duration=duration,
+    checkpoint_key=ckey,
   )
   if final_path is None:
     set_progress(job_id, "failed", 0.0)
     return None
 
-  # 변환(포스트프로세싱) 단계는 다운로드 이후 ~ 완료까지 50~100% 구간으로 표시한다.
-  # 세부 진행률은 알 수 없으므로, 백엔드는 50%로 유지하고 프런트에서 50→99%를 천천히 올린다.
-  set_progress(job_id, "converting", 50.0)
-
   # 확장자가 예상과 다를 경우에도 target_path 로 맞춰주는 것이 깔끔할 수 있음
   if final_path != target_path and os.path.exists(final_path):
     try:
@@ -309,7 +739,111 @@ def download_media(
       # rename 실패해도 그냥 기존 경로 반환
       pass
 
+  register(conn, index_key, final_path, codec=probe_codec(final_path), title=title)
+  if sources:
+    _keep_sources(conn, mkey, file_base, sources, final_path, title)
+  checkpoint.clear(conn, ckey)
+
+  inc_metric(conn, "yt_artifact_results_total", source="download")
   # 최종 완료 시 100%로 마무리
-  set_progress(job_id, "complete", 100.0)
+  set_progress(job_id, "complete", 100.0, path=final_path)
 
   return final_path
+
+
+def prefetch_source(url: str, cookie_file: Optional[str] = None) -> Optional[str]:
+  """/details 에서 prefetch 큐에 넣는 RQ job. (prefetch 참고)
+
+  - bestaudio 원본 스트림만 받아 source:audio artifact 로 등록하고 경로를 반환
+  - 취소 요청(페이지 이탈, MP4 선택)을 받으면 다운로드를 멈추고 받던 파일을 지운다.
+  - 종료 시(성공/실패 무관) single-flight 키와 동시 실행 자리를 반납한다.
+  """
+  job = get_current_job()
+  job_id = job.id if job else None
+  conn = get_redis()
+  try:
+    path = _prefetch_source(conn, url, cookie_file, job_id)
+  except prefetch.PrefetchCancelled:
+    prefetch.record(conn, "cancelled")
+    return None
+  except Exception as e:
+    if prefetch.is_cancelled(conn, job_id):
+      prefetch.record(conn, "cancelled")
+    else:
+      logger.error(f"Failed to prefetch {url}: {e}")
+      prefetch.record(conn, "failed")
+    return None
+  finally:
+    if job is not None:
+      release(job.connection, job.meta.get("inflight_key"), job.id)
+      prefetch.release_slot(job.connection, job.meta.get("prefetch_slot"))
+  prefetch.record(conn, "completed" if path else "failed")
+  return path
+
+
+def _prefetch_source(conn, url: str, cookie_file: Optional[str], job_id: Optional[str]) -> Optional[str]:
+  info_dict = get_metadata(conn, url, cookie_file)
+  duration = (info_dict or {}).get("duration") or 0
+  if not duration or duration > MAX_DURATION_SECONDS:
+    return None
+
+  mkey = media_key(url)
+  index_key = artifact_key(mkey, SOURCE_FORMAT, SOURCE_AUDIO)
+  entry = lookup(conn, index_key)
+  if entry:
+    return entry["path"]
+  if prefetch.is_cancelled(conn, job_id):
+    raise prefetch.PrefetchCancelled()
+
+  title = info_dict.get("title", "DownloadedFile")
+  file_base = os.path.join("uploads", f"{sanitize_filename(title)}-{info_dict.get('id', '')}")
+  os.makedirs("uploads", exist_ok=True)
+  platform = platform_of(url)
+  last_check = {"at": 0.0}
+
+  def hook(d):
+    # 취소 플래그는 초당 한 번만 확인한다. 예외를 올리면 yt_dlp 가 다운로드를 멈춘다.
+    now = time.monotonic()
+    if d.get("status") == "downloading" and now - last_check["at"] >= 1.0:
+      last_check["at"] = now
+      if prefetch.is_cancelled(conn, job_id):
+        raise prefetch.PrefetchCancelled()
+    elif d.get("status") == "finished":
+      size = d.get("total_bytes") or d.get("downloaded_bytes")
+      if size:
+        inc_metric(conn, "yt_downloaded_bytes_total", size, platform=platform)
+        prefetch.record(conn, "bytes", int(size))
+
+  ydl_opts: dict = {
+    "geo_bypass": True,
+    "nocheckcertificate": True,
+    "ignoreerrors": False,
+    "quiet": True,
+    "format": "bestaudio/best",
+    "outtmpl": f"{file_base}-{SOURCE_FORMAT}-{SOURCE_AUDIO}.%(ext)s",
+    "progress_hooks": [hook],
+    "retry_sleep_functions": ratelimit.RETRY_SLEEP_FUNCTIONS,
+    **JS_RUNTIME_OPTIONS,
+  }
+  connections = reserve_connections(conn)
+  ydl_opts.update(download_options(connections))
+  try:
+    info = _extract_with_backoff(conn, url, ydl_opts, cookie_file, None)
+  except Exception:
+    # 취소/실패로 남은 조각 파일(yt_dlp 의 *.part) 정리
+    for partial in glob.glob(glob.escape(f"{file_base}-{SOURCE_FORMAT}-{SOURCE_AUDIO}") + ".*.part"):
+      with contextlib.suppress(OSError):
+        os.remove(partial)
+    raise
+  finally:
+    release_connections(conn, connections)
+
+  downloads = (info or {}).get("requested_downloads") or []
+  path = next((d.get("filepath") for d in downloads if d.get("filepath") and os.path.isfile(d["filepath"])), None)
+  if path is None:
+    return None
+  acodec = downloads[0].get("acodec") or (info or {}).get("acodec") or "none"
+  vcodec = downloads[0].get("vcodec") or (info or {}).get("vcodec") or "none"
+  register(conn, index_key, path, codec=f"{vcodec},{acodec}", title=title)
+  prefetch.mark_ready(conn, mkey)
+  return path
@@ -0,0 +1,35 @@
+import importlib
+import os
+import sys
+
+import fakeredis
+import pytest
+import redis
+from apscheduler.schedulers.background import BackgroundScheduler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+_server = fakeredis.FakeServer()
+
+
+class FakeRedis(fakeredis.FakeStrictRedis):
+    """app 이 만드는 모든 Redis 클라이언트가 같은 가짜 서버를 사용하도록."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(server=_server)
+
+
+@pytest.fixture
+def web(monkeypatch, tmp_path):
+    """가짜 Redis 로 다시 불러온 app 모듈."""
+    monkeypatch.setenv("TRUSTED_PROXY_COUNT", "1")
+    FakeRedis().flushall()
+    monkeypatch.setattr(redis, "Redis", FakeRedis)
+    monkeypatch.setattr(redis, "StrictRedis", FakeRedis)
+    # 시작 시 정합성 검사 / janitor 는 실행하지 않는다.
+    monkeypatch.setattr(BackgroundScheduler, "start", lambda self, *args, **kwargs: None)
+    import app
+    app = importlib.reload(app)
+    monkeypatch.chdir(tmp_path)
+    return app
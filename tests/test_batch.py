@@ -0,0 +1,59 @@
+"""배치 항목을 큐에 넣지 못해도 배치가 멈추지 않고, 배치도 클라이언트 입장 자리를 차지하는지."""
+import fakeredis
+import pytest
+
+import batch
+
+
+URLS = [f"https://www.youtube.com/watch?v=video{i:06d}" for i in range(3)]
+
+
+def _job():
+    pass
+
+
+def _running(conn, batch_id):
+    return int(conn.get(batch._key(batch_id, "running")) or 0)
+
+
+def test_enqueue_failure_is_recorded_and_batch_moves_on(monkeypatch):
+    conn = fakeredis.FakeStrictRedis()
+    enqueue_once = batch.enqueue_once
+
+    def flaky(queue, key, func, url, *args, **kwargs):
+        if url == URLS[1]:
+            raise ValueError("bad url")
+        return enqueue_once(queue, key, func, url, *args, **kwargs)
+
+    monkeypatch.setattr(batch, "enqueue_once", flaky)
+    batch_id = batch.create(conn, URLS, "mp3", "192", None, _job)
+
+    items = batch.get(conn, batch_id)["items"]
+    assert items[1]["job_id"] == batch.ENQUEUE_FAILED
+    assert all(item["job_id"] not in (None, batch.ENQUEUE_FAILED) for item in (items[0], items[2]))
+    assert _running(conn, batch_id) == 2
+
+
+def test_unrecorded_items_go_back_to_pending(monkeypatch):
+    conn = fakeredis.FakeStrictRedis()
+    monkeypatch.setattr(conn, "hset", lambda *args, **kwargs: (_ for _ in ()).throw(ConnectionError("down")))
+    with pytest.raises(ConnectionError):
+        batch.create(conn, URLS, "mp3", "192", None, _job)
+    batch_id = next(k.decode().split(":")[1] for k in conn.keys("yt_batch:*:pending"))
+    assert conn.llen(batch._key(batch_id, "pending")) == len(URLS)
+    assert _running(conn, batch_id) == 0
+
+
+def test_batch_holds_client_slots_until_finished(web):
+    client = web.app.test_client()
+    resp = client.post("/batch", json={"urls": URLS})
+    assert resp.status_code == 202
+    batch_id = resp.get_json()["batch_id"]
+    assert web.r.zcard("yt_admission:client:127.0.0.1") == len(URLS)
+
+    resp = client.post("/batch", json={"urls": URLS[:1]})
+    assert resp.status_code == 429
+
+    for _ in URLS:
+        batch.item_finished(web.r, batch_id, web.download_media)
+    assert web.r.zcard("yt_admission:client:127.0.0.1") == 0
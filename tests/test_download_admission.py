@@ -0,0 +1,28 @@
+"""/download 입장 제어: proxy 뒤의 클라이언트 IP 와 조회 불가 영상."""
+import json
+
+
+URL = "https://www.youtube.com/watch?v=abcdefghijk"
+META_KEY = "yt_meta:youtube:abcdefghijk"
+
+
+def _admission_keys(web):
+    return sorted(k.decode() for k in web.r.keys("yt_admission:client:*"))
+
+
+def test_slot_is_taken_for_forwarded_client(web):
+    web.r.set(META_KEY, json.dumps({"status": "ok", "id": "abcdefghijk", "duration": 60}))
+    resp = web.app.test_client().post(
+        "/download", data={"youtube_url": URL, "format": "mp3", "quality": "192"},
+        headers={"X-Forwarded-For": "203.0.113.7"},
+    )
+    assert resp.status_code == 202
+    assert _admission_keys(web) == ["yt_admission:client:203.0.113.7"]
+
+
+def test_unavailable_video_is_rejected_without_slot(web):
+    web.r.set(META_KEY, json.dumps({"status": "unavailable"}))
+    resp = web.app.test_client().post("/download", data={"youtube_url": URL, "format": "mp3", "quality": "192"})
+    assert resp.status_code == 404
+    assert _admission_keys(web) == []
+    assert web.r.keys("rq:job:*") == []
@@ -0,0 +1,71 @@
+"""download_video 의 변환 단계와 체크포인트 이어받기."""
+import fakeredis
+import pytest
+
+import checkpoint
+import tasks
+
+
+URL = "https://www.youtube.com/watch?v=abcdefghijk"
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = fakeredis.FakeStrictRedis()
+    monkeypatch.setattr(tasks, "get_redis", lambda: conn)
+    monkeypatch.setattr(tasks.shutil, "which", lambda name: "/usr/bin/" + name)
+    return conn
+
+
+@pytest.fixture
+def transcoded(monkeypatch):
+    """ffmpeg 대신 입력 파일을 결과 경로로 복사하고 호출 인자를 기록."""
+    calls = []
+
+    def fake_run(plan, output_path, duration=None, on_progress=None):
+        calls.append((plan, output_path))
+        with open(plan["inputs"][0]["path"], "rb") as src, open(output_path, "wb") as dst:
+            dst.write(src.read())
+        return True
+
+    monkeypatch.setattr(tasks, "run_transcode", fake_run)
+    return calls
+
+
+def test_convert_after_fetch(conn, transcoded, tmp_path, monkeypatch):
+    output = str(tmp_path / "T-abcdefghijk-192")
+    key = checkpoint.checkpoint_key("youtube:abcdefghijk", "mp3", "192")
+
+    def fake_fetch(conn, video_url, output_path, *args):
+        path = output_path + ".webm"
+        with open(path, "wb") as f:
+            f.write(b"audio")
+        return path
+
+    monkeypatch.setattr(tasks, "_fetch_source", fake_fetch)
+    result = tasks.download_video(URL, output, "mp3", "192", duration=10, checkpoint_key=key)
+
+    assert result == output + ".mp3"
+    assert len(transcoded) == 1
+    assert checkpoint.load(conn, key)["stage"] == checkpoint.STAGE_CONVERTING
+
+
+def test_resume_from_checkpoint_skips_fetch(conn, transcoded, tmp_path, monkeypatch):
+    output = str(tmp_path / "T-abcdefghijk-192")
+    downloaded = output + ".webm"
+    with open(downloaded, "wb") as f:
+        f.write(b"audio")
+    key = checkpoint.checkpoint_key("youtube:abcdefghijk", "mp3", "192")
+    source = {"path": downloaded, "acodec": "opus", "vcodec": "none"}
+    checkpoint.save(conn, key, checkpoint.STAGE_DOWNLOADED, output_prefix=output, download_path=downloaded, sources=[source])
+
+    def fail_fetch(*args):
+        raise AssertionError("source was already downloaded")
+
+    monkeypatch.setattr(tasks, "_fetch_source", fail_fetch)
+    sources = []
+    result = tasks.download_video(URL, output, "mp3", "192", sources=sources, duration=10, checkpoint_key=key)
+
+    assert result == output + ".mp3"
+    assert transcoded[0][0]["inputs"][0]["path"] == downloaded
+    assert sources == [source]
@@ -0,0 +1,52 @@
+"""job timeout 등으로 실패했지만 RQ 가 다시 실행할 job 은 single-flight / 입장 자리 / 배치 정리를 미룬다."""
+from types import SimpleNamespace
+
+import pytest
+from rq.timeouts import JobTimeoutException
+
+import tasks
+
+
+@pytest.fixture
+def finished(monkeypatch):
+    calls = []
+    monkeypatch.setattr(tasks, "release", lambda *args: calls.append("inflight"))
+    monkeypatch.setattr(tasks.admission, "release_slot", lambda *args: calls.append("admission"))
+    monkeypatch.setattr(tasks.admission, "record_job", lambda *args: calls.append("record"))
+    monkeypatch.setattr(tasks, "item_finished", lambda *args: calls.append("batch"))
+    return calls
+
+
+def _run(monkeypatch, retries_left, error):
+    job = SimpleNamespace(id="job-1", connection=None, origin="standard", retries_left=retries_left, meta={"batch_id": "b1"})
+    monkeypatch.setattr(tasks, "get_current_job", lambda: job)
+
+    def fail(*args):
+        raise error
+
+    monkeypatch.setattr(tasks, "_download_media", fail)
+    with pytest.raises(type(error)):
+        tasks.download_media("https://www.youtube.com/watch?v=abcdefghijk")
+
+
+def test_timeout_with_retries_left_keeps_bookkeeping(monkeypatch, finished):
+    _run(monkeypatch, 1, JobTimeoutException("timeout"))
+    assert finished == []
+
+
+def test_last_attempt_timeout_releases(monkeypatch, finished):
+    _run(monkeypatch, 0, JobTimeoutException("timeout"))
+    assert finished == ["inflight", "admission", "record", "batch"]
+
+
+def test_error_with_retries_left_keeps_bookkeeping(monkeypatch, finished):
+    _run(monkeypatch, 1, RuntimeError("boom"))
+    assert finished == []
+
+
+def test_success_releases(monkeypatch, finished):
+    job = SimpleNamespace(id="job-1", connection=None, origin="standard", retries_left=1, meta={})
+    monkeypatch.setattr(tasks, "get_current_job", lambda: job)
+    monkeypatch.setattr(tasks, "_download_media", lambda *args: "uploads/a.mp3")
+    assert tasks.download_media("https://www.youtube.com/watch?v=abcdefghijk") == "uploads/a.mp3"
+    assert finished == ["inflight", "admission", "record"]
@@ -0,0 +1,33 @@
+"""yt_queue_oldest_job_age_seconds 는 큐 맨 앞(가장 싼 job)이 아니라 가장 오래 기다린 job 을 본다."""
+import re
+import time
+
+import fakeredis
+
+import metrics
+import scheduling
+
+
+def _noop():
+    pass
+
+
+def _age(text: str, queue_name: str) -> float:
+    match = re.search(rf'^yt_queue_oldest_job_age_seconds\{{queue="{queue_name}"\}} (\S+)$', text, re.M)
+    return float(match.group(1))
+
+
+def test_oldest_job_age_follows_expensive_job_behind_cheap_one(monkeypatch):
+    conn = fakeredis.FakeStrictRedis()
+    queue = scheduling.make_queues(conn)[scheduling.QUEUE_STANDARD]
+    enqueued = time.time() - 60
+    with monkeypatch.context() as m:
+        m.setattr(scheduling.time, "time", lambda: enqueued)
+        expensive = queue.enqueue(_noop)
+        scheduling.order_by_cost(queue, expensive, 900)
+    cheap = queue.enqueue(_noop)
+    scheduling.order_by_cost(queue, cheap, 10)
+    assert queue.get_job_ids() == [cheap.id, expensive.id]
+
+    text = metrics.render(conn, queues=[queue])
+    assert 59 <= _age(text, scheduling.QUEUE_STANDARD) < 70
@@ -0,0 +1,14 @@
+"""prefetch 동시 실행 한도는 입장 제어와 같은 자리 잡기 스크립트를 쓴다."""
+import fakeredis
+
+import prefetch
+
+
+def test_prefetch_slots_respect_limit(monkeypatch):
+    monkeypatch.setattr(prefetch, "PREFETCH_MAX_CONCURRENT", 2)
+    conn = fakeredis.FakeStrictRedis()
+    assert prefetch._take_slot(conn, "a")
+    assert prefetch._take_slot(conn, "b")
+    assert not prefetch._take_slot(conn, "c")
+    prefetch.release_slot(conn, "a")
+    assert prefetch._take_slot(conn, "c")
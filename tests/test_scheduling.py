@@ -0,0 +1,50 @@
+"""같은 큐 안에서 비용이 작은 job 이 앞에 오고, 오래 기다린 job 이 있으면 뒤에 넣는지."""
+import fakeredis
+import pytest
+
+import scheduling
+
+
+def _noop():
+    pass
+
+
+@pytest.fixture
+def queue():
+    conn = fakeredis.FakeStrictRedis()
+    return scheduling.make_queues(conn)[scheduling.QUEUE_STANDARD]
+
+
+def _enqueue(queue, cost):
+    job = queue.enqueue(_noop)
+    scheduling.order_by_cost(queue, job, cost)
+    return job.id
+
+
+def test_orders_by_cost_not_arrival(queue):
+    ids = {cost: _enqueue(queue, cost) for cost in (500, 100, 300, 50)}
+    unknown = _enqueue(queue, None)
+    last = _enqueue(queue, 500)
+    assert queue.get_job_ids() == [ids[50], ids[100], ids[300], ids[500], last, unknown]
+
+
+def test_oldest_waiting_job_disables_reordering(queue, monkeypatch):
+    now = 1_000_000.0
+    monkeypatch.setattr(scheduling.time, "time", lambda: now)
+    heavy = _enqueue(queue, 900)
+    # 앞의 job 이 대기 중인 채로 STARVATION_SECONDS 가 지나면 짧은 job 도 뒤에 선다.
+    now += scheduling.STARVATION_SECONDS + 1
+    short = _enqueue(queue, 10)
+    assert queue.get_job_ids() == [heavy, short]
+
+
+def test_finished_jobs_do_not_count_as_waiting(queue, monkeypatch):
+    now = 1_000_000.0
+    monkeypatch.setattr(scheduling.time, "time", lambda: now)
+    taken = _enqueue(queue, 900)
+    queue.remove(taken)
+    queue.connection.hset(f"rq:job:{taken}", "status", "started")
+    heavy = _enqueue(queue, 900)
+    now += scheduling.STARVATION_SECONDS
+    short = _enqueue(queue, 10)
+    assert queue.get_job_ids() == [short, heavy]
@@ -0,0 +1,18 @@
+"""/serve_file 의 조건부 요청(304)도 artifact 의 LRU 시각을 갱신한다."""
+from artifacts import ARTIFACT_LRU_KEY, artifact_key, register
+from stateless import make_download_token
+
+
+def test_not_modified_refreshes_lru(web, tmp_path):
+    path = tmp_path / "song.mp3"
+    path.write_bytes(b"ID3" + b"\0" * 64)
+    key = artifact_key("youtube:abcdefghijk", "mp3", "192")
+    entry = register(web.r, key, str(path))
+    web.r.zadd(ARTIFACT_LRU_KEY, {key: 1})
+
+    token = make_download_token(web.app.secret_key, "job-1", str(path), key)
+    resp = web.app.test_client().get(
+        "/serve_file", query_string={"token": token}, headers={"If-None-Match": f'"{entry["etag"]}"'},
+    )
+    assert resp.status_code == 304
+    assert web.r.zscore(ARTIFACT_LRU_KEY, key) > 1
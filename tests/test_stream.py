@@ -0,0 +1,55 @@
+"""/stream 의 동시 스트림 상한, 입장 제어, 메타데이터 조회 deadline."""
+import json
+
+import pytest
+
+import metadata_pool
+import streaming
+
+
+URL = "https://www.youtube.com/watch?v=abcdefghijk"
+META_KEY = "yt_meta:youtube:abcdefghijk"
+
+
+@pytest.fixture
+def stream(web, monkeypatch):
+    monkeypatch.setattr(streaming, "is_available", lambda: True)
+    monkeypatch.setattr(streaming, "STREAMING_MAX_CONCURRENT", 1)
+    resolved = []
+
+    def resolve(url, cookie_file=None, conn=None):
+        resolved.append(url)
+        return {"url": "https://example.invalid/audio", "http_headers": {}}
+
+    monkeypatch.setattr(streaming, "resolve_audio_source", resolve)
+    monkeypatch.setattr(streaming, "stream_mp3", lambda *args, **kwargs: iter([b"ID3", b"data"]))
+    web.r.set(META_KEY, json.dumps({"status": "ok", "id": "abcdefghijk", "title": "t", "duration": 60}))
+    return resolved
+
+
+def _slots(web):
+    return web.r.zcard("yt_stream:active"), web.r.zcard("yt_admission:client:127.0.0.1")
+
+
+def test_concurrent_streams_are_capped_and_slots_released(web, stream):
+    client = web.app.test_client()
+    first = client.get("/stream", query_string={"youtube_url": URL}, buffered=False)
+    assert first.status_code == 200
+    assert _slots(web) == (1, 1)
+
+    second = client.get("/stream", query_string={"youtube_url": URL})
+    assert second.status_code == 503
+    assert _slots(web) == (1, 1)
+
+    first.close()
+    assert _slots(web) == (0, 0)
+
+
+def test_pending_metadata_does_not_block_request(web, stream, monkeypatch):
+    web.r.delete(META_KEY)
+    monkeypatch.setattr(metadata_pool, "fetch", lambda *args, **kwargs: (metadata_pool.PENDING, None))
+    resp = web.app.test_client().get("/stream", query_string={"youtube_url": URL})
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "5"
+    assert stream == []
+    assert _slots(web) == (0, 0)
@@ -0,0 +1,69 @@
+"""transcode.run 이 중간에 중단되어도 ffmpeg 프로세스를 남기지 않는다."""
+import os
+import stat
+import subprocess
+import time
+
+import pytest
+
+import transcode
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    """progress 블록 하나를 출력한 뒤 오래 멈춰 있는 ffmpeg."""
+    script = tmp_path / "ffmpeg"
+    script.write_text("#!/bin/sh\necho out_time_us=1000000\necho progress=continue\nexec sleep 60\n")
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+
+    procs = []
+    popen = subprocess.Popen
+
+    def recording_popen(*args, **kwargs):
+        proc = popen(*args, **kwargs)
+        procs.append(proc)
+        return proc
+
+    monkeypatch.setattr(transcode.subprocess, "Popen", recording_popen)
+    return procs
+
+
+def test_kills_ffmpeg_when_interrupted(fake_ffmpeg, tmp_path):
+    def on_progress(percent, speed):
+        # RQ 의 JobTimeoutException 처럼 진행률 처리 중에 올라오는 예외
+        raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        transcode.run({"inputs": [{"path": "in.webm"}], "args": []}, str(tmp_path / "out.mp3"), duration=10, on_progress=on_progress)
+
+    assert fake_ffmpeg[0].poll() is not None
+
+
+def _install(tmp_path, monkeypatch, body):
+    script = tmp_path / "ffmpeg"
+    script.write_text("#!/bin/sh\n" + body)
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+
+
+def test_timeout_fires_without_progress_output(tmp_path, monkeypatch):
+    # 진행률을 한 줄도 쓰지 않고 멈춘 ffmpeg
+    _install(tmp_path, monkeypatch, "exec sleep 60\n")
+    monkeypatch.setattr(transcode, "TRANSCODE_TIMEOUT", 1)
+    started = time.monotonic()
+    assert not transcode.run({"inputs": [{"path": "in.webm"}], "args": []}, str(tmp_path / "out.mp3"))
+    assert time.monotonic() - started < 10
+
+
+def test_large_stderr_does_not_block(tmp_path, monkeypatch):
+    # 파이프 버퍼(64KiB)보다 많은 stderr 를 쓴 뒤 실패하는 ffmpeg
+    _install(tmp_path, monkeypatch, "head -c 1000000 /dev/zero | tr '\\0' x >&2\necho progress=end\nexit 1\n")
+    monkeypatch.setattr(transcode, "TRANSCODE_TIMEOUT", 10)
+    started = time.monotonic()
+    assert not transcode.run({"inputs": [{"path": "in.webm"}], "args": []}, str(tmp_path / "out.mp3"))
+    assert time.monotonic() - started < 5
@@ -0,0 +1,91 @@
+"""warm worker 의 YoutubeDL 인스턴스 재사용과 쿠키 파일 갱신."""
+import os
+
+import pytest
+
+import ydl_pool
+
+
+COOKIES = (
+    "# Netscape HTTP Cookie File\n"
+    ".youtube.com\tTRUE\t/\tTRUE\t0\t{name}\t{value}\n"
+)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(ydl_pool, "_enabled", True)
+    yield
+    ydl_pool.reset()
+
+
+def _write_cookies(path, value, mtime):
+    path.write_text(COOKIES.format(name="SID", value=value))
+    os.utime(path, (mtime, mtime))
+
+
+def test_reuses_instance_although_session_saves_cookies(pool, tmp_path):
+    cookie_file = tmp_path / "cookies.txt"
+    _write_cookies(cookie_file, "a", 1_000_000)
+    seen = set()
+    for _ in range(3):
+        with ydl_pool.session({"cookiefile": str(cookie_file), "quiet": True}) as ydl:
+            seen.add(id(ydl))
+    assert len(seen) == 1
+    assert len(ydl_pool._instances) == 1
+
+
+def test_reloads_cookies_changed_by_another_process(pool, tmp_path):
+    cookie_file = tmp_path / "cookies.txt"
+    _write_cookies(cookie_file, "a", 1_000_000)
+    params = {"cookiefile": str(cookie_file), "quiet": True}
+    with ydl_pool.session(params) as ydl:
+        assert {c.value for c in ydl.cookiejar} == {"a"}
+    _write_cookies(cookie_file, "b", 2_000_000)
+    with ydl_pool.session(params) as again:
+        assert again is ydl
+        assert {c.value for c in again.cookiejar} == {"b"}
+
+
+def test_caps_and_closes_instances(pool, tmp_path, monkeypatch):
+    monkeypatch.setattr(ydl_pool, "_MAX_INSTANCES", 2)
+    for i in range(3):
+        cookie_file = tmp_path / f"{i}.txt"
+        _write_cookies(cookie_file, str(i), 1_000_000)
+        with ydl_pool.session({"cookiefile": str(cookie_file)}):
+            pass
+    assert len(ydl_pool._instances) == 2
+
+
+@pytest.mark.parametrize("enabled", [True, False])
+def test_writes_cookie_file_only_when_cookies_change(monkeypatch, tmp_path, enabled):
+    monkeypatch.setattr(ydl_pool, "_enabled", enabled)
+    cookie_file = tmp_path / "cookies.txt"
+    _write_cookies(cookie_file, "a", 1_000_000)
+    params = {"cookiefile": str(cookie_file), "quiet": True}
+    try:
+        with ydl_pool.session(params):
+            pass
+        assert os.path.getmtime(cookie_file) == 1_000_000
+
+        with ydl_pool.session(params) as ydl:
+            cookie = next(iter(ydl.cookiejar))
+            cookie.value = "changed"
+        assert "changed" in cookie_file.read_text()
+    finally:
+        ydl_pool.reset()
+
+
+def test_falls_back_to_fresh_instance_without_internals(pool, monkeypatch):
+    # 다음 yt-dlp 버전에서 내부 메서드가 사라진 경우
+    import yt_dlp
+    monkeypatch.delattr(yt_dlp.YoutubeDL, "build_format_selector")
+    monkeypatch.setattr(ydl_pool, "_supported", True)
+    seen = set()
+    for _ in range(2):
+        with ydl_pool.session({"quiet": True, "outtmpl": "x.%(ext)s"}) as ydl:
+            assert ydl.params["outtmpl"]["default"] == "x.%(ext)s"
+            seen.add(id(ydl))
+    assert len(seen) == 2
+    assert ydl_pool._instances == {}
+    assert not ydl_pool._supported
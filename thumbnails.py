@@ -0,0 +1,224 @@
+"""썸네일 프록시 (/thumb/<media key>).
+
+details.html 이 YouTube/X/Vimeo 의 원본 썸네일(대부분 가장 큰 해상도)을 직접 불러오지 않도록
+원본은 영상당 한 번만 받아 디스크에 두고, 폭별로 줄인 WebP 를 만들어 오래 캐시되는 응답으로 보낸다.
+
+- 원본 URL 은 메타데이터 캐시의 thumbnail 만 사용한다. (임의 URL 을 받아오는 프록시가 되지 않도록)
+- THUMB_WIDTHS 중 요청한 폭(?w=) 이상인 가장 작은 폭의 변형을 만든다. (원본보다 키우지는 않는다)
+- Pillow 가 없으면 줄이지 않고 받아 둔 원본을 그대로 보낸다.
+- THUMB_CACHE_DIR 사용량이 THUMB_CACHE_MAX_BYTES 를 넘으면 오래 사용되지 않은(mtime) 파일부터 지운다.
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+import zlib
+from io import BytesIO
+from typing import Optional, Tuple
+
+import requests
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+logger = logging.getLogger(__name__)
+
+THUMB_PROXY_ENABLED = os.environ.get("THUMB_PROXY_ENABLED", "1").lower() in ("1", "true", "yes")
+THUMB_CACHE_DIR = os.environ.get("THUMB_CACHE_DIR", os.path.join("uploads", "thumbs"))
+# 썸네일 캐시 용량 예산 (기본 256MiB), 넘으면 80% 까지 정리
+THUMB_CACHE_MAX_BYTES = int(os.environ.get("THUMB_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+THUMB_WIDTHS = tuple(sorted(int(w) for w in os.environ.get("THUMB_WIDTHS", "320,480,720").split(",") if w.strip()))
+THUMB_DEFAULT_WIDTH = int(os.environ.get("THUMB_DEFAULT_WIDTH", "480"))
+THUMB_QUALITY = int(os.environ.get("THUMB_QUALITY", "80"))
+# 응답 Cache-Control max-age (기본 30일)
+THUMB_MAX_AGE = int(os.environ.get("THUMB_MAX_AGE", str(30 * 86400)))
+THUMB_FETCH_TIMEOUT = float(os.environ.get("THUMB_FETCH_TIMEOUT", "5"))
+
+_MAX_SOURCE_BYTES = 5 * 1024 * 1024
+_LOW_WATERMARK = 0.8
+# 캐시 hit 때 mtime 을 갱신하는 최소 간격 (매 요청마다 디스크에 쓰지 않도록)
+_TOUCH_INTERVAL = 3600
+
+# 같은 썸네일을 동시에 받거나 변환하지 않도록 키별로 나눈 락
+_locks = [threading.Lock() for _ in range(64)]
+_usage_lock = threading.Lock()
+# 추정 사용량 (처음 정리할 때 디렉토리를 한 번 훑어 채운다)
+_usage: Optional[int] = None
+
+
+def _name(mkey: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in mkey)
+
+
+def _lock_for(name: str) -> threading.Lock:
+    return _locks[zlib.crc32(name.encode()) % len(_locks)]
+
+
+def pick_width(requested: Optional[int]) -> int:
+    """요청한 폭 이상인 가장 작은 THUMB_WIDTHS 값 (없으면 가장 큰 값)."""
+    if not requested:
+        requested = THUMB_DEFAULT_WIDTH
+    for width in THUMB_WIDTHS:
+        if width >= requested:
+            return width
+    return THUMB_WIDTHS[-1]
+
+
+def _sniff_mimetype(data: bytes) -> str:
+    if data.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG"):
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def _touch(path: str) -> None:
+    try:
+        if time.time() - os.path.getmtime(path) > _TOUCH_INTERVAL:
+            os.utime(path)
+    except OSError:
+        pass
+
+
+def _write(path: str, data: bytes) -> None:
+    """임시 파일에 쓴 뒤 rename (다른 프로세스가 쓰다 만 파일을 보내지 않도록)."""
+    fd, tmp = tempfile.mkstemp(dir=THUMB_CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    _account(len(data))
+    evict()
+
+
+def _fetch_source(url: str) -> Optional[bytes]:
+    try:
+        with requests.get(url, timeout=THUMB_FETCH_TIMEOUT, stream=True) as resp:
+            if resp.status_code != 200:
+                logger.warning(f"Thumbnail fetch {url} returned {resp.status_code}")
+                return None
+            data = bytearray()
+            for chunk in resp.iter_content(64 * 1024):
+                data += chunk
+                if len(data) > _MAX_SOURCE_BYTES:
+                    logger.warning(f"Thumbnail {url} exceeds {_MAX_SOURCE_BYTES} bytes")
+                    return None
+            return bytes(data)
+    except requests.RequestException as e:
+        logger.error(f"Failed to fetch thumbnail {url}: {e}")
+        return None
+
+
+def _resize(data: bytes, width: int) -> bytes:
+    with Image.open(BytesIO(data)) as im:
+        # JPEG 는 디코딩 단계에서 미리 줄여 변환 비용을 줄인다.
+        im.draft("RGB", (width, max(1, im.height * width // max(im.width, 1))))
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGBA" if "A" in im.getbands() else "RGB")
+        if im.width > width:
+            im.thumbnail((width, im.height), Image.LANCZOS)
+        out = BytesIO()
+        im.save(out, "WEBP", quality=THUMB_QUALITY, method=4)
+    return out.getvalue()
+
+
+def get(mkey: str, source_url: Optional[str], width: int) -> Optional[Tuple[str, str]]:
+    """(파일 경로, mimetype). 원본을 받을 수 없으면 None.
+
+    source_url 은 아직 받아 둔 원본이 없을 때만 사용한다.
+    """
+    name = _name(mkey)
+    variant = os.path.join(THUMB_CACHE_DIR, f"{name}-{width}.webp")
+    source = os.path.join(THUMB_CACHE_DIR, f"{name}.src")
+    if Image is not None and os.path.isfile(variant):
+        _touch(variant)
+        return variant, "image/webp"
+
+    with _lock_for(name):
+        if Image is not None and os.path.isfile(variant):
+            return variant, "image/webp"
+        data = None
+        if os.path.isfile(source):
+            with open(source, "rb") as f:
+                data = f.read()
+            _touch(source)
+        elif source_url:
+            os.makedirs(THUMB_CACHE_DIR, exist_ok=True)
+            data = _fetch_source(source_url)
+            if data is None:
+                return None
+            _write(source, data)
+        if data is None:
+            return None
+
+        if Image is None:
+            return source, _sniff_mimetype(data)
+        try:
+            _write(variant, _resize(data, width))
+        except Exception as e:
+            logger.error(f"Failed to resize thumbnail for {mkey}: {e}")
+            return source, _sniff_mimetype(data)
+    return variant, "image/webp"
+
+
+def _scan() -> list:
+    entries = []
+    try:
+        with os.scandir(THUMB_CACHE_DIR) as it:
+            for entry in it:
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                except OSError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def _account(size: int) -> None:
+    global _usage
+    with _usage_lock:
+        if _usage is not None:
+            _usage += size
+
+
+def evict(max_bytes: int = THUMB_CACHE_MAX_BYTES) -> int:
+    """사용량이 max_bytes 를 넘으면 오래 사용되지 않은 파일부터 80% 까지 지우고 지운 파일 수를 반환."""
+    global _usage
+    with _usage_lock:
+        if _usage is not None and _usage <= max_bytes:
+            return 0
+        entries = _scan()
+        usage = sum(size for _, size, _ in entries)
+        removed = 0
+        if usage > max_bytes:
+            target = max_bytes * _LOW_WATERMARK
+            for _, size, path in sorted(entries):
+                if usage <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                usage -= size
+                removed += 1
+        _usage = usage
+    if removed:
+        logger.info("Evicted %s thumbnails from %s", removed, THUMB_CACHE_DIR)
+    return removed
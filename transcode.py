@@ -0,0 +1,209 @@
+"""로컬에 이미 있는 파일로 새 format/quality 결과를 만드는 변환 로직.
+
+첫 다운로드 때 보관한 원본 스트림(source:audio, source:video-<h>p) 이나
+이미 만들어 둔 mp3/mp4 결과 파일이 있으면, 네트워크 다운로드 없이
+ffmpeg 로 재인코딩/remux 해서 요청한 결과를 만든다.
+
+- mp3: 원본 오디오 → 더 높은 비트레이트의 mp3 → mp4 순서로 입력을 고른다.
+- mp4: 요청 해상도 이상인 원본 영상(+원본 오디오) → 더 높은 해상도의 mp4 순서.
+  요청 해상도보다 낮은 입력으로 업스케일하지는 않는다.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from typing import Callable, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+SOURCE_FORMAT = "source"
+SOURCE_AUDIO = "audio"
+
+# ffmpeg 변환 최대 시간 (초)
+TRANSCODE_TIMEOUT = int(os.environ.get("TRANSCODE_TIMEOUT", "1800"))
+
+# 다운로드한 스트림을 mp4 로 변환할 때의 인코딩 옵션
+MP4_ARGS = ["-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart"]
+
+
+def mp3_args(quality: str) -> List[str]:
+    return ["-vn", "-codec:a", "libmp3lame", "-b:a", f"{quality}k"]
+
+
+def source_video_quality(height) -> str:
+    return f"video-{height}p" if height else "video"
+
+
+def _height(quality: str) -> Optional[int]:
+    """'720p' / 'video-720p' 형태에서 높이(정수)를 꺼낸다."""
+    q = quality.rsplit("-", 1)[-1]
+    if q.endswith("p") and q[:-1].isdigit():
+        return int(q[:-1])
+    return None
+
+
+def _codecs(entry: dict) -> List[str]:
+    return [c.strip().lower() for c in (entry.get("codec") or "").split(",") if c.strip()]
+
+
+def _has_audio(entry: dict) -> bool:
+    codecs = _codecs(entry)
+    # 코덱 정보를 모르면 오디오가 있다고 가정하지 않는다.
+    return any(c.startswith(("mp4a", "aac", "opus", "vorbis", "mp3")) for c in codecs)
+
+
+def _is_h264(entry: dict) -> bool:
+    return any(c.startswith(("avc1", "h264")) for c in _codecs(entry))
+
+
+def plan(variants: list, format: str, quality: str, platform: str = "youtube") -> Optional[dict]:
+    """보유 중인 artifact 목록(artifacts.variants 결과)으로 변환 계획을 세운다.
+
+    반환값은 {"inputs": [entry, ...], "args": [ffmpeg 출력 옵션]} 또는 None.
+    """
+    by_kind = {}
+    for fmt, q, entry in variants:
+        by_kind.setdefault(fmt, []).append((q, entry))
+
+    if format == "mp3":
+        if not quality.isdigit():
+            return None
+        audio_args = mp3_args(quality)
+        for q, entry in by_kind.get(SOURCE_FORMAT, []):
+            if q == SOURCE_AUDIO:
+                return {"inputs": [entry], "args": audio_args}
+        higher = [(int(q), e) for q, e in by_kind.get("mp3", []) if q.isdigit() and int(q) > int(quality)]
+        if higher:
+            return {"inputs": [min(higher, key=lambda x: x[0])[1]], "args": audio_args}
+        for q, entry in by_kind.get("mp4", []):
+            return {"inputs": [entry], "args": audio_args}
+        return None
+
+    if format != "mp4":
+        return None
+
+    # YouTube 외 플랫폼은 해상도와 관계없이 best 를 받으므로 기존 mp4 를 그대로 복사한다.
+    if platform != "youtube":
+        for q, entry in by_kind.get("mp4", []):
+            return {"inputs": [entry], "args": ["-c", "copy", "-movflags", "+faststart"]}
+        return None
+
+    height = _height(quality)
+    if not height:
+        return None
+
+    audio_sources = [e for q, e in by_kind.get(SOURCE_FORMAT, []) if q == SOURCE_AUDIO]
+    videos = sorted(
+        (h, e) for h, e in ((_height(q), e) for q, e in by_kind.get(SOURCE_FORMAT, []) if q.startswith("video"))
+        if h and h >= height
+    )
+    for h, video in videos:
+        if _has_audio(video):
+            inputs, audio_map = [video], "0:a:0"
+        elif audio_sources:
+            inputs, audio_map = [video, audio_sources[0]], "1:a:0"
+        else:
+            continue
+        if h == height and _is_h264(video):
+            video_args = ["-c:v", "copy"]
+        else:
+            video_args = ["-vf", f"scale=-2:{height}", "-c:v", "libx264", "-preset", "veryfast", "-crf", "23"]
+        args = ["-map", "0:v:0", "-map", audio_map] + video_args + ["-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart"]
+        return {"inputs": inputs, "args": args}
+
+    higher = [(_height(q), e) for q, e in by_kind.get("mp4", []) if (_height(q) or 0) > height]
+    if higher:
+        source = min(higher, key=lambda x: x[0])[1]
+        args = ["-vf", f"scale=-2:{height}", "-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-c:a", "copy", "-movflags", "+faststart"]
+        return {"inputs": [source], "args": args}
+    return None
+
+
+def _parse_speed(value: str) -> Optional[float]:
+    """ffmpeg -progress 의 speed 값('1.5x', 'N/A') 을 배속(float) 으로."""
+    try:
+        return float(value.rstrip("x"))
+    except ValueError:
+        return None
+
+
+def run(
+    transcode_plan: dict,
+    output_path: str,
+    duration: Optional[float] = None,
+    on_progress: Optional[Callable[[Optional[float], Optional[float]], None]] = None,
+) -> bool:
+    """변환 계획대로 ffmpeg 를 실행. 임시 파일에 쓴 뒤 성공하면 output_path 로 옮긴다.
+
+    - ffmpeg 의 -progress 출력(key=value)을 읽어 on_progress(percent, speed) 를 호출한다.
+      percent 는 출력 시각(out_time) / duration 기준 0~100 (duration 을 모르면 None),
+      speed 는 실시간 대비 인코딩 배속이다.
+    """
+    if not shutil.which("ffmpeg"):
+        logger.error("ffmpeg not found, cannot transcode locally.")
+        return False
+
+    ext = os.path.splitext(output_path)[1]
+    tmp_path = f"{output_path}.part{ext}"
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-nostats", "-progress", "pipe:1", "-y"]
+    for entry in transcode_plan["inputs"]:
+        cmd += ["-i", entry["path"]]
+    cmd += transcode_plan["args"] + [tmp_path]
+
+    # stderr 는 임시 파일로 받아 파이프가 차서 ffmpeg 가 멈추지 않도록 한다.
+    with tempfile.TemporaryFile() as stderr_file:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file, text=True)
+        # 진행률 출력 없이 멈춘 경우에도 시간 제한이 지켜지도록 출력과 별개로 ffmpeg 를 종료한다.
+        expired = threading.Event()
+
+        def expire():
+            expired.set()
+            proc.kill()
+
+        watchdog = threading.Timer(TRANSCODE_TIMEOUT, expire)
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            out_time = speed = None
+            for line in proc.stdout:
+                key, _, value = line.strip().partition("=")
+                if key == "out_time_us":
+                    try:
+                        out_time = int(value) / 1_000_000
+                    except ValueError:
+                        pass
+                elif key == "speed":
+                    speed = _parse_speed(value)
+                elif key == "progress" and on_progress is not None:
+                    # 한 블록(key=value 묶음)이 끝날 때마다 보고
+                    percent = None
+                    if duration and out_time is not None:
+                        percent = max(0.0, min(100.0, out_time / duration * 100.0))
+                    on_progress(percent, speed)
+            returncode = proc.wait()
+        finally:
+            watchdog.cancel()
+            # 어떤 이유로 빠져나오든(RQ job timeout 포함) ffmpeg 를 남겨 두지 않는다.
+            # 남으면 재시도한 job 과 같은 임시 파일에 동시에 쓴다.
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            proc.stdout.close()
+        timed_out = expired.is_set()
+        stderr_file.seek(0)
+        stderr = stderr_file.read().decode(errors="replace").strip()
+
+    if timed_out or returncode != 0:
+        if timed_out:
+            logger.error(f"ffmpeg timed out after {TRANSCODE_TIMEOUT}s: {output_path}")
+        else:
+            logger.error(f"ffmpeg failed ({returncode}): {stderr}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+    os.replace(tmp_path, output_path)
+    return True
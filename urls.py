@@ -0,0 +1,141 @@
+"""지원 플랫폼 URL 파싱 / 정규화.
+
+등록된 플랫폼 핸들러의 URL 패턴을 하나의 정규식으로 미리 합쳐 두고, URL 을 한 번만 매칭해서
+플랫폼과 영상 ID 를 함께 얻는다. 결과(MediaURL)의 key 는 메타데이터 캐시, artifact 인덱스,
+single-flight(job 합치기) 키에 공통으로 쓰이고, 플랫폼은 포맷 선택 정책에 쓰인다.
+
+- 플랫폼 추가는 Platform 을 상속해 register() 로 등록한다.
+  patterns 의 (?P<id>...) 그룹이 영상 ID 이며, 그룹이 없는 패턴은 ID 없이 지원하는 URL 이다.
+- 같은 URL 을 요청 처리 중 여러 번 파싱하므로 결과를 LRU 캐시에 둔다.
+- 영상 ID 를 알 수 없는 URL 의 key 는 URL 해시(url:<sha1>)를 사용한다.
+"""
+import hashlib
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+
+class MediaURL(NamedTuple):
+    platform: str
+    media_id: Optional[str]
+    # 정규화한 URL (YouTube 는 https://www.youtube.com/watch?v=<id>)
+    url: str
+    # '<platform>:<media id>' (ID 를 모르면 'url:<URL 해시>')
+    key: str
+
+
+class Platform:
+    """플랫폼 핸들러. patterns 는 scheme(https://) 뒤부터 매칭할 정규식 목록."""
+
+    name = "other"
+    patterns: tuple = ()
+    # False 면 UI 에서 고른 해상도 대신 best 포맷으로 받는다. (가용 포맷이 제한적인 플랫폼)
+    honors_quality = True
+
+    def canonical_url(self, media_id: Optional[str], url: str) -> str:
+        return url
+
+
+_YOUTUBE_ID = r"(?P<id>[A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])"
+
+
+class YouTube(Platform):
+    name = "youtube"
+    patterns = (
+        # watch?v= (v 가 첫 파라미터가 아니어도), embed / v / shorts / live, youtube.com/<id>
+        r"(?i:(?:www\.|m\.|music\.)?youtube\.com)/(?:[^?#\s]*\?(?:[^#\s]*?&)?v=|embed/|v/|e/|shorts/|live/)?" + _YOUTUBE_ID,
+        r"(?i:(?:www\.|m\.)?youtu\.be)/" + _YOUTUBE_ID,
+    )
+
+    def canonical_url(self, media_id, url):
+        # 플레이리스트/타임스탬프/공유 파라미터를 떼어 단일 영상 URL 로 정규화
+        return f"https://www.youtube.com/watch?v={media_id}"
+
+
+class Twitter(Platform):
+    name = "twitter"
+    patterns = (
+        r"(?i:(?:www\.|mobile\.)?(?:x|twitter)\.com)/(?:[^/?#\s]+/)*status(?:es)?/(?P<id>\d+)",
+        r"(?i:(?:www\.|mobile\.)?(?:x|twitter)\.com)/\S+",
+    )
+    honors_quality = False
+
+
+class Vimeo(Platform):
+    name = "vimeo"
+    patterns = (
+        r"(?i:(?:www\.)?vimeo\.com)/(?:[^?#\s]*/)?(?P<id>\d+)",
+        r"(?i:(?:www\.)?vimeo\.com)/\S+",
+    )
+    honors_quality = False
+
+
+PLATFORMS: dict = {}
+_OTHER = Platform()
+
+# 합친 정규식과, 매칭된 그룹 이름 → (플랫폼, ID 그룹 이름)
+_url_re = None
+_by_group: dict = {}
+
+
+def _compile() -> None:
+    global _url_re
+    alternatives = []
+    _by_group.clear()
+    for platform in PLATFORMS.values():
+        for pattern in platform.patterns:
+            n = len(alternatives)
+            id_group = f"id{n}" if "(?P<id>" in pattern else None
+            alternatives.append(f"(?P<p{n}>{pattern.replace('(?P<id>', f'(?P<{id_group}>')})")
+            _by_group[f"p{n}"] = (platform, id_group)
+    _url_re = re.compile(r"(?:(?i:https?)://)?(?:" + "|".join(alternatives) + ")")
+
+
+def register(platform: Platform) -> None:
+    PLATFORMS[platform.name] = platform
+    _compile()
+    parse.cache_clear()
+
+
+def url_hash_key(url: str) -> str:
+    return "url:" + hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=4096)
+def parse(url: str) -> Optional[MediaURL]:
+    """지원하는 플랫폼 URL 이면 MediaURL, 아니면 None."""
+    url = (url or "").strip()
+    m = _url_re.match(url)
+    if m is None:
+        return None
+    platform, id_group = _by_group[m.lastgroup]
+    media_id = m.group(id_group) if id_group else None
+    if media_id is None:
+        return MediaURL(platform.name, None, url, url_hash_key(url))
+    return MediaURL(platform.name, media_id, platform.canonical_url(media_id, url), f"{platform.name}:{media_id}")
+
+
+for _platform in (YouTube(), Twitter(), Vimeo()):
+    register(_platform)
+
+
+def media_key(url: str) -> str:
+    """URL 에서 캐시 키로 사용할 '<platform>:<media id>' 문자열을 만든다.
+
+    영상 ID 를 알 수 없는 URL 은 URL 해시를 사용한다.
+    """
+    parsed = parse(url)
+    if parsed is not None:
+        return parsed.key
+    return url_hash_key((url or "").strip())
+
+
+def platform_of(url: str) -> str:
+    """메트릭/속도 제한/포맷 정책에 사용할 플랫폼 이름 (youtube / twitter / vimeo / other)."""
+    parsed = parse(url)
+    return parsed.platform if parsed is not None else _OTHER.name
+
+
+def honors_quality(url: str) -> bool:
+    """UI 에서 고른 해상도를 그대로 적용할 플랫폼인지."""
+    return PLATFORMS.get(platform_of(url), _OTHER).honors_quality
@@ -0,0 +1,56 @@
+"""warm RQ worker.
+
+`rq worker` 는 job 마다 프로세스를 fork 하므로 yt_dlp import, extractor 초기화,
+쿠키 로딩, JS 런타임/EJS 구성요소 준비가 job 마다 반복된다. 짧은 MP3 는 이 시작 비용이
+전체 지연의 대부분을 차지한다.
+
+이 스크립트는 SimpleWorker(fork 없음)로 한 프로세스에서 job 을 순서대로 처리하면서
+YoutubeDL 인스턴스를 재사용한다(ydl_pool). 메모리 누수/상태 누적을 막기 위해
+WORKER_MAX_JOBS 개를 처리하면 종료하고, 컨테이너 재시작 정책(restart)으로 새 프로세스가 뜬다.
+시작할 때 이전 프로세스가 남긴 조각(.part) 파일 중 이어받을 체크포인트가 없는 것을 정리한다.
+
+사용법:
+    python worker.py standard fast-audio default
+"""
+import logging
+import os
+import sys
+
+import redis
+from rq import Queue, SimpleWorker
+
+import checkpoint
+import tasks
+import ydl_pool
+
+
+logger = logging.getLogger(__name__)
+
+# 한 프로세스가 처리할 최대 job 수 (0 이면 제한 없음)
+WORKER_MAX_JOBS = int(os.environ.get("WORKER_MAX_JOBS", "200"))
+
+DEFAULT_QUEUES = ["standard", "fast-audio", "default", "prefetch"]
+
+
+def main(argv: list) -> int:
+    logging.basicConfig(level=logging.INFO)
+    queue_names = argv or DEFAULT_QUEUES
+
+    conn = redis.Redis(host=tasks.REDIS_HOST, port=tasks.REDIS_PORT, db=tasks.REDIS_DB)
+    queues = [Queue(name, connection=conn) for name in queue_names]
+
+    ydl_pool.enable()
+    cookie_file = os.environ.get("COOKIE_FILE_PATH", "cookies.txt")
+    tasks.prewarm(cookie_file)
+    # 이전 worker 가 죽으면서 남긴 조각 파일 중 이어받을 체크포인트가 없는 것을 정리
+    checkpoint.cleanup_stale(conn, "uploads")
+    logger.info("Warm worker ready (queues=%s, max_jobs=%s)", ",".join(queue_names), WORKER_MAX_JOBS or "unlimited")
+
+    worker = SimpleWorker(queues, connection=conn)
+    worker.work(max_jobs=WORKER_MAX_JOBS or None, logging_level="INFO")
+    ydl_pool.reset()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
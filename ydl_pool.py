@@ -0,0 +1,210 @@
+"""warm worker 용 YoutubeDL 인스턴스 재사용.
+
+기본 rq worker 는 job 마다 프로세스를 fork 하고, job 안에서도 YoutubeDL 을 매번 새로 만든다.
+worker.py 로 실행하는 warm worker 는 enable() 후 한 프로세스가 여러 job 을 순서대로 처리하므로,
+생성 비용이 큰 부분(extractor 초기화, 쿠키 파일 로딩, JS 런타임/EJS 구성요소 설정)은
+인스턴스를 재사용하고 job 마다 바뀌는 값만 덮어쓴다.
+
+- 인스턴스 키: 쿠키 파일, js_runtimes, remote_components (생성 시점에만 반영되는 값)
+- 쿠키 파일은 job 중에 쿠키가 바뀌었을 때만 다시 쓴다. (YoutubeDL 은 close() 마다 파일을 비우고 다시 쓰므로
+  여러 프로세스가 같은 파일을 쓰면 다른 프로세스가 빈 파일을 읽게 된다)
+- 키에는 쿠키 파일 수정 시각을 넣지 않고, 다른 프로세스가 파일을 바꾼 경우(마지막으로 읽거나 쓴 뒤
+  mtime 이 달라짐)에만 같은 인스턴스에서 다시 읽는다.
+- 보관하는 인스턴스는 _MAX_INSTANCES 개까지이며, 넘으면 가장 오래 만든 인스턴스를 닫는다.
+- outtmpl / format / progress hook 등은 session() 진입 시 적용하고, 끝나면 원래 값으로 되돌린다.
+- postprocessors 가 있는 요청이나 enable() 전(web 프로세스)은 지금처럼 새 인스턴스를 만든다.
+- job 별 옵션 적용은 yt-dlp 내부 속성(_INTERNALS)에 의존한다. 설치된 yt-dlp 에 없으면 경고를 남기고
+  재사용을 멈춘 뒤 job 마다 새 인스턴스를 만든다. (requirements.txt 에서 검증한 버전 범위로 고정)
+- SimpleWorker(한 번에 job 하나) 전용이며 스레드 안전하지 않다.
+"""
+import json
+import logging
+import os
+from contextlib import contextmanager
+from typing import Optional
+
+import yt_dlp
+
+
+logger = logging.getLogger(__name__)
+
+# yt_dlp 캐시 디렉토리 (EJS challenge solver 구성요소 등). 볼륨으로 두면 worker 재시작 후에도 유지된다.
+YTDLP_CACHE_DIR = os.environ.get("YTDLP_CACHE_DIR", "")
+
+_STATIC_KEYS = ("cookiefile", "js_runtimes", "remote_components")
+
+# 쿠키 파일 풀(COOKIE_POOL_DIR)을 돌려 쓰면 쿠키마다 인스턴스가 생기므로 개수를 제한한다.
+_MAX_INSTANCES = 4
+
+# _apply 가 다시 만들거나 덮어쓰는 YoutubeDL 내부 속성
+_INTERNALS = ("_parse_outtmpl", "format_selector", "build_format_selector", "add_progress_hook", "_progress_hooks", "_download_retcode")
+
+_enabled = False
+# 설치된 yt-dlp 에서 인스턴스를 재사용할 수 있는지 (_INTERNALS 가 없으면 False 로 바뀐다)
+_supported = True
+_instances: dict = {}
+# 인스턴스 키 → 마지막으로 읽거나 쓴 시점의 쿠키 파일 mtime
+_cookie_mtimes: dict = {}
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def _instance_key(params: dict) -> str:
+    static = {k: params.get(k) for k in _STATIC_KEYS}
+    return json.dumps(static, sort_keys=True, default=str)
+
+
+def _cookie_mtime(ydl) -> Optional[float]:
+    cookie_file = ydl.params.get("cookiefile")
+    try:
+        return os.path.getmtime(cookie_file) if cookie_file else None
+    except OSError:
+        return None
+
+
+def _reload_cookies(key: str, ydl) -> None:
+    """다른 프로세스가 쿠키 파일을 갱신했으면 같은 인스턴스의 cookiejar 에 다시 읽어 들인다."""
+    mtime = _cookie_mtime(ydl)
+    if mtime is None or mtime == _cookie_mtimes.get(key):
+        return
+    try:
+        ydl.cookiejar.clear()
+        ydl.cookiejar.load()
+    except Exception as e:
+        # 다른 프로세스가 쓰는 중이면 다음 job 에서 다시 시도한다.
+        logger.warning(f"Failed to reload cookies from {ydl.params.get('cookiefile')}: {e}")
+        return
+    _cookie_mtimes[key] = mtime
+
+
+def _cookie_state(ydl) -> Optional[tuple]:
+    if ydl.params.get("cookiefile") is None:
+        return None
+    return tuple(sorted((c.domain, c.path, c.name, c.value, c.expires) for c in ydl.cookiejar))
+
+
+def _save_cookies(ydl, before: Optional[tuple]) -> None:
+    """session 동안 쿠키가 바뀐 경우에만 쿠키 파일에 쓴다."""
+    if before is not None and _cookie_state(ydl) != before:
+        ydl.save_cookies()
+
+
+def _close(ydl) -> None:
+    # close() 가 쿠키 파일을 다시 쓰지 않도록 한다. (필요한 저장은 _save_cookies 에서 이미 했다)
+    # params 는 호출한 쪽의 dict 일 수 있으므로 고치지 않고 새 dict 로 바꾼다.
+    ydl.params = {**ydl.params, "cookiefile": None}
+    ydl.close()
+
+
+def _discard(key: str) -> None:
+    entry = _instances.pop(key, None)
+    _cookie_mtimes.pop(key, None)
+    if entry is not None:
+        _close(entry[0])
+
+
+def _with_cache_dir(params: dict) -> dict:
+    if YTDLP_CACHE_DIR and "cachedir" not in params:
+        return {**params, "cachedir": YTDLP_CACHE_DIR}
+    return params
+
+
+def _get(key: str, params: dict):
+    entry = _instances.get(key)
+    if entry is None:
+        while len(_instances) >= _MAX_INSTANCES:
+            _discard(next(iter(_instances)))
+        static = {k: params[k] for k in _STATIC_KEYS if k in params}
+        ydl = yt_dlp.YoutubeDL(_with_cache_dir({**static, "quiet": True, "no_warnings": True}))
+        # YoutubeDL 이 정리(set 변환, 기본 헤더 등)한 뒤의 params 를 기준값으로 보관
+        entry = _instances[key] = (ydl, dict(ydl.params))
+        _cookie_mtimes[key] = _cookie_mtime(ydl)
+    return entry
+
+
+def _apply(ydl, base: dict, params: dict) -> None:
+    """job 별 옵션 적용. 생성 시점에 처리되는 항목(outtmpl, format, hook)은 직접 다시 만든다."""
+    missing = [name for name in _INTERNALS if not hasattr(ydl, name)]
+    if missing:
+        raise AttributeError(f"YoutubeDL has no {', '.join(missing)}")
+    ydl.params = {**base, **_with_cache_dir(params)}
+    for k in _STATIC_KEYS:
+        if k in base:
+            ydl.params[k] = base[k]
+    ydl._parse_outtmpl()
+    fmt = ydl.params.get("format")
+    ydl.format_selector = fmt if fmt in (None, "-") or callable(fmt) else ydl.build_format_selector(fmt)
+    ydl._progress_hooks = []
+    for hook in params.get("progress_hooks") or []:
+        ydl.add_progress_hook(hook)
+    ydl._download_retcode = 0
+
+
+@contextmanager
+def session(params: dict):
+    """`with yt_dlp.YoutubeDL(params) as ydl` 대신 사용. warm worker 에서는 인스턴스를 재사용한다."""
+    global _supported
+    ydl = None
+    if _enabled and _supported and not params.get("postprocessors"):
+        key = _instance_key(params)
+        ydl, base = _get(key, params)
+        try:
+            _apply(ydl, base, params)
+        except AttributeError as e:
+            # yt-dlp 내부 구현이 바뀌었으면 재사용을 멈추고 새 인스턴스로 처리한다.
+            logger.warning(f"Disabling YoutubeDL reuse, unsupported yt-dlp {yt_dlp.version.__version__}: {e}")
+            _supported = False
+            reset()
+            ydl = None
+
+    if ydl is None:
+        ydl = yt_dlp.YoutubeDL(_with_cache_dir(params))
+        try:
+            before = _cookie_state(ydl)
+            try:
+                yield ydl
+            finally:
+                _save_cookies(ydl, before)
+        finally:
+            _close(ydl)
+        return
+
+    _reload_cookies(key, ydl)
+    try:
+        before = _cookie_state(ydl)
+        yield ydl
+    except BaseException:
+        # 예외(job timeout 포함)로 중단된 인스턴스는 상태를 믿을 수 없으므로 버린다.
+        _discard(key)
+        raise
+    else:
+        _save_cookies(ydl, before)
+        _cookie_mtimes[key] = _cookie_mtime(ydl)
+        ydl.params = dict(base)
+        ydl._progress_hooks = []
+
+
+def prewarm(params: dict, ie_keys: tuple = ("Youtube",)) -> Optional[object]:
+    """worker 시작 시 인스턴스를 미리 만들고 자주 쓰는 extractor 를 초기화한다."""
+    if not _enabled or not _supported:
+        return None
+    ydl, _ = _get(_instance_key(params), params)
+    for ie_key in ie_keys:
+        try:
+            ydl.get_info_extractor(ie_key)
+        except Exception as e:
+            logger.warning(f"Failed to prewarm extractor {ie_key}: {e}")
+    return ydl
+
+
+def reset() -> None:
+    """보관 중인 인스턴스를 모두 닫는다."""
+    for key in list(_instances):
+        _discard(key)